@@ -0,0 +1,55 @@
+"""This module benchmarks parsing a corpus across a pool of processes.
+
+    Parses the same generated corpus with parse_documents() using 1, 2, 4,
+    ... processes, up to the number of CPUs, and reports the scaling.
+
+    Usage:
+    - python benchmarks/bench_bulk_parse.py [number_of_documents]
+
+    Packages(s) required:
+    - multiprocessing
+    - os
+    - sys
+    - time
+
+"""
+
+# Imports
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+from bench_logging import table_markup
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_documents = 64
+    if len(sys.argv) > 1:
+        number_of_documents = int(sys.argv[1])
+    corpus = [table_markup(500 + i) for i in xrange(number_of_documents)]
+    cpus = multiprocessing.cpu_count()
+    process_counts = [1]
+    while process_counts[-1] * 2 <= cpus:
+        process_counts.append(process_counts[-1] * 2)
+    if process_counts[-1] != cpus:
+        process_counts.append(cpus)
+    print("%i documents, %.1f MB, %i CPUs" %
+          (number_of_documents, sum(len(m) for m in corpus) / 1e6, cpus))
+    print("%9s %10s %8s" % ("processes", "seconds", "speedup"))
+    baseline = None
+    for processes in process_counts:
+        start_time = time.time()
+        html.parse_documents(corpus, processes=processes, chunksize=4)
+        elapsed = time.time() - start_time
+        if baseline is None:
+            baseline = elapsed
+        print("%9i %10.2f %7.2fx" % (processes, elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
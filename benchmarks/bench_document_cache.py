@@ -0,0 +1,63 @@
+"""This module benchmarks parsing repeated markup with a document cache.
+
+    Compares a full parse with restoring the same markup from the memory
+    tier and from the disk tier of a DocumentCache.
+
+    Usage:
+    - python benchmarks/bench_document_cache.py [number_of_rows]
+
+    Packages(s) required:
+    - logging
+    - os
+    - shutil
+    - sys
+    - tempfile
+    - timeit
+
+"""
+
+# Imports
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import cache
+from html import html
+from bench_logging import table_markup
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_rows = 2000
+    if len(sys.argv) > 1:
+        number_of_rows = int(sys.argv[1])
+    markup = table_markup(number_of_rows)
+    parser = html.HTML(logging.NullHandler())
+    directory = tempfile.mkdtemp()
+    try:
+        disk_cache = cache.DocumentCache(max_documents=0, directory=directory)
+        parser.document_cache = disk_cache
+        parser.parse(markup)
+        memory_cache = cache.DocumentCache()
+        number = 3
+        results = []
+        for label, document_cache in (('no cache', None),
+                                      ('memory', memory_cache),
+                                      ('disk', disk_cache)):
+            parser.document_cache = document_cache
+            elapsed = min(timeit.repeat(lambda: parser.parse(markup),
+                                        number=number, repeat=3)) / number
+            results.append(elapsed)
+            print("%-10s %8.2f ms/parse %8.1fx" %
+                  (label, elapsed * 1000, results[0] / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""This module benchmarks opening a saved document.
+
+    Compares reparsing the markup, unpickling a CompactDocument, loading the
+    binary document file and memory-mapping it, then reading tags from the
+    opened document.
+
+    Usage:
+    - python benchmarks/bench_document_file.py [number_of_rows]
+
+    Packages(s) required:
+    - cPickle
+    - logging
+    - os
+    - shutil
+    - sys
+    - tempfile
+    - time
+
+"""
+
+# Imports
+import cPickle
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import document
+from html import html
+from bench_logging import table_markup
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_rows = 20000
+    if len(sys.argv) > 1:
+        number_of_rows = int(sys.argv[1])
+    markup = table_markup(number_of_rows)
+    parser = html.HTML(logging.NullHandler())
+    parser.parse(markup)
+    directory = tempfile.mkdtemp()
+    try:
+        file_name = os.path.join(directory, 'document.bin')
+        pickle_name = os.path.join(directory, 'document.pickle')
+        parser.save_document(file_name)
+        with open(pickle_name, 'wb') as pickle_file:
+            cPickle.dump(parser.get_compact_document(), pickle_file,
+                         cPickle.HIGHEST_PROTOCOL)
+
+        def reparse():
+            parser.parse(markup)
+            return parser
+
+        def unpickle():
+            with open(pickle_name, 'rb') as pickle_file:
+                return cPickle.load(pickle_file)
+
+        print("%d tags, %.1f MB markup, %.1f MB file" %
+              (parser._number_of_tags, len(markup) / 1e6,
+               os.path.getsize(file_name) / 1e6))
+        print("%-10s %10s %14s" % ("open", "open ms", "1000 tags ms"))
+        for label, open_document in (
+                ('reparse', reparse),
+                ('pickle', unpickle),
+                ('load', lambda: document.load_document(file_name, False)),
+                ('mmap', lambda: document.load_document(file_name))):
+            start_time = time.time()
+            opened = open_document()
+            open_time = time.time() - start_time
+            start_time = time.time()
+            for i in xrange(0, parser._number_of_tags,
+                            max(1, parser._number_of_tags // 1000)):
+                opened.get_tag(i)
+            read_time = time.time() - start_time
+            print("%-10s %10.2f %14.2f" % (label, open_time * 1000,
+                                           read_time * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
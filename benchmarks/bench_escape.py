@@ -0,0 +1,65 @@
+"""This module benchmarks escaping many short strings.
+
+    Compares calling escape_text on each string with escaping the whole
+    list at once with escape_texts, for strings like table cells, most of
+    which have nothing to escape.
+
+    Usage:
+    - python benchmarks/bench_escape.py [number_of_strings]
+
+    Packages(s) required:
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+
+
+def cell_texts(number_of_strings):
+    """Build short strings like scraped table cells.
+
+    Args:
+        number_of_strings: The number of strings.
+
+    Returns:
+        A list of strings, one in eight of them with characters to escape.
+
+    """
+    texts = []
+    for i in xrange(number_of_strings):
+        if i % 8 == 0:
+            texts.append('Smith & "Sons" <%i>' % i)
+        else:
+            texts.append('Item %i' % i)
+    return texts
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_strings = 1000000
+    if len(sys.argv) > 1:
+        number_of_strings = int(sys.argv[1])
+    for label, texts in (('str', cell_texts(number_of_strings)),
+                         ('unicode', [text.decode('ascii') + u'\xe9'
+                                      for text in
+                                      cell_texts(number_of_strings)])):
+        assert html.escape_texts(texts) == map(html.escape_text, texts)
+        per_call = min(timeit.repeat(lambda: map(html.escape_text, texts),
+                                     number=1, repeat=3))
+        batch = min(timeit.repeat(lambda: html.escape_texts(texts),
+                                  number=1, repeat=3))
+        print("%-8s escape_text %8.1f ms  escape_texts %8.1f ms  %5.1fx" %
+              (label, per_call * 1000, batch * 1000, per_call / batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""This module benchmarks collecting every matching tag.
+
+    Compares walking the matches with find_next_tag and get_tag, one call
+    per match, with collecting them in a single pass with find_all and
+    iter_tags, on a large listing page.
+
+    Usage:
+    - python benchmarks/bench_find_all.py [number_of_items]
+
+    Packages(s) required:
+    - logging
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import logging
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+
+
+def listing_markup(number_of_items):
+    """Build a listing page of items with links.
+
+    Args:
+        number_of_items: The number of items.
+
+    Returns:
+        The HTML markup.
+
+    """
+    items = ''.join('<div class="item"><a href="/%i">Item %i</a>'
+                    '<span class="price">%i.00</span></div>' % (i, i, i)
+                    for i in xrange(number_of_items))
+    return '<html><body>%s</body></html>' % items
+
+
+def find_next_tag_loop(parser):
+    """Collect the links by calling find_next_tag once per match."""
+    found = []
+    i = parser.find_first_tag('a')
+    while i != -1:
+        found.append(parser.get_tag(i))
+        i = parser.find_next_tag('a', index=i + 1)
+    return found
+
+
+def iter_tags_pass(parser):
+    """Collect the links in one pass with iter_tags."""
+    return [tag for i, tag in parser.iter_tags('a')]
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_items = 20000
+    if len(sys.argv) > 1:
+        number_of_items = int(sys.argv[1])
+    parser = html.HTML(logging.NullHandler())
+    parser.parse(listing_markup(number_of_items))
+    assert find_next_tag_loop(parser) == iter_tags_pass(parser)
+    loop = min(timeit.repeat(lambda: find_next_tag_loop(parser), number=5,
+                             repeat=3)) / 5
+    single = min(timeit.repeat(lambda: iter_tags_pass(parser), number=5,
+                               repeat=3)) / 5
+    indexes = min(timeit.repeat(lambda: parser.find_all('a'), number=5,
+                                repeat=3)) / 5
+    print("%i matches: find_next_tag loop %.2f ms, iter_tags %.2f ms "
+          "(%.1fx), find_all %.2f ms (%.1fx)" %
+          (number_of_items, loop * 1000, single * 1000, loop / single,
+           indexes * 1000, loop / indexes))
+
+
+if __name__ == '__main__':
+    main()
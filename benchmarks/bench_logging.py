@@ -0,0 +1,70 @@
+"""This module benchmarks parse throughput with debug logging on and off.
+
+    With the logger above DEBUG, the parse and search hot paths skip their
+    log calls entirely. With DEBUG enabled every parser event is logged, here
+    to a handler writing to os.devnull.
+
+    Usage:
+    - python benchmarks/bench_logging.py [number_of_rows]
+
+    Packages(s) required:
+    - logging
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import logging
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+
+
+def table_markup(number_of_rows):
+    """Build markup of a table like a scraped listing page.
+
+    Args:
+        number_of_rows: The number of table rows.
+
+    Returns:
+        The markup text.
+
+    """
+    row = ("<tr class=\"row\"><td><a href=\"/item/%i\">Item %i</a></td>"
+           "<td class=\"price\">%i.99</td><td>in stock<br/></td></tr>\n")
+    return ("<html><body><table id=\"items\">" +
+            "".join(row % (i, i, i) for i in xrange(number_of_rows)) +
+            "</table></body></html>")
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_rows = 2000
+    if len(sys.argv) > 1:
+        number_of_rows = int(sys.argv[1])
+    markup = table_markup(number_of_rows)
+    handler = logging.StreamHandler(stream=open(os.devnull, 'w'))
+    handler.setLevel(logging.DEBUG)
+    parser = html.HTML(handler)
+    logger = logging.getLogger(html.__name__)
+    number = 3
+    results = []
+    for label, level in (('DEBUG off', logging.WARNING),
+                         ('DEBUG on', logging.DEBUG)):
+        logger.setLevel(level)
+        elapsed = min(timeit.repeat(lambda: parser.parse(markup),
+                                    number=number, repeat=3)) / number
+        results.append(elapsed)
+        print("%-10s %8.1f ms/parse %8.2f MB/s" %
+              (label, elapsed * 1000, len(markup) / elapsed / 1e6))
+    print("Parsing with DEBUG off is %.1fx faster" % (results[1] / results[0]))
+
+
+if __name__ == '__main__':
+    main()
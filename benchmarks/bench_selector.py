@@ -0,0 +1,71 @@
+"""This module benchmarks CSS selector queries.
+
+    Compares compiling a selector for every query with reusing the cached
+    compiled selector, on a document of many similar list items.
+
+    Usage:
+    - python benchmarks/bench_selector.py [number_of_items]
+
+    Packages(s) required:
+    - logging
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import logging
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+from html import selector
+
+SELECTORS = ("div.item > a[href^=http]", "li:nth-child(odd) span",
+             "ul li + li a", "div.item:not(.sold) > a")
+
+
+def item_markup(number_of_items):
+    """Build a document of list items with links.
+
+    Args:
+        number_of_items: The number of list items.
+
+    Returns:
+        The HTML markup.
+
+    """
+    items = []
+    for i in xrange(number_of_items):
+        items.append('<li><div class="item%s"><span>%i</span>'
+                     '<a href="%s/%i">Item</a></div></li>' %
+                     (' sold' if i % 3 == 0 else '', i,
+                      'http://example.com' if i % 2 else '', i))
+    return '<html><body><ul>%s</ul></body></html>' % ''.join(items)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_items = 2000
+    if len(sys.argv) > 1:
+        number_of_items = int(sys.argv[1])
+    parser = html.HTML(logging.NullHandler())
+    parser.parse(item_markup(number_of_items))
+    root = parser._root
+    for text in SELECTORS:
+        compiled = selector.compile_selector(text)
+        count = len(compiled.select(root))
+        compile_time = min(timeit.repeat(lambda: selector.Selector(text),
+                                         number=1000, repeat=3))
+        query_time = min(timeit.repeat(lambda: compiled.select(root),
+                                       number=10, repeat=3)) / 10
+        print("%-28s %5i tags  compile %6.3f ms  query %7.2f ms" %
+              (text, count, compile_time, query_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""This module benchmarks flattening the Tag tree into the flat list.
+
+    Compares the iterative HTML._store_tag with the previous recursive
+    version on documents of increasing nesting depth. The recursive version
+    cannot store documents nested deeper than the recursion limit.
+
+    Usage:
+    - python benchmarks/bench_store_tag.py
+
+    Packages(s) required:
+    - logging
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import logging
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+
+
+def recursive_store_tag(parser, tag):
+    """The previous recursive _store_tag, including its per-tag logging.
+
+    Args:
+        parser: The HTML parser holding the flat list.
+        tag: The Tag object to store in the flat list.
+
+    """
+    if tag:
+        parser._logger.info("Storing tag")
+        parser._parsed_data.append([tag.name, tag.attributes, tag.data])
+        parser._logger.debug("Adding tag: [%s, %s, %s]", str(tag.name),
+                             str(tag.attributes), str(tag.data))
+        if tag.children and len(tag.children) > 0:
+            parser._logger.debug("Adding %i children", len(tag.children))
+            for i in range(0, len(tag.children)):
+                recursive_store_tag(parser, tag.children[i])
+
+
+def nested_markup(depth, repeat):
+    """Build markup of repeated blocks of nested <div> tags.
+
+    Args:
+        depth: The nesting depth of each block.
+        repeat: The number of blocks.
+
+    Returns:
+        The markup text.
+
+    """
+    return ("<div>" * depth + "x" + "</div>" * depth) * repeat
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = html.HTML(logging.NullHandler())
+    number = 5
+    print("%6s %8s %14s %14s %8s" % ("depth", "tags", "recursive ms",
+                                     "iterative ms", "speedup"))
+    for depth in (10, 100, 500, 900, 5000, 20000):
+        repeat = max(1, 20000 // depth)
+        parser.parse(nested_markup(depth, repeat))
+        root = parser._root
+
+        def run_iterative():
+            parser._parsed_data = []
+            parser._tag_list = []
+            parser._subtree_ends = []
+            parser._tag_index = {}
+            parser._attribute_index = {}
+            parser._store_tag(root)
+
+        def run_recursive():
+            parser._parsed_data = []
+            recursive_store_tag(parser, root)
+
+        iterative = min(timeit.repeat(run_iterative, number=number,
+                                      repeat=3)) / number
+        try:
+            recursive = min(timeit.repeat(run_recursive, number=number,
+                                          repeat=3)) / number
+            recursive_text = "%14.2f" % (recursive * 1000)
+            speedup_text = "%7.1fx" % (recursive / iterative)
+        except RuntimeError:
+            recursive_text = "%14s" % "RuntimeError"
+            speedup_text = "%8s" % "-"
+        print("%6i %8i %s %14.2f %s" % (depth, depth * repeat + 1,
+                                        recursive_text, iterative * 1000,
+                                        speedup_text))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""This module benchmarks the memory used per Tag object.
+
+    Compares the current __slots__ Tag with the previous Tag, which kept a
+    per-instance __dict__ and allocated a string concatenation list for every
+    tag.
+
+    Usage:
+    - python benchmarks/bench_tag_memory.py [number_of_tags]
+
+    Packages(s) required:
+    - gc
+    - os
+    - sys
+
+"""
+
+# Imports
+import gc
+import os
+import sys
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import atom
+
+
+class DictTag(object):
+    """The previous Tag layout, with a __dict__ and an eager concat list."""
+    name = None
+    attributes = None
+    data = None
+    parent = None
+    children = None
+    string_concat_list = None
+
+    def __init__(self, name=None, attributes=None, data=None, parent=None,
+                 children=None):
+        self.name = name
+        self.attributes = attributes
+        self.data = data
+        self.parent = parent
+        self.children = children
+        self.string_concat_list = []
+
+
+def tag_overhead(tag):
+    """Get the bytes used by a tag object itself, excluding its values.
+
+    Args:
+        tag: The tag object to measure.
+
+    Returns:
+        The size of the object, its __dict__ and its concatenation list.
+
+    """
+    size = sys.getsizeof(tag)
+    if hasattr(tag, '__dict__'):
+        size += sys.getsizeof(tag.__dict__)
+        size += sys.getsizeof(tag.__dict__['string_concat_list'])
+    elif getattr(tag, '_string_concat_list', None) is not None:
+        size += sys.getsizeof(tag._string_concat_list)
+    return size
+
+
+def build_document(tag_class, number_of_tags):
+    """Build a flat document of tags shaped like a parsed page.
+
+    Every other tag is a void tag such as <br>, which never has data.
+
+    Args:
+        tag_class: The class used to create the tags.
+        number_of_tags: The number of tags to create.
+
+    Returns:
+        The list of created tags.
+
+    """
+    root = tag_class(name='root', children=[])
+    tags = [root]
+    for i in xrange(number_of_tags - 1):
+        if i % 2:
+            tag = tag_class(name='br', attributes=[], parent=root)
+        else:
+            tag = tag_class(name='td', attributes=[], parent=root, data='')
+        root.children.append(tag)
+        tags.append(tag)
+    return tags
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_tags = 100000
+    if len(sys.argv) > 1:
+        number_of_tags = int(sys.argv[1])
+    gc.collect()
+    results = []
+    for label, tag_class in (('__dict__ Tag', DictTag),
+                             ('__slots__ Tag', atom.Tag)):
+        tags = build_document(tag_class, number_of_tags)
+        total = sum(tag_overhead(tag) for tag in tags)
+        results.append(total)
+        print("%-14s %8.1f bytes/tag %10.1f KiB for %i tags" %
+              (label, float(total) / number_of_tags, total / 1024.0,
+               number_of_tags))
+    print("__slots__ Tag uses %.0f%% of the __dict__ Tag overhead" %
+          (100.0 * results[1] / results[0]))
+
+
+if __name__ == '__main__':
+    main()
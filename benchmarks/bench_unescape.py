@@ -0,0 +1,93 @@
+"""This module benchmarks unescaping entity-dense text.
+
+    Compares the previous unescape_text, six chained str.replace calls that
+    only know six references and leave the others in the text, with
+    unescape_text over the full HTML5 table, and unescape_texts over the
+    same texts as a batch. Texts with rarer references, which unescape_text
+    has to scan for, and texts with only the common references are timed
+    separately.
+
+    Usage:
+    - python benchmarks/bench_unescape.py [number_of_texts]
+
+    Packages(s) required:
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+
+
+def replace_unescape_text(text):
+    """The previous unescape_text, six chained replace calls.
+
+    Args:
+        text: The text to unescape.
+
+    Returns:
+        The unescaped text.
+
+    """
+    if text:
+        text = text.replace("&quot;", "\"")
+        text = text.replace("&#039;", "'")
+        text = text.replace("&lt;", "<")
+        text = text.replace("&gt;", ">")
+        text = text.replace("&nbsp;", " ")
+        text = text.replace("&amp;", "&")
+    return text
+
+
+def entity_texts(number_of_texts, common=False):
+    """Build short texts dense with character references.
+
+    Args:
+        number_of_texts: The number of texts.
+        common: True for texts with only the references the previous
+            unescape_text knew.
+
+    Returns:
+        A list of texts, one in four of them repeated.
+
+    """
+    if common:
+        template = ("Fish &amp; Chips &quot;Item %i&quot; &lt;&nbsp;%i.99"
+                    "&nbsp;&gt; it&#039;s")
+    else:
+        template = ("Caf&eacute; &amp; Bar &#8211; &quot;Item %i&quot; &lt;"
+                    "&nbsp;&euro;%i.99&nbsp;&gt; &#x2019;s &copy;")
+    distinct = number_of_texts * 3 // 4 or 1
+    return [template % (i % distinct, i % distinct)
+            for i in xrange(number_of_texts)]
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_texts = 100000
+    if len(sys.argv) > 1:
+        number_of_texts = int(sys.argv[1])
+    number = 1
+    for name, common in (('rare', False), ('common', True)):
+        texts = entity_texts(number_of_texts, common)
+        size = sum(len(text) for text in texts)
+        for label, function in (
+                ('replace', lambda: [replace_unescape_text(t) for t in texts]),
+                ('single', lambda: [html.unescape_text(t) for t in texts]),
+                ('batch', lambda: html.unescape_texts(texts))):
+            elapsed = min(timeit.repeat(function, number=number,
+                                        repeat=3)) / number
+            print("%-7s %-8s %8.1f ms %8.2f MB/s" % (
+                name, label, elapsed * 1000, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
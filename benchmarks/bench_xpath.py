@@ -0,0 +1,75 @@
+"""This module benchmarks XPath queries.
+
+    Compares answering a leading //name[@attr] step from the tag and
+    attribute indexes with searching the whole Tag tree, on a document of
+    many tables.
+
+    Usage:
+    - python benchmarks/bench_xpath.py [number_of_tables]
+
+    Packages(s) required:
+    - logging
+    - os
+    - sys
+    - timeit
+
+"""
+
+# Imports
+import logging
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from html import html
+from html import xpath
+
+EXPRESSIONS = ("//table[@id='t7']/tr/td[2]/text()", "//tr[@class='sold']",
+               "//td[1]/text()")
+
+
+def table_markup(number_of_tables):
+    """Build a document of small tables.
+
+    Args:
+        number_of_tables: The number of tables.
+
+    Returns:
+        The HTML markup.
+
+    """
+    tables = []
+    for i in xrange(number_of_tables):
+        rows = ''.join('<tr%s><td>Item %i</td><td>%i.00</td></tr>' %
+                       (' class="sold"' if j == 3 else '', j, j)
+                       for j in xrange(10))
+        tables.append('<div><table id="t%i">%s</table></div>' % (i, rows))
+    return '<html><body>%s</body></html>' % ''.join(tables)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    number_of_tables = 500
+    if len(sys.argv) > 1:
+        number_of_tables = int(sys.argv[1])
+    parser = html.HTML(logging.NullHandler())
+    parser.parse(table_markup(number_of_tables))
+    root = parser._root
+    indexes = (parser._tag_list, parser._tag_index, parser._attribute_index)
+    for expression in EXPRESSIONS:
+        compiled = xpath.compile_xpath(expression)
+        assert compiled.evaluate(root, *indexes) == compiled.evaluate(root)
+        traversed = min(timeit.repeat(lambda: compiled.evaluate(root),
+                                      number=10, repeat=3)) / 10
+        indexed = min(timeit.repeat(lambda: compiled.evaluate(root,
+                                                              *indexes),
+                                    number=10, repeat=3)) / 10
+        print("%-36s traversal %8.2f ms  indexed %8.2f ms  %6.1fx" %
+              (expression, traversed * 1000, indexed * 1000,
+               traversed / indexed))
+
+
+if __name__ == '__main__':
+    main()
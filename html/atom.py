@@ -6,6 +6,10 @@
 class Tag(object):
     """Describes an HTML tag.
 
+    Tags use __slots__ instead of a per-instance dictionary, and the string
+    concatenation list is only allocated when it is first used, which keeps
+    the memory used by large documents down.
+
     Attributes:
         name: The name/type of a tag. e.g., 'table'.
         attributes: A list of attribute tuples.
@@ -15,13 +19,8 @@ class Tag(object):
         string_concat_list: A list used for string concatenations.
 
     """
-    # Public member variables
-    name = None
-    attributes = None
-    data = None
-    parent = None
-    children = None
-    string_concat_list = None # List used for string concatenations
+    __slots__ = ('name', 'attributes', 'data', 'parent', 'children',
+                 '_string_concat_list')
 
     def __init__(self, name=None, attributes=None, data=None, parent=None,
                  children=None):
@@ -40,5 +39,41 @@ class Tag(object):
         self.data = data
         self.parent = parent
         self.children = children
-        self.string_concat_list = []
+        self._string_concat_list = None
+
+    def __getstate__(self):
+        """Get the slot values to pickle, as Tags have no __dict__.
+
+        Returns:
+            A tuple of the value of each slot.
+
+        """
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        """Restore the slot values of an unpickled Tag.
+
+        Args:
+            state: A tuple of the value of each slot.
+
+        """
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    @property
+    def string_concat_list(self):
+        """The list used for string concatenations, created on first use."""
+        if self._string_concat_list is None:
+            self._string_concat_list = []
+        return self._string_concat_list
 
+    def joined_string(self):
+        """Join the strings in the string concatenation list.
+
+        Returns:
+            The concatenated strings, or '' if nothing was added.
+
+        """
+        if self._string_concat_list:
+            return ''.join(self._string_concat_list)
+        return ''
@@ -0,0 +1,492 @@
+"""This module provides on-disk caches of HTTP responses and in-memory and
+    on-disk caches of parsed documents.
+
+    Packages(s) required:
+    - collections
+    - cPickle
+    - hashlib
+    - os
+    - tempfile
+    - threading
+    - time
+    - urllib
+
+"""
+
+# Imports
+import collections
+import cPickle
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import urllib
+
+
+class FileStore(object):
+    """Directory of pickled values keyed by hexadecimal keys.
+
+    Each value is stored in its own file. When the stored values exceed
+    max_size bytes, the least recently used ones are removed. The use order
+    is kept in memory and rebuilt from the file modification times when the
+    directory is opened again. Safe to share between threads.
+
+    Attributes:
+        directory: The directory holding the values.
+        max_size: The maximum total size of the stored values in bytes, or
+            None for no limit.
+
+    """
+    # Public member variables
+    directory = None
+    max_size = None
+
+    # Private member variables
+    _entries = None  # key -> file size, least recently used first
+    _size = 0  # total size of the value files
+    _lock = None
+
+    def __init__(self, directory, max_size=None):
+        """Open a store directory, creating it if needed.
+
+        Args:
+            directory: The directory holding the values.
+            max_size: The maximum total size of the stored values in bytes,
+                or None for no limit.
+
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Order the existing values by their last use
+        files = []
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.cache'):
+                stat = os.stat(os.path.join(directory, file_name))
+                files.append((stat.st_mtime, file_name[:-6], stat.st_size))
+        self._entries = collections.OrderedDict()
+        for mtime, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def __len__(self):
+        """Get the number of stored values."""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Check whether a value is stored for a key."""
+        return key in self._entries
+
+    def load(self, key):
+        """Load a value and mark it as the most recently used.
+
+        Args:
+            key: The key of the value.
+
+        Returns:
+            The value, or None if no value is stored for the key.
+
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries[key] = self._entries.pop(key)
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as store_file:
+                value = cPickle.load(store_file)
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            self.remove(key)
+            return None
+        return value
+
+    def save(self, key, value):
+        """Store a value, evicting least recently used values.
+
+        Args:
+            key: The key of the value.
+            value: The value to pickle.
+
+        """
+        # Write to a temporary file first so readers never see part of it
+        handle, temp_path = tempfile.mkstemp(dir=self.directory,
+                                             suffix='.tmp')
+        with os.fdopen(handle, 'wb') as store_file:
+            cPickle.dump(value, store_file, cPickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(temp_path)
+        os.rename(temp_path, self._get_path(key))
+        evicted = []
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while (self.max_size is not None and self._size > self.max_size
+                   and len(self._entries) > 1):
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._delete_file(old_key)
+
+    def remove(self, key):
+        """Remove one value.
+
+        Args:
+            key: The key of the value.
+
+        """
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+        self._delete_file(key)
+
+    def clear(self):
+        """Remove all values."""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._size = 0
+        for key in keys:
+            self._delete_file(key)
+
+    def _delete_file(self, key):
+        """Delete the file of a value, if it exists.
+
+        Args:
+            key: The key of the value.
+
+        """
+        try:
+            os.remove(self._get_path(key))
+        except OSError:
+            pass
+
+    def _get_path(self, key):
+        """Get the path of the file holding a value.
+
+        Args:
+            key: The key of the value.
+
+        Returns:
+            The file path.
+
+        """
+        return os.path.join(self.directory, key + '.cache')
+
+
+class CachedResponse(object):
+    """A response stored in a ResponseCache.
+
+    Attributes:
+        url: The requested URL.
+        form_data: The form data posted to the URL, or None.
+        body: The body of the response.
+        etag: The ETag header of the response, or None.
+        last_modified: The Last-Modified header of the response, or None.
+        stored_time: The time the response was stored or last revalidated,
+            from time.time().
+
+    """
+    # Public member variables
+    url = None
+    form_data = None
+    body = None
+    etag = None
+    last_modified = None
+    stored_time = None
+
+    def __init__(self, url, form_data, body, etag=None, last_modified=None,
+                 stored_time=None):
+        """Create a cached response.
+
+        Args:
+            url: The requested URL.
+            form_data: The form data posted to the URL, or None.
+            body: The body of the response.
+            etag: The ETag header of the response, or None.
+            last_modified: The Last-Modified header of the response, or None.
+            stored_time: The time the response was stored, or None for now.
+
+        """
+        self.url = url
+        self.form_data = form_data
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_time = stored_time or time.time()
+
+    def get_validators(self):
+        """Get the headers for revalidating the response.
+
+        Returns:
+            A dictionary of conditional request headers, empty if the
+            response cannot be revalidated.
+
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(FileStore):
+    """On-disk cache of HTTP responses keyed by URL and form data.
+
+    Responses are fresh for ttl seconds after they were stored or last
+    revalidated. When the stored responses exceed max_size bytes, the least
+    recently used ones are removed. Safe to share between threads.
+
+    Attributes:
+        directory: The directory holding the cached responses.
+        ttl: The number of seconds a response is fresh, or None to keep
+            responses fresh until they are evicted.
+        max_size: The maximum total size of the cached responses in bytes,
+            or None for no limit.
+
+    """
+    # Public member variables
+    ttl = 3600
+
+    def __init__(self, directory, ttl=3600, max_size=100 * 1024 * 1024):
+        """Open a cache directory, creating it if needed.
+
+        Args:
+            directory: The directory holding the cached responses.
+            ttl: The number of seconds a response is fresh, or None to keep
+                responses fresh until they are evicted.
+            max_size: The maximum total size of the cached responses in
+                bytes, or None for no limit.
+
+        """
+        FileStore.__init__(self, directory, max_size)
+        self.ttl = ttl
+
+    def get(self, url, form_data=None):
+        """Get a cached response, fresh or not.
+
+        Args:
+            url: The requested URL.
+            form_data: The form data posted to the URL, or None.
+
+        Returns:
+            The CachedResponse, or None if the response is not cached.
+
+        """
+        return self.load(get_key(url, form_data))
+
+    def get_fresh(self, url, form_data=None):
+        """Get a cached response that does not need revalidating.
+
+        Args:
+            url: The requested URL.
+            form_data: The form data posted to the URL, or None.
+
+        Returns:
+            The CachedResponse, or None if the response is not cached or is
+            stale.
+
+        """
+        response = self.get(url, form_data)
+        if response and self.is_fresh(response):
+            return response
+        return None
+
+    def is_fresh(self, response):
+        """Check whether a cached response is still fresh.
+
+        Args:
+            response: The CachedResponse.
+
+        Returns:
+            True if the response was stored less than ttl seconds ago.
+
+        """
+        if self.ttl is None:
+            return True
+        return time.time() - response.stored_time < self.ttl
+
+    def put(self, url, form_data, body, etag=None, last_modified=None):
+        """Store a response, evicting least recently used responses.
+
+        Args:
+            url: The requested URL.
+            form_data: The form data posted to the URL, or None.
+            body: The body of the response.
+            etag: The ETag header of the response, or None.
+            last_modified: The Last-Modified header of the response, or None.
+
+        Returns:
+            The stored CachedResponse.
+
+        """
+        response = CachedResponse(url, form_data, body, etag, last_modified)
+        self.store(response)
+        return response
+
+    def store(self, response):
+        """Write a response to the cache, replacing any stored version.
+
+        Args:
+            response: The CachedResponse.
+
+        """
+        self.save(get_key(response.url, response.form_data), response)
+
+    def refresh(self, response):
+        """Mark a response as fresh after a successful revalidation.
+
+        Args:
+            response: The CachedResponse.
+
+        """
+        response.stored_time = time.time()
+        self.store(response)
+
+
+class DocumentCache(object):
+    """Cache of parsed documents keyed by a hash of their markup.
+
+    Documents are stored as CompactDocuments, which are rebuilt into a new
+    Tag tree for every parser restoring them, without parsing the markup
+    again. Recently used documents are kept in memory, up to max_documents
+    of them. With a directory, documents are also stored on disk, so they
+    survive the process. Safe to share between threads.
+
+    Attributes:
+        max_documents: The number of documents kept in memory.
+        store: The FileStore holding the documents on disk, or None.
+
+    """
+    # Public member variables
+    max_documents = 128
+    store = None
+
+    # Private member variables
+    _documents = None  # key -> document, least recently used first
+    _lock = None
+
+    def __init__(self, max_documents=128, directory=None, max_size=None):
+        """Create a document cache.
+
+        Args:
+            max_documents: The number of documents kept in memory.
+            directory: The directory holding the documents on disk, or None
+                to keep documents in memory only.
+            max_size: The maximum total size of the documents on disk in
+                bytes, or None for no limit.
+
+        """
+        self.max_documents = max_documents
+        if directory:
+            self.store = FileStore(directory, max_size)
+        self._documents = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Get the number of documents in memory."""
+        return len(self._documents)
+
+    def get(self, key):
+        """Get a document from memory.
+
+        Args:
+            key: The key of the markup, from get_markup_key().
+
+        Returns:
+            The CompactDocument, or None if it is not in memory.
+
+        """
+        with self._lock:
+            document = self._documents.pop(key, None)
+            if document is not None:
+                self._documents[key] = document
+            return document
+
+    def put(self, key, document):
+        """Keep a document in memory, evicting least recently used ones.
+
+        Args:
+            key: The key of the markup, from get_markup_key().
+            document: The CompactDocument.
+
+        """
+        with self._lock:
+            self._documents.pop(key, None)
+            self._documents[key] = document
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    def load(self, key):
+        """Load a document from disk.
+
+        Args:
+            key: The key of the markup, from get_markup_key().
+
+        Returns:
+            The CompactDocument, or None if it is not on disk.
+
+        """
+        if self.store is None:
+            return None
+        return self.store.load(key)
+
+    def save(self, key, compact_document):
+        """Store a document on disk, if the cache has a directory.
+
+        Args:
+            key: The key of the markup, from get_markup_key().
+            compact_document: The CompactDocument.
+
+        """
+        if self.store is not None:
+            self.store.save(key, compact_document)
+
+    def clear(self):
+        """Remove all documents from memory and disk."""
+        with self._lock:
+            self._documents.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+def get_key(url, form_data=None):
+    """Get the cache key of a request.
+
+    Args:
+        url: The requested URL.
+        form_data: A dictionary of form data posted to the URL, or None.
+
+    Returns:
+        The hexadecimal key.
+
+    """
+    request = url
+    if form_data:
+        # urlencode only accepts unicode that encodes as ASCII
+        items = [tuple(value.encode('utf-8') if isinstance(value, unicode)
+                       else value for value in item)
+                 for item in form_data.items()]
+        request += '\n' + urllib.urlencode(sorted(items))
+    if isinstance(request, unicode):
+        request = request.encode('utf-8')
+    return hashlib.sha1(request).hexdigest()
+
+
+def get_markup_key(markup_text):
+    """Get the cache key of HTML markup.
+
+    Args:
+        markup_text: The HTML markup text.
+
+    Returns:
+        The hexadecimal key. Unicode markup and its UTF-8 encoding get
+        different keys, as they parse to different types of text.
+
+    """
+    if isinstance(markup_text, unicode):
+        return 'u' + hashlib.sha1(markup_text.encode('utf-8')).hexdigest()
+    return hashlib.sha1(markup_text).hexdigest()
@@ -0,0 +1,608 @@
+"""This module provides a compact, array-backed HTML document class.
+
+    Documents can be saved to a binary file and loaded back, optionally
+    memory-mapped so that tags are read from the file on access.
+
+    Packages(s) required:
+    - array
+    - mmap
+    - struct
+    - sys
+
+"""
+
+# Imports
+import array
+import mmap
+import struct
+import sys
+
+from atom import Tag
+
+# Binary file format: a header, the string table as offsets and UTF-8
+# bytes, the tag arrays, the attribute arrays, one type byte per tag data
+# and per attribute value, and the text buffer. All integers are
+# little-endian, and each section starts on a 4-byte boundary.
+_MAGIC = 'HTMLDOC\x00'
+_VERSION = 2
+_HEADER = struct.Struct('<8sIIIIIIQ')
+_INT = struct.Struct('<i')
+_TAG_ARRAYS = ('_name_ids', '_parents', '_first_children', '_next_siblings',
+               '_data_starts', '_data_ends', '_attribute_starts',
+               '_attribute_ends')
+_ATTRIBUTE_ARRAYS = ('_attribute_name_ids', '_value_starts', '_value_ends')
+
+
+class Error(Exception):
+    """General base exception class for this module."""
+    pass
+
+
+class CompactDocument(object):
+    """Array-backed representation of a parsed HTML document.
+
+    Holds the same tags, in the same order, as the flat list built by
+    HTML.parse, but as parallel arrays of integers instead of one Python list
+    per tag. Tag and attribute names are stored once in a string table, and
+    all tag data and attribute values are stored in one shared text buffer.
+    Once built, the document does not reference the Tag tree, so the parser
+    and its tree can be released.
+
+    For tag i:
+        _name_ids[i]: the string table index of the tag name.
+        _parents[i], _first_children[i], _next_siblings[i]: tag indices, or
+            -1 if there is none.
+        _data_starts[i], _data_ends[i]: the tag data's offsets in the text
+            buffer. The start is -1 if the tag has no data.
+        _data_types[i]: 1 if the tag data is unicode, 0 for a string.
+        _attribute_starts[i], _attribute_ends[i]: the tag's range in the
+            attribute arrays. The start is -1 if the tag has no attribute
+            list.
+
+    For attribute j:
+        _attribute_name_ids[j]: the string table index of the name.
+        _value_starts[j], _value_ends[j]: the value's offsets in the text
+            buffer. The start is -1 if the attribute has no value.
+        _value_types[j]: 1 if the value is unicode, 0 for a string.
+
+    Unicode values are stored UTF-8 encoded and decoded on access, and
+    strings are stored and returned as they are, so every value keeps the
+    type it had in the Tag tree.
+
+    """
+    # Private member variables
+    _strings = None  # string table of tag and attribute names
+    _string_ids = None  # name -> string table index
+    _name_ids = None
+    _parents = None
+    _first_children = None
+    _next_siblings = None
+    _data_starts = None
+    _data_ends = None
+    _data_types = None
+    _attribute_starts = None
+    _attribute_ends = None
+    _attribute_name_ids = None
+    _value_starts = None
+    _value_ends = None
+    _value_types = None
+    _text = None  # text buffer of tag data and attribute values
+    _mapping = None  # the mmap of a loaded file, or None
+
+    def __init__(self, root=None):
+        """Create a compact document, optionally from a Tag tree.
+
+        Args:
+            root: The root Tag of a parsed document, or None for an empty
+                document.
+
+        """
+        self._strings = []
+        self._string_ids = {}
+        self._name_ids = array.array('i')
+        self._parents = array.array('i')
+        self._first_children = array.array('i')
+        self._next_siblings = array.array('i')
+        self._data_starts = array.array('i')
+        self._data_ends = array.array('i')
+        self._data_types = array.array('b')
+        self._attribute_starts = array.array('i')
+        self._attribute_ends = array.array('i')
+        self._attribute_name_ids = array.array('i')
+        self._value_starts = array.array('i')
+        self._value_ends = array.array('i')
+        self._value_types = array.array('b')
+        self._text = ''
+        if root:
+            self._build(root)
+
+    def __len__(self):
+        """Get the number of tags in the document."""
+        return len(self._name_ids)
+
+    def _build(self, root):
+        """Store a Tag tree in the arrays.
+
+        Tags are stored in pre-order, the order of the flat list built by
+        HTML.parse.
+
+        Args:
+            root: The root Tag of the tree.
+
+        """
+        text = []
+        text_length = [0]
+
+        def store_text(value):
+            """Append a value to the text buffer and get its offsets."""
+            if value is None:
+                return -1, -1
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            start = text_length[0]
+            text.append(value)
+            text_length[0] += len(value)
+            return start, text_length[0]
+
+        last_children = {}
+        stack = [(root, -1)]
+        while stack:
+            tag, parent = stack.pop()
+            index = len(self._name_ids)
+            self._name_ids.append(self._get_string_id(tag.name))
+            self._parents.append(parent)
+            self._first_children.append(-1)
+            self._next_siblings.append(-1)
+            if parent != -1:
+                previous = last_children.get(parent, -1)
+                if previous == -1:
+                    self._first_children[parent] = index
+                else:
+                    self._next_siblings[previous] = index
+                last_children[parent] = index
+            start, end = store_text(tag.data)
+            self._data_starts.append(start)
+            self._data_ends.append(end)
+            self._data_types.append(isinstance(tag.data, unicode))
+            if tag.attributes is None:
+                self._attribute_starts.append(-1)
+                self._attribute_ends.append(-1)
+            else:
+                self._attribute_starts.append(len(self._attribute_name_ids))
+                for name, value in tag.attributes:
+                    self._attribute_name_ids.append(self._get_string_id(name))
+                    start, end = store_text(value)
+                    self._value_starts.append(start)
+                    self._value_ends.append(end)
+                    self._value_types.append(isinstance(value, unicode))
+                self._attribute_ends.append(len(self._attribute_name_ids))
+            if tag.children:
+                for child in reversed(tag.children):
+                    stack.append((child, index))
+        self._text = ''.join(text)
+
+    def _get_string_id(self, name):
+        """Get the string table index of a name, adding it if needed.
+
+        Args:
+            name: The tag or attribute name.
+
+        Returns:
+            The index of the name in the string table, or -1 for None.
+
+        """
+        if name is None:
+            return -1
+        string_id = self._string_ids.get(name)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(name)
+            self._string_ids[name] = string_id
+        return string_id
+
+    def _get_string(self, string_id):
+        """Get a name from the string table.
+
+        Args:
+            string_id: The index of the name in the string table.
+
+        Returns:
+            The name, or None for -1.
+
+        """
+        if string_id == -1:
+            return None
+        return self._strings[string_id]
+
+    def _get_text(self, start, end, is_unicode):
+        """Get a value from the text buffer.
+
+        Args:
+            start: The start offset of the value, or -1 for None.
+            end: The end offset of the value.
+            is_unicode: True if the value was unicode when it was stored.
+
+        Returns:
+            The value, or None.
+
+        """
+        if start == -1:
+            return None
+        value = self._text[start:end]
+        if is_unicode:
+            value = value.decode('utf-8')
+        return value
+
+    def _get_data(self, index):
+        """Get the data of a tag.
+
+        Args:
+            index: The index of the tag.
+
+        Returns:
+            The tag data, or None.
+
+        """
+        return self._get_text(self._data_starts[index],
+                              self._data_ends[index],
+                              self._data_types[index])
+
+    def _get_attributes(self, index):
+        """Get the attribute list of a tag.
+
+        Args:
+            index: The index of the tag.
+
+        Returns:
+            A list of attribute tuples, or None.
+
+        """
+        start = self._attribute_starts[index]
+        if start == -1:
+            return None
+        attributes = []
+        for j in xrange(start, self._attribute_ends[index]):
+            attributes.append((self._get_string(self._attribute_name_ids[j]),
+                               self._get_text(self._value_starts[j],
+                                              self._value_ends[j],
+                                              self._value_types[j])))
+        return attributes
+
+    def get_tag(self, index):
+        """Get the specified tag.
+
+        Args:
+            index: The index of the tag in the document.
+
+        Returns:
+            A list containing:[tag type, nested list with tag attribute tuples,
+            and tag content], or None on error.
+
+        """
+        if index >= 0 and index < len(self._name_ids):
+            return [self._get_string(self._name_ids[index]),
+                    self._get_attributes(index),
+                    self._get_data(index)]
+        return None
+
+    def get_tree(self):
+        """Rebuild the Tag tree of the document.
+
+        Returns:
+            The root Tag, or None for an empty document.
+
+        """
+        tags = []
+        for i in xrange(len(self._name_ids)):
+            parent = self._parents[i]
+            tag = Tag(name=self._get_string(self._name_ids[i]),
+                      attributes=self._get_attributes(i),
+                      data=self._get_data(i),
+                      parent=tags[parent] if parent != -1 else None,
+                      children=[])
+            if parent != -1:
+                tags[parent].children.append(tag)
+            tags.append(tag)
+        if tags:
+            return tags[0]
+        return None
+
+    def save(self, file_name):
+        """Save the document to a binary file.
+
+        Args:
+            file_name: The file to write.
+
+        """
+        encoded = [name.encode('utf-8') if isinstance(name, unicode) else name
+                   for name in self._strings]
+        string_offsets = array.array('i', [0])
+        for name in encoded:
+            string_offsets.append(string_offsets[-1] + len(name))
+        string_bytes = ''.join(encoded)
+        with open(file_name, 'wb') as document_file:
+            document_file.write(_HEADER.pack(
+                _MAGIC, _VERSION, 0,
+                len(self._name_ids), len(self._attribute_name_ids),
+                len(self._strings), len(string_bytes), len(self._text)))
+            _write_array(document_file, string_offsets)
+            document_file.write(string_bytes + _padding(len(string_bytes)))
+            for name in _TAG_ARRAYS + _ATTRIBUTE_ARRAYS:
+                _write_array(document_file, getattr(self, name))
+            for types in (self._data_types, self._value_types):
+                document_file.write(types.tostring() + _padding(len(types)))
+            document_file.write(self._text)
+
+    def close(self):
+        """Release the memory mapping of a loaded file, if there is one.
+
+        The document cannot be used after it is closed.
+
+        """
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def get_parent(self, index):
+        """Get the parent of a tag.
+
+        Args:
+            index: The index of the tag in the document.
+
+        Returns:
+            The index of the parent tag, or -1.
+
+        """
+        if index >= 0 and index < len(self._parents):
+            return self._parents[index]
+        return -1
+
+    def get_children(self, index):
+        """Get the children of a tag.
+
+        Args:
+            index: The index of the tag in the document.
+
+        Returns:
+            A list of the indices of the tag's children.
+
+        """
+        children = []
+        if index >= 0 and index < len(self._first_children):
+            child = self._first_children[index]
+            while child != -1:
+                children.append(child)
+                child = self._next_siblings[child]
+        return children
+
+    def find_first_tag(self, tag_type, tag_attributes=None, tag_data=None):
+        """Find the first matching tag.
+
+        Find the first matching tag using tag type attributes, or content.
+
+        Args:
+            tag_type: The type of tag to search for.
+            tag_attributes: The tag attributes to search for.
+            tag_data: The tag data to search for.
+
+        Returns:
+            The index in the document of the first matching tag, or -1.
+
+        """
+        return self.find_next_tag(tag_type, tag_attributes, tag_data)
+
+    def find_next_tag(self, tag_type, tag_attributes=None, tag_data=None,
+                      index=0):
+        """Find the next matching tag.
+
+        Find the next matching tag using tag type attributes, or content.
+        Tag names are compared as string table indices, so only tags with a
+        matching name are decoded.
+
+        Args:
+            tag_type: The type of tag to search for.
+            tag_attributes: The tag attributes to search for.
+            tag_data: The tag data to search for.
+            index: the starting point in the document.
+
+        Returns:
+            The index in the document of the next matching tag, or -1.
+
+        """
+        if tag_type:
+            tag_type = tag_type.lower()
+            name_ids = set(string_id for string_id, name
+                           in enumerate(self._strings)
+                           if name.lower() == tag_type)
+            if name_ids:
+                for i in xrange(max(index, 0), len(self._name_ids)):
+                    if self._name_ids[i] not in name_ids:
+                        continue
+                    if tag_attributes:
+                        if self._get_attributes(i) != tag_attributes:
+                            continue
+                    if tag_data:
+                        if self._get_data(i) != tag_data:
+                            continue
+                    return i
+        return -1
+
+
+class _MappedArray(object):
+    """Read-only array of 32-bit integers in a buffer, read on access."""
+    __slots__ = ('_buffer', '_offset', '_length')
+
+    def __init__(self, buffer, offset, length):
+        """Create an array over part of a buffer.
+
+        Args:
+            buffer: The buffer, e.g. an mmap.
+            offset: The offset of the first integer in the buffer.
+            length: The number of integers.
+
+        """
+        self._buffer = buffer
+        self._offset = offset
+        self._length = length
+
+    def __len__(self):
+        """Get the number of integers."""
+        return self._length
+
+    def __getitem__(self, index):
+        """Read one integer.
+
+        Args:
+            index: The index of the integer.
+
+        Returns:
+            The integer.
+
+        """
+        if index < 0:
+            index += self._length
+        if index < 0 or index >= self._length:
+            raise IndexError("array index out of range")
+        return _INT.unpack_from(self._buffer, self._offset + 4 * index)[0]
+
+
+
+class _MappedText(object):
+    """Read-only view of the text buffer in a mapped file."""
+    __slots__ = ('_buffer', '_offset')
+
+    def __init__(self, buffer, offset):
+        """Create a view of a buffer from an offset.
+
+        Args:
+            buffer: The buffer, e.g. an mmap.
+            offset: The offset of the text in the buffer.
+
+        """
+        self._buffer = buffer
+        self._offset = offset
+
+    def __getitem__(self, item):
+        """Read a slice of the text.
+
+        Args:
+            item: A slice with a start and a stop.
+
+        Returns:
+            The text as a string.
+
+        """
+        return self._buffer[self._offset + item.start:self._offset + item.stop]
+
+
+def load_document(file_name, use_mmap=True):
+    """Load a document saved by CompactDocument.save().
+
+    Args:
+        file_name: The file to read.
+        use_mmap: True to memory-map the file, so the tag arrays and text are
+            read from the file as they are accessed instead of being loaded
+            up front. Call close() on the document to release the mapping.
+
+    Returns:
+        The CompactDocument.
+
+    """
+    try:
+        with open(file_name, 'rb') as document_file:
+            if use_mmap:
+                data = mmap.mmap(document_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+            else:
+                data = document_file.read()
+    except (IOError, ValueError, mmap.error) as excep:
+        # Empty files cannot be mapped and raise ValueError
+        raise Error("Error opening the document file: %s", str(excep))
+
+    def fail(message):
+        """Release the mapping and raise an error for the file."""
+        if use_mmap:
+            data.close()
+        raise Error(message, file_name)
+
+    if len(data) < _HEADER.size:
+        fail("Not a document file: %s")
+    (magic, version, flags, number_of_tags, number_of_attributes,
+     number_of_strings, string_bytes_length,
+     text_length) = _HEADER.unpack_from(data, 0)
+    if magic != _MAGIC or version != _VERSION:
+        fail("Not a document file: %s")
+    document = CompactDocument()
+    if use_mmap:
+        document._mapping = data
+
+    def read_array(offset, length):
+        """Get an integer array from the file and the offset after it."""
+        end = offset + 4 * length
+        if use_mmap:
+            values = _MappedArray(data, offset, length)
+        else:
+            values = array.array('i')
+            values.fromstring(data[offset:end])
+            if sys.byteorder == 'big':
+                values.byteswap()
+        return values, end
+
+    # The string table is small and always loaded
+    string_offsets, offset = read_array(_HEADER.size, number_of_strings + 1)
+    for i in xrange(number_of_strings):
+        name = data[offset + string_offsets[i]:offset + string_offsets[i + 1]]
+        try:
+            name.decode('ascii')
+        except UnicodeDecodeError:
+            name = name.decode('utf-8')
+        document._strings.append(name)
+        document._string_ids[name] = i
+    offset += string_bytes_length + len(_padding(string_bytes_length))
+    for name in _TAG_ARRAYS:
+        values, offset = read_array(offset, number_of_tags)
+        setattr(document, name, values)
+    for name in _ATTRIBUTE_ARRAYS:
+        values, offset = read_array(offset, number_of_attributes)
+        setattr(document, name, values)
+    # The type bytes are small and always loaded
+    for name, length in (('_data_types', number_of_tags),
+                         ('_value_types', number_of_attributes)):
+        types = array.array('b')
+        types.fromstring(data[offset:offset + length])
+        setattr(document, name, types)
+        offset += length + len(_padding(length))
+    if offset + text_length > len(data):
+        fail("Truncated document file: %s")
+    if use_mmap:
+        document._text = _MappedText(data, offset)
+    else:
+        document._text = data[offset:offset + text_length]
+    return document
+
+
+def _write_array(document_file, values):
+    """Write an integer array as little-endian 32-bit integers.
+
+    Args:
+        document_file: The open file.
+        values: The array.array('i') to write.
+
+    """
+    if sys.byteorder == 'big':
+        values = array.array('i', values)
+        values.byteswap()
+    document_file.write(values.tostring())
+
+
+def _padding(length):
+    """Get the padding that aligns a section to 4 bytes.
+
+    Args:
+        length: The length of the section.
+
+    Returns:
+        The padding bytes.
+
+    """
+    return '\x00' * (-length % 4)
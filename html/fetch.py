@@ -0,0 +1,379 @@
+"""This module provides non-blocking HTTP requests run on an asyncore loop.
+
+    Many requests can be in flight at once on a single thread: each request
+    is an asyncore dispatcher, and a Fetcher polls all of them together.
+
+    Packages(s) required:
+    - asyncore
+    - socket
+    - ssl
+    - sys
+    - time
+    - urlparse
+
+"""
+
+# Imports
+import asyncore
+import socket
+import ssl
+import sys
+import time
+import urlparse
+
+_REDIRECT_STATUSES = frozenset([301, 302, 303, 307, 308])
+
+
+class Request(asyncore.dispatcher):
+    """A non-blocking HTTP GET request.
+
+    Attributes:
+        url: The requested URL.
+        status: The HTTP status code of the response, or None.
+        headers: A dictionary of lowercased response header names to values.
+        body: The body of the response, or None.
+        error: The exception that stopped the request, or None.
+
+    """
+    # Public member variables
+    url = None
+    status = None
+    headers = None
+    body = None
+    error = None
+
+    # Private member variables
+    _callback = None
+    _deadline = None
+    _out = ''
+    _in = None
+    _received = 0  # number of response bytes received
+    _expected = None  # total response size, once the headers are known
+    _hostname = None
+    _https = False
+    _handshaking = False
+    _done = False
+
+    def __init__(self, url, callback, socket_map, timeout=30,
+                 user_agent='html'):
+        """Create a request and start connecting.
+
+        Args:
+            url: The http or https URL to get.
+            callback: A callable taking the finished Request.
+            socket_map: The asyncore socket map the request runs in.
+            timeout: The number of seconds before the request fails.
+            user_agent: The User-Agent header to send.
+
+        """
+        asyncore.dispatcher.__init__(self, map=socket_map)
+        self.url = url
+        self._callback = callback
+        self._deadline = time.time() + timeout
+        self._in = []
+        try:
+            parts = urlparse.urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise ValueError("Unsupported url: %s" % url)
+            self._https = parts.scheme == 'https'
+            port = parts.port or (443 if self._https else 80)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            self._hostname = parts.hostname
+            host = parts.hostname
+            if parts.port:
+                host += ':%i' % parts.port
+            self._out = ('GET %s HTTP/1.0\r\nHost: %s\r\n'
+                         'User-Agent: %s\r\nConnection: close\r\n\r\n' %
+                         (path, host, user_agent))
+            # Name resolution blocks; the connection itself does not
+            family, socket_type, protocol, name, address = socket.getaddrinfo(
+                parts.hostname, port, 0, socket.SOCK_STREAM)[0]
+            self.create_socket(family, socket_type)
+            self.connect(address)
+        except (ValueError, socket.error) as excep:
+            self._finish(excep)
+
+    def expired(self, current_time):
+        """Check whether the request has timed out.
+
+        Args:
+            current_time: The current time, from time.time().
+
+        Returns:
+            True if the request has passed its deadline.
+
+        """
+        return current_time > self._deadline
+
+    def cancel(self, error):
+        """Stop the request.
+
+        Args:
+            error: The exception to report as the cause.
+
+        """
+        self._finish(error)
+
+    def writable(self):
+        """Wait for writability while connecting or sending."""
+        return (not self.connected) or self._handshaking or bool(self._out)
+
+    def readable(self):
+        """Always read what the server sends."""
+        return True
+
+    def handle_connect(self):
+        """Wrap the socket for https once the connection is established."""
+        if self._https:
+            socket_map = self._map
+            sock = self.socket
+            self.del_channel()
+            context = ssl.create_default_context()
+            sock = context.wrap_socket(sock, server_hostname=self._hostname,
+                                       do_handshake_on_connect=False)
+            self.set_socket(sock, socket_map)
+            self.connected = True
+            self._handshaking = True
+
+    def _handshake(self):
+        """Continue the TLS handshake.
+
+        Returns:
+            True once the handshake is complete.
+
+        """
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError as excep:
+            if excep.args[0] in (ssl.SSL_ERROR_WANT_READ,
+                                 ssl.SSL_ERROR_WANT_WRITE):
+                return False
+            raise
+        self._handshaking = False
+        return True
+
+    def handle_write(self):
+        """Send the remaining request bytes."""
+        if self._handshaking and not self._handshake():
+            return
+        if self._out:
+            try:
+                sent = self.send(self._out)
+            except ssl.SSLError as excep:
+                if excep.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                    return
+                raise
+            self._out = self._out[sent:]
+
+    def handle_read(self):
+        """Receive response bytes until the response is complete."""
+        if self._handshaking and not self._handshake():
+            return
+        while True:
+            try:
+                data = self.recv(65536)
+            except ssl.SSLError as excep:
+                if excep.args[0] == ssl.SSL_ERROR_WANT_READ:
+                    return
+                raise
+            if not data:
+                # recv() closed the request when the server closed
+                return
+            self._in.append(data)
+            self._received += len(data)
+            # TLS may hold decrypted data the socket no longer signals
+            if not (self._https and self.socket.pending()):
+                break
+        if self._response_complete():
+            self._finish()
+
+    def handle_close(self):
+        """Finish the request when the server closes the connection."""
+        self._finish()
+
+    def handle_error(self):
+        """Fail the request on an unexpected exception."""
+        self._finish(sys.exc_info()[1])
+
+    def _response_complete(self):
+        """Check whether the whole response has been received.
+
+        Returns:
+            True if the headers are complete and the body has reached its
+            Content-Length.
+
+        """
+        if self._expected is None:
+            data = ''.join(self._in)
+            self._in = [data]
+            header_end = data.find('\r\n\r\n')
+            if header_end == -1:
+                return False
+            # Without a Content-Length the response ends when the server
+            # closes the connection
+            self._expected = -1
+            for line in data[:header_end].split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'content-length':
+                    try:
+                        self._expected = header_end + 4 + int(value)
+                    except ValueError:
+                        pass
+        return self._expected != -1 and self._received >= self._expected
+
+    def _finish(self, error=None):
+        """Parse the response, close the socket and call the callback.
+
+        Args:
+            error: The exception that stopped the request, or None.
+
+        """
+        if self._done:
+            return
+        self._done = True
+        if self.socket is not None:
+            self.close()
+        if not error:
+            try:
+                self._parse_response(''.join(self._in))
+            except ValueError as excep:
+                error = excep
+        self._in = None
+        self.error = error
+        self._callback(self)
+
+    def _parse_response(self, data):
+        """Split a raw response into status, headers and body.
+
+        Args:
+            data: The raw response bytes.
+
+        """
+        header_end = data.find('\r\n\r\n')
+        if header_end == -1:
+            raise ValueError("Incomplete response from %s" % self.url)
+        lines = data[:header_end].split('\r\n')
+        status = lines[0].split(None, 2)
+        if len(status) < 2 or not status[0].startswith('HTTP/'):
+            raise ValueError("Bad status line from %s: %s" %
+                             (self.url, lines[0]))
+        self.status = int(status[1])
+        self.headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            self.headers[name.strip().lower()] = value.strip()
+        body = data[header_end + 4:]
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = _decode_chunked(body)
+        elif 'content-length' in self.headers:
+            body = body[:int(self.headers['content-length'])]
+        self.body = body
+
+
+class Fetcher(object):
+    """Runs many non-blocking HTTP requests on one asyncore loop.
+
+    Redirects are followed, so the callback gets the request for the final
+    URL.
+
+    Attributes:
+        timeout: The number of seconds before a request fails.
+        max_redirects: The number of redirects followed before a request
+            fails.
+
+    """
+    # Public member variables
+    timeout = 30
+    max_redirects = 30
+
+    # Private member variables
+    _socket_map = None
+    _requests = None  # id of each request in flight -> request
+
+    def __init__(self, timeout=30):
+        """Create a fetcher with no requests in flight.
+
+        Args:
+            timeout: The number of seconds before a request fails.
+
+        """
+        self.timeout = timeout
+        self._socket_map = {}
+        self._requests = {}
+
+    def __len__(self):
+        """Get the number of requests in flight."""
+        return len(self._requests)
+
+    def get(self, url, callback, redirects=0):
+        """Start a GET request.
+
+        Args:
+            url: The URL to get.
+            callback: A callable taking the finished Request. It is called
+                from poll(), or right away if the request cannot start.
+            redirects: The number of redirects followed to reach the URL.
+
+        """
+        def finished(request):
+            self._requests.pop(id(request), None)
+            location = (request.headers or {}).get('location')
+            if (not request.error and request.status in _REDIRECT_STATUSES
+                    and location):
+                if redirects < self.max_redirects:
+                    self.get(urlparse.urljoin(request.url, location),
+                             callback, redirects + 1)
+                    return
+                request.error = ValueError("Too many redirects getting %s" %
+                                           url)
+            callback(request)
+        request = Request(url, finished, self._socket_map, self.timeout)
+        # Requests that could not start have already finished with an error
+        if not request.error:
+            self._requests[id(request)] = request
+
+    def poll(self, timeout=0.1):
+        """Process socket events for up to timeout seconds.
+
+        Args:
+            timeout: The longest time to wait for an event.
+
+        """
+        if self._socket_map:
+            # poll() has no FD_SETSIZE limit, unlike select()
+            asyncore.loop(timeout=timeout, use_poll=True,
+                          map=self._socket_map, count=1)
+        elif timeout > 0:
+            time.sleep(timeout)
+        current_time = time.time()
+        for request in self._requests.values():
+            if request.expired(current_time):
+                request.cancel(socket.timeout("Timed out getting %s" %
+                                              request.url))
+
+
+def _decode_chunked(body):
+    """Decode a body sent with chunked transfer encoding.
+
+    Args:
+        body: The chunked body.
+
+    Returns:
+        The decoded body.
+
+    """
+    chunks = []
+    position = 0
+    while True:
+        line_end = body.find('\r\n', position)
+        if line_end == -1:
+            raise ValueError("Truncated chunked body")
+        size = int(body[position:line_end].split(';')[0], 16)
+        if size == 0:
+            break
+        start = line_end + 2
+        chunks.append(body[start:start + size])
+        position = start + size + 2
+    return ''.join(chunks)
@@ -1,14 +1,19 @@
 """This module provides an HTML parsing class.
 
     Packages(s) required:
+    - bisect
     - cgi
+    - collections
     - contextlib
-    - datetime
+    - functools
     - HTMLParser
     - logging
+    - mmap
+    - multiprocessing
+    - os
+    - re
     - requests
-    - time
-    - urllib2
+    - threading
 
     To-do:
     - Implement/fix case-insensitivity on find_first/next_tag
@@ -19,18 +24,70 @@
 """
 
 # Imports
+import bisect
 import cgi
+import collections
 import contextlib
-import datetime
+import functools
 import HTMLParser
 import logging
+import mmap
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
 import requests
 import sys
-import time
-import urllib2
+import threading
 #from __future__ import with_statement # required if using Python 2.5
 
 from atom import Tag
+from cache import get_markup_key
+from document import CompactDocument
+import entities
+import fetch
+from ratelimit import HostRateLimiter
+from selector import compile_selector
+from selector import Error as SelectorError
+from xpath import compile_xpath
+from xpath import Error as XPathError
+
+
+# Decimal, hexadecimal and named character references, which end at the
+# separator of texts joined by unescape_texts()
+_CHARACTER_REFERENCE = re.compile(r'&(#[0-9]+;?|#[xX][0-9a-fA-F]+;?|'
+                                  r'[^\t\n\f <&#;\x00]{1,32};?)')
+# Named references, with &nbsp; kept as a plain space
+_UNICODE_ENTITIES = dict(entities.html5, **{'nbsp': u' ', 'nbsp;': u' '})
+_STRING_ENTITIES = dict((name, text.encode('utf-8'))
+                        for name, text in _UNICODE_ENTITIES.iteritems())
+# Numeric references the HTML5 specification replaces, mostly Windows-1252
+_INVALID_CHARACTER_REFERENCES = {
+    0x00: u'\ufffd', 0x0d: u'\r', 0x80: u'\u20ac', 0x81: u'\x81',
+    0x82: u'\u201a', 0x83: u'\u0192', 0x84: u'\u201e', 0x85: u'\u2026',
+    0x86: u'\u2020', 0x87: u'\u2021', 0x88: u'\u02c6', 0x89: u'\u2030',
+    0x8a: u'\u0160', 0x8b: u'\u2039', 0x8c: u'\u0152', 0x8d: u'\x8d',
+    0x8e: u'\u017d', 0x8f: u'\x8f', 0x90: u'\x90', 0x91: u'\u2018',
+    0x92: u'\u2019', 0x93: u'\u201c', 0x94: u'\u201d', 0x95: u'\u2022',
+    0x96: u'\u2013', 0x97: u'\u2014', 0x98: u'\u02dc', 0x99: u'\u2122',
+    0x9a: u'\u0161', 0x9b: u'\u203a', 0x9c: u'\u0153', 0x9d: u'\x9d',
+    0x9e: u'\u017e', 0x9f: u'\u0178',
+}
+# Characters replaced by escape_text(), '&' first
+_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'),
+            ("'", '&#039;'))
+# Common references unescape_text() replaces before any others; their
+# replacements hold no '&', so the order does not matter
+_COMMON_REFERENCES = (('&lt;', '<'), ('&gt;', '>'), ('&quot;', '"'),
+                      ('&#039;', "'"), ('&nbsp;', ' '))
+_BATCH_SEPARATOR = '\x00'
+# Tags whose data is not unescaped by unescape_document()
+_RAW_TEXT_TAGS = frozenset(['comment', 'declaration', 'unknown_declaration',
+                            'script', 'style'])
+
+# Log handler installed by configure_logging(), shared by all parsers
+_log_handler = None
+_log_lock = threading.Lock()
 
 
 class Error(Exception):
@@ -38,32 +95,116 @@ class Error(Exception):
     pass
 
 
+class _ReferenceTable(dict):
+    """Table of character references to their replacement texts.
+
+    Starts with the named references, and stores the replacement of any
+    other reference the first time it is looked up.
+
+    """
+    # Private member variables
+    _entity_table = None  # named references -> replacement texts
+    _encode = False  # True to encode numeric replacements as UTF-8
+
+    def __init__(self, entity_table, encode):
+        """Create a table from the named references.
+
+        Args:
+            entity_table: A dictionary of reference names to replacement
+                texts.
+            encode: True to encode numeric replacements as UTF-8.
+
+        """
+        dict.__init__(self, entity_table)
+        self._entity_table = entity_table
+        self._encode = encode
+
+    def __missing__(self, reference):
+        """Get and store the replacement of a reference not in the table.
+
+        Args:
+            reference: The reference without the leading '&'.
+
+        Returns:
+            The replacement text.
+
+        """
+        text = _get_reference_text(reference, self._entity_table,
+                                   self._encode)
+        if len(self) < _MAX_REFERENCES:
+            self[reference] = text
+        return text
+
+
+# Reference tables for unicode text and for strings
+_MAX_REFERENCES = 65536
+_UNICODE_REFERENCES = _ReferenceTable(_UNICODE_ENTITIES, False)
+_STRING_REFERENCES = _ReferenceTable(_STRING_ENTITIES, True)
+
+
 class HTML(HTMLParser.HTMLParser):
     """HTML parsing class.
 
     Attributes:
-        requests_per_minute: The maximum number of requests allowed per minute.
+        requests_per_minute: The maximum number of requests allowed per minute
+            to each host, in any 60 second window.
         minimum_time_between_requests: The minimum time required between
-            requests.
+            requests to each host, in seconds.
+        index_attributes: True to build the attribute index while parsing,
+            used by find_first/next_tag_with_attributes.
+        file_block_size: The number of bytes parse_file reads at a time.
+        session: The requests.Session used for HTTP requests. Assign one
+            session to several parsers to share its connection pools.
+            Created from the pool settings on first use if not set.
+        pool_connections: The number of per-host connection pools to keep.
+        pool_maxsize: The number of connections to keep per host.
+        host_pool_sizes: A dictionary of host name to the number of
+            connections to keep for that host, overriding pool_maxsize.
+        rate_limiter: A rate limiter shared with other parsers, threads or
+            processes, such as a ratelimit.SharedRateLimiter, used instead
+            of this parser's own limits. None to limit each host by
+            requests_per_minute and minimum_time_between_requests.
+        response_cache: A cache.ResponseCache storing the responses of
+            get_url, or None to always download. Fresh responses are used
+            without a request or rate limiting, stale ones are revalidated
+            with conditional requests.
+        document_cache: A cache.DocumentCache of parsed documents keyed by
+            a hash of their markup, or None to always parse. Markup parsed
+            before is restored from the cache instead of being parsed again.
 
     """
     # Public member variables
     requests_per_minute = 120
     minimum_time_between_requests = 0
+    index_attributes = True
+    file_block_size = 65536
+    session = None
+    pool_connections = 10
+    pool_maxsize = 10
+    host_pool_sizes = None
+    rate_limiter = None
+    response_cache = None
+    document_cache = None
 
     # Private member variables
     _parsed_data = None
+    _tag_list = None  # the Tag at each flat-list position
+    _subtree_ends = None  # flat-list position -> position after its subtree
     _root = None
     _current_tag = None
     _number_of_tags = None
-    _last_request_time = None  # date/time of last HTTP request
-    _rate_limit_counter_time = None  # date/time for rate limit periods
-    _rate_limit_count = 0  # number of HTTP requests during this rate period
+    _tag_index = None  # lowercased tag name -> sorted flat-list positions
+    _attribute_index = None  # attribute name -> value -> flat-list positions
+    _parsing = False  # True while a document is being fed in chunks
+    _pending_markup = None  # markup held back until the next chunk
+    _event_handler = None  # receives parser events instead of the Tag tree
+    _debug_logging = False  # True to log from the parse and search hot paths
+    _rate_limiters = None  # per-host rate limiting
 
     # Private member objects
     _logger = None
 
-    def __init__(self, log_handler=None):
+    def __init__(self, log_handler=None, configure_log=True):
         """Create and initialize the HTML parser.
 
         Prepare the parent class for processing, reset the root Tag, tag
@@ -71,32 +212,36 @@ class HTML(HTMLParser.HTMLParser):
 
         Args:
             log_handler: The log handler to use instead of the default.
+            configure_log: True to install the log handler through
+                configure_logging(). False leaves the logging configuration
+                untouched, for cheaply creating many parsers.
 
         """
         self._logger = logging.getLogger(__name__)
-        handler = None
-        if log_handler:
-            handler = log_handler
-        else:
-            formatter = logging.Formatter('%(asctime)s - %(levelname)s:'
-                                          '%(name)s:%(message)s')
-            handler = logging.StreamHandler(stream=sys.stdout)
-            handler.setLevel(logging.INFO)
-            handler.setFormatter(formatter)
-        self._logger.addHandler(handler)
+        if configure_log:
+            configure_logging(log_handler)
+        self._debug_logging = self._logger.isEnabledFor(logging.DEBUG)
 
         self._parsed_data = []
+        self._tag_list = []
+        self._subtree_ends = []
+        self._tag_index = {}
+        self._attribute_index = {} if self.index_attributes else None
         self._root = Tag(name='root', children=[])
         self._current_tag = self._root
         self._number_of_tags = 0
         HTMLParser.HTMLParser.__init__(self)
-        self._rate_limit_counter_time = datetime.datetime.now()
-        self._logger.debug("rate_limit_counter_time = %i",
-                           self._rate_limit_counter_time)
+        self._rate_limiters = HostRateLimiter()
 
     def get_url(self, url, form_data=None):
         """Get data from a url.
 
+        Requests go through the parser's pooled HTTP session, so repeated
+        requests to the same host reuse kept-alive connections. With a
+        response_cache, fresh cached responses are returned without a
+        request, and stale ones are revalidated with their ETag and
+        Last-Modified headers.
+
         Args:
             form_data: A dictionary containing name/value pairs of form data.
             url: The URL to get data from.
@@ -108,18 +253,36 @@ class HTML(HTMLParser.HTMLParser):
         data = None
         # If a url is specified, open it
         if url and len(url) > 0:
+            cached = None
+            headers = None
+            if self.response_cache is not None:
+                cached = self.response_cache.get(url, form_data)
+                if cached:
+                    if self.response_cache.is_fresh(cached):
+                        self._logger.debug("Using the cached url: %s", url)
+                        return cached.body
+                    headers = cached.get_validators()
+            session = self._get_session()
             try:
                 if form_data:
-                    self._logger.debug("Form data: %s", str(form_data))
-                    with contextlib.closing(requests.post(url,
-                                                      data=form_data)) as req:
+                    self._logger.debug("Form data: %s", form_data)
+                    with contextlib.closing(session.post(
+                            url, data=form_data, headers=headers)) as req:
                         data = req.text
                 else:
-                    with contextlib.closing(urllib2.urlopen(url)) as html_file:
-                        data = html_file.read()
-                self._logger.debug("URL contents: %s", str(data))
-            except urllib2.URLError as excep:
-                raise Error("URL error opening the url: %s", str(excep))
+                    with contextlib.closing(session.get(
+                            url, headers=headers)) as req:
+                        req.raise_for_status()
+                        data = req.content
+                if cached and req.status_code == 304:
+                    self._logger.debug("Cached url not modified: %s", url)
+                    self.response_cache.refresh(cached)
+                    return cached.body
+                if self.response_cache is not None and req.status_code == 200:
+                    self.response_cache.put(url, form_data, data,
+                                            req.headers.get('ETag'),
+                                            req.headers.get('Last-Modified'))
+                self._logger.debug("URL contents: %i characters", len(data))
             except requests.ConnectionError as excep:
                 raise Error("Connection error opening the url: %s", str(excep))
             except requests.HTTPError as excep:
@@ -129,13 +292,36 @@ class HTML(HTMLParser.HTMLParser):
             except requests.TooManyRedirects as excep:
                 raise Error("Too many redirects error opening the url: %s",
                             str(excep))
+            except requests.RequestException as excep:
+                raise Error("URL error opening the url: %s", str(excep))
         return data
 
-    def parse_file(self, file_name):
+    def _get_session(self):
+        """Get the HTTP session used for requests.
+
+        Returns:
+            The session assigned to session, or a pooled session created on
+            first use from the pool settings.
+
+        """
+        if not self.session:
+            self.session = create_session(self.pool_connections,
+                                          self.pool_maxsize,
+                                          self.host_pool_sizes)
+        return self.session
+
+    def parse_file(self, file_name, block_size=None, use_mmap=False):
         """Parse an HTML file.
 
+        The file is read and parsed in blocks, so the Tag tree is built while
+        the file is being read and the whole file is never held in memory.
+
         Args:
             file_name: The HTML file to parse.
+            block_size: The number of bytes to read and parse at a time, or
+                None to use file_block_size.
+            use_mmap: True to memory-map the file and parse it block by block
+                from the mapping, for very large local files.
 
         Returns:
             True if the file was parsed successfully.
@@ -144,22 +330,45 @@ class HTML(HTMLParser.HTMLParser):
         html_file = None
         # If a file is specified, open it
         if file_name and len(file_name) > 0:
-            self._logger.info("Parsing the file: %s", str(file_name))
+            self._logger.info("Parsing the file: %s", file_name)
+            if not block_size:
+                block_size = self.file_block_size
+            self._start_document()
             try:
                 # Open the file
                 with open(file_name) as html_file:
-                    # Read the markup text
-                    data = html_file.read()
-                    self._logger.debug("File contents: %s", str(data))
-            except IOError as excep:
+                    if use_mmap:
+                        self._feed_mapped_file(html_file, block_size)
+                    else:
+                        # Parse the markup text as it is read
+                        block = html_file.read(block_size)
+                        while block:
+                            self.feed_chunk(block)
+                            block = html_file.read(block_size)
+            except (IOError, mmap.error) as excep:
                 raise Error("IOError opening the file: %s", str(excep))
 
-            # Parse the markup text
-            return self.parse(data)
+            return self.close()
         else:
             self._logger.error("No file specified")
         return False
 
+    def _feed_mapped_file(self, html_file, block_size):
+        """Memory-map an open file and parse it block by block.
+
+        Args:
+            html_file: The open HTML file.
+            block_size: The number of bytes to parse at a time.
+
+        """
+        file_size = os.fstat(html_file.fileno()).st_size
+        # Empty files cannot be mapped, and have nothing to parse
+        if file_size > 0:
+            data = mmap.mmap(html_file.fileno(), 0, access=mmap.ACCESS_READ)
+            with contextlib.closing(data):
+                for offset in xrange(0, file_size, block_size):
+                    self.feed_chunk(data[offset:offset + block_size])
+
     def parse_url(self, url, wait_for_rate_limiting=True):
         """Download and parse a URL.
 
@@ -173,20 +382,16 @@ class HTML(HTMLParser.HTMLParser):
         """
         # If a url is specified, open it
         if url and len(url) > 0:
-            self._logger.info("Parsing the url: %s", str(url))
-
-            # Check rate limiting
-            if not self._check_rate_limiting(wait_for_rate_limiting):
-                return False
+            self._logger.info("Parsing the url: %s", url)
 
-            # Store the time when the request is made
-            current_time = datetime.datetime.now()
-            self._logger.debug("current_time: %i", current_time)
+            # Fresh cached responses need no request, so no rate limiting
+            data = self._get_fresh_cached_data(url)
+            if data is None:
+                # Check rate limiting
+                if not self._check_rate_limiting(wait_for_rate_limiting, url):
+                    return False
 
-            data = self.get_url(url)
-
-            # Update rate limit info
-            self._update_rate_limiting(current_time)
+                data = self.get_url(url)
 
             # Parse the markup text
             return self.parse(data)
@@ -194,6 +399,155 @@ class HTML(HTMLParser.HTMLParser):
             self._logger.error("No URL specified")
         return False
 
+    def parse_urls(self, urls, workers=4, wait_for_rate_limiting=True):
+        """Download and parse several URLs concurrently.
+
+        The URLs are fetched and parsed by a pool of threads sharing this
+        parser's HTTP session and rate limiting. Each URL is parsed into its
+        own HTML parser, since a parser holds a single document.
+
+        Args:
+            urls: A list of URLs to parse.
+            workers: The number of threads fetching URLs.
+            wait_for_rate_limiting: True to block for rating limiting.
+
+        Returns:
+            A list with, for each URL in order, an HTML parser holding its
+            parsed document, or None if the URL could not be parsed.
+
+        """
+        self._logger.info("Parsing %i urls with %i workers", len(urls),
+                          workers)
+        # Create the pooled session up front, so the threads share one
+        self._get_session()
+        pool = multiprocessing.pool.ThreadPool(workers)
+        try:
+            return pool.map(lambda url: self._parse_batch_url(
+                                url, wait_for_rate_limiting), urls)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _parse_batch_url(self, url, wait_for_rate_limiting):
+        """Download and parse one URL of a batch into a new parser.
+
+        Args:
+            url: The URL to parse.
+            wait_for_rate_limiting: True to block for rating limiting.
+
+        Returns:
+            An HTML parser holding the parsed document, or None.
+
+        """
+        if not url:
+            self._logger.error("No URL specified")
+            return None
+        data = self._get_fresh_cached_data(url)
+        if data is None:
+            if not self._check_rate_limiting(wait_for_rate_limiting, url):
+                return None
+            try:
+                data = self.get_url(url)
+            except Error as excep:
+                self._logger.error("Error parsing the url %s: %s", url, excep)
+                return None
+        document = HTML(configure_log=False)
+        document.index_attributes = self.index_attributes
+        document.session = self.session
+        document.rate_limiter = self.rate_limiter
+        document.response_cache = self.response_cache
+        try:
+            document.parse(data)
+        except Error as excep:
+            self._logger.error("Error parsing the url %s: %s", url, excep)
+            return None
+        return document
+
+    def parse_urls_async(self, urls, max_in_flight=100, timeout=30):
+        """Download and parse many URLs on a single event loop.
+
+        Requests are made with non-blocking sockets, so up to max_in_flight
+        of them are in flight at once without a thread each. Rate limiting
+        is honored by delaying the start of requests instead of sleeping,
+        and each response is parsed as soon as it completes. Fresh responses
+        in the response_cache are parsed without a request.
+
+        Args:
+            urls: A list of http or https URLs to parse.
+            max_in_flight: The maximum number of requests in flight.
+            timeout: The number of seconds before a request fails.
+
+        Returns:
+            A list with, for each URL in order, an HTML parser holding its
+            parsed document, or None if the URL could not be parsed.
+
+        """
+        self._logger.info("Parsing %i urls asynchronously", len(urls))
+        documents = [None] * len(urls)
+        pending = collections.deque()
+        fetcher = fetch.Fetcher(timeout)
+
+        def parse_data(index, data):
+            """Parse downloaded data into its own parser."""
+            document = HTML(configure_log=False)
+            document.index_attributes = self.index_attributes
+            try:
+                document.parse(data)
+            except Error as excep:
+                self._logger.error("Error parsing the url %s: %s",
+                                   urls[index], excep)
+                return
+            documents[index] = document
+
+        def parse_response(index, request):
+            """Parse a finished response into its own parser."""
+            # Redirects were followed, so any other status is an error
+            if request.error or request.status >= 300:
+                self._logger.error("Error parsing the url %s: %s",
+                                   request.url,
+                                   request.error or request.status)
+                return
+            if self.response_cache is not None and request.status == 200:
+                # Cache under the requested URL, which may have redirected
+                self.response_cache.put(urls[index], None, request.body,
+                                        request.headers.get('etag'),
+                                        request.headers.get('last-modified'))
+            parse_data(index, request.body)
+
+        for index, url in enumerate(urls):
+            data = self._get_fresh_cached_data(url) if url else None
+            if data is None:
+                pending.append((index, url))
+            else:
+                parse_data(index, data)
+
+        while pending or len(fetcher):
+            # Start the requests whose hosts allow one now, keeping the
+            # others queued in order
+            delay = None
+            waiting = collections.deque()
+            while pending:
+                index, url = pending.popleft()
+                if not url:
+                    self._logger.error("No URL specified")
+                    continue
+                if (len(fetcher) < max_in_flight and
+                    self._check_rate_limiting(False, url)):
+                    fetcher.get(url, functools.partial(parse_response, index))
+                    continue
+                waiting.append((index, url))
+                if len(fetcher) < max_in_flight:
+                    url_delay = self._rate_limit_delay(url)
+                    if delay is None or url_delay < delay:
+                        delay = url_delay
+            pending = waiting
+            # Wait for socket events, or until the next request may start
+            poll_timeout = 0.1
+            if delay is not None:
+                poll_timeout = min(poll_timeout, delay)
+            fetcher.poll(poll_timeout)
+        return documents
+
     def parse_url_with_post_form(self, url, form_data,
                                  wait_for_rate_limiting=True):
         """Download and parse a URL using a POST form.
@@ -209,21 +563,17 @@ class HTML(HTMLParser.HTMLParser):
         """
         # If a url is specified, open it
         if url and len(url) > 0 and form_data:
-            self._logger.info("Parsing the url with POST form: %s", str(url))
-            self._logger.debug("POST data: %s", str(form_data))
-
-            # Check rate limiting
-            if not self._check_rate_limiting(wait_for_rate_limiting):
-                return False
-
-            # Store the time when the request is made
-            current_time = datetime.datetime.now()
-            self._logger.debug("current_time: %i", current_time)
+            self._logger.info("Parsing the url with POST form: %s", url)
+            self._logger.debug("POST data: %s", form_data)
 
-            data = self.get_url(url, form_data)
+            # Fresh cached responses need no request, so no rate limiting
+            data = self._get_fresh_cached_data(url, form_data)
+            if data is None:
+                # Check rate limiting
+                if not self._check_rate_limiting(wait_for_rate_limiting, url):
+                    return False
 
-            # Update rate limit info
-            self._update_rate_limiting(current_time)
+                data = self.get_url(url, form_data)
 
             # Parse the markup text
             return self.parse(data)
@@ -231,81 +581,73 @@ class HTML(HTMLParser.HTMLParser):
             self._logger.error("No URL or form data specified")
         return False
 
-    def _check_rate_limiting(self, wait_for_rate_limiting=True):
+    def _get_fresh_cached_data(self, url, form_data=None):
+        """Get the data of a URL from the response cache, if it is fresh.
+
+        Args:
+            url: The requested URL.
+            form_data: A dictionary containing name/value pairs of form data.
+
+        Returns:
+            The cached data, or None if a request is needed.
+
+        """
+        if self.response_cache is not None:
+            cached = self.response_cache.get_fresh(url, form_data)
+            if cached:
+                self._logger.debug("Using the cached url: %s", url)
+                return cached.body
+        return None
+
+    def _check_rate_limiting(self, wait_for_rate_limiting=True, url=None):
         """Check for rate limiting.
 
-        Check the rate limiting and optionally pause if required to avoid
-        exceeding the rate limit.
+        Take a permit for a request from the rate limiter, optionally
+        pausing exactly as long as required to avoid exceeding the rate limit.
 
         Args:
             wait_for_rate_limiting: True to block for rating limiting.
+            url: The URL about to be requested, whose host is rate limited.
 
         Returns:
             True if rate limit was handled properly.
 
         """
-        # Check rate limiting: time between requests
         self._logger.info("Checking rate limiting")
-        self._logger.debug("wait_for_rate_limiting = %s",
-                           str(wait_for_rate_limiting))
-        current_time = datetime.datetime.now()
-        self._logger.debug("current_time: %i", current_time)
-        if (self._last_request_time and
-            ((current_time - self._last_request_time) <
-            datetime.timedelta(seconds=self.minimum_time_between_requests))):
-            self._logger.debug("Rate limit triggered, time delta: %i, minimum"
-                               " time between requests: %i",
-                               (current_time - self._last_request_time),
-                               self.minimum_time_between_requests)
-            if wait_for_rate_limiting:
-                self._logger.debug("Waiting for rate limiting")
-                time.sleep(self.minimum_time_between_requests)
-            else:
-                self._logger.debug("Not waiting for rate limiting, aborting")
-                return False
-
-        # Check rate limiting: requests per minute
-        current_time = datetime.datetime.now()      # Get current time
-        if self._rate_limit_count >= self.requests_per_minute:
-            self._logger.debug("Rate limit triggered, rate limit count: %i, "
-                               "requests per minute: %i",
-                               self._rate_limit_count, self.requests_per_minute)
-            if wait_for_rate_limiting:
-                self._logger.debug("Waiting for rate limiting")
-                rate_delay = (60 -
-                              (current_time -
-                              self._rate_limit_counter_time).seconds)
-                if rate_delay > 0:
-                    time.sleep(rate_delay)
-                else:
-                    time.sleep(self.minimum_time_between_requests)
-            else:
-                self._logger.debug("Not waiting for rate limiting, aborting")
-                return False
+        if self._get_rate_limiter(url).acquire(wait_for_rate_limiting):
+            return True
+        self._logger.debug("Not waiting for rate limiting, aborting")
+        return False
 
-        # Rate limiting not needed, or it was and we waited the required time
-        return True
+    def _rate_limit_delay(self, url=None):
+        """Get the time until the rate limiting allows the next request.
 
-    def _update_rate_limiting(self, current_time):
-        """Update rate limit data.
+        Args:
+            url: The URL about to be requested, whose host is rate limited.
+
+        Returns:
+            The number of seconds to wait, or 0 if a request may be made now.
+
+        """
+        return self._get_rate_limiter(url).time_until_next_permit()
+
+    def _get_rate_limiter(self, url):
+        """Get the rate limiter for a URL.
 
         Args:
-            current_time: The time of the current request.
+            url: The URL about to be requested.
+
+        Returns:
+            The shared rate_limiter's limiter for the URL, or the limiter of
+            the URL's host set to the current limits.
 
         """
-        # Update rate limit info
-        self._logger.info("Updating rate limiting")
-        self._last_request_time = datetime.datetime.now()
-        self._logger.debug("last_request_time: %i", self._last_request_time)
-        if ((current_time - self._rate_limit_counter_time) >
-            datetime.timedelta(minutes=1)):
-            self._logger.debug("Reset rate limiting")
-            self._rate_limit_counter_time = self._last_request_time
-            self._logger.debug("rate_limit_counter_time: %i",
-                               self._rate_limit_counter_time)
-            self._rate_limit_count = 0
-        self._rate_limit_count += 1
-        self._logger.debug("rate_limit_count: %i", self._rate_limit_count)
+        if self.rate_limiter:
+            return self.rate_limiter.get_limiter(url)
+        self._rate_limiters.requests_per_minute = self.requests_per_minute
+        self._rate_limiters.minimum_time_between_requests = (
+            self.minimum_time_between_requests)
+        return self._rate_limiters.get_limiter(url)
 
     def parse(self, markup_text):
         """Parse HTML markup.
@@ -318,50 +660,244 @@ class HTML(HTMLParser.HTMLParser):
 
         """
         self._logger.info("Parsing HTML markup")
-        # Start with the root of the document
-        self._parsed_data = []
-        self._root = Tag(name='root', children=[])
-        self._current_tag = self._root
-        self._number_of_tags = 0
-        self.reset()
+        # Event handlers must see every event, so they bypass the cache
+        if (self.document_cache is not None and markup_text and
+                not self._event_handler):
+            return self._parse_cached(markup_text)
+        self._start_document()
+        self.feed_chunk(markup_text)
+        return self.close()
 
-        # Fix any issues before we call the parser
-        if markup_text:
-            markup_text = markup_text.replace('</>', '</a>')
-            self._logger.debug("Replaced </> with </a>")
-            try:
-                # Feed our data to the parser
-                self.feed(markup_text)
-            except HTMLParser.HTMLParseError as excep:
-                raise Error("Error parsing HTML: %s", str(excep))
+    def _parse_cached(self, markup_text):
+        """Restore markup from the document cache, or parse and cache it.
+
+        The cache holds CompactDocuments, and every restore builds a new Tag
+        tree and flat list from one, so changes made to a parsed document
+        never reach the cache or other parsers.
+
+        Args:
+            markup_text: The HTML markup text to parse.
+
+        Returns:
+            True if the markup was parsed successfully.
+
+        """
+        key = get_markup_key(markup_text)
+        compact_document = self.document_cache.get(key)
+        if compact_document is None:
+            compact_document = self.document_cache.load(key)
+            if compact_document is not None:
+                self.document_cache.put(key, compact_document)
+        self._start_document()
+        if compact_document is not None:
+            self._logger.debug("Using the cached document %s", key)
+            self._parsing = False
+            self._root = compact_document.get_tree()
+            self._store_tag(self._root)
+            self._number_of_tags = len(self._parsed_data)
+            return True
+        self.feed_chunk(markup_text)
+        self.close()
+        compact_document = CompactDocument(self._root)
+        self.document_cache.save(key, compact_document)
+        self.document_cache.put(key, compact_document)
+        return True
+
+    def feed_chunk(self, chunk):
+        """Parse the next chunk of HTML markup.
+
+        Markup can be pushed in pieces as it arrives, e.g. from a socket, and
+        the Tag tree grows as each chunk is parsed. The first chunk starts a
+        new document; call close() after the last chunk to finish it.
+
+        Args:
+            chunk: The next piece of HTML markup text.
+
+        """
+        if not self._parsing:
+            self._start_document()
+        if chunk:
+            if self._pending_markup:
+                chunk = self._pending_markup + chunk
+            # Hold back a trailing '<' or '</' until the next chunk, so a
+            # '</>' split across chunks is still fixed below
+            if chunk[-1] == '<':
+                self._pending_markup = chunk[-1:]
+                chunk = chunk[:-1]
+            elif chunk[-2:] == '</':
+                self._pending_markup = chunk[-2:]
+                chunk = chunk[:-2]
+            else:
+                self._pending_markup = ''
+            # Fix any issues before we call the parser
+            chunk = chunk.replace('</>', '</a>')
+            self._feed_markup(chunk)
+
+    def close(self):
+        """Finish parsing the markup passed to feed_chunk().
+
+        Flush any markup buffered by the parser and store the Tag tree to the
+        flat list of tags.
+
+        Returns:
+            True if the markup was parsed successfully.
+
+        """
+        if not self._parsing:
+            self._start_document()
+        if self._pending_markup:
+            self._feed_markup(self._pending_markup)
+            self._pending_markup = ''
+        try:
+            HTMLParser.HTMLParser.close(self)
+        except HTMLParser.HTMLParseError as excep:
+            raise Error("Error parsing HTML: %s", str(excep))
+        self._parsing = False
         # Store the root tag to the list of HTML tags
         self._store_tag(self._root)
         self._number_of_tags = len(self._parsed_data)
         self._logger.debug("finished parsing. Position "
-                           "- %s", str(self.getpos()))
-        self._logger.debug("%s tags processed", str(self._number_of_tags))
+                           "- %s", self.getpos())
+        self._logger.debug("%s tags processed", self._number_of_tags)
 
         return True
 
+    def parse_events(self, markup_text, handler):
+        """Parse HTML markup, passing each parser event to a handler.
+
+        No Tag tree or flat list is built for the markup, which makes this
+        much cheaper than parse() when only a few values are needed. The
+        previously parsed document is discarded.
+
+        Args:
+            markup_text: The HTML markup text to parse.
+            handler: A callable taking (event, name, attributes, data), where
+                event is one of 'starttag', 'endtag', 'startendtag', 'data',
+                'comment', 'decl' or 'unknown_decl'. Data is passed as found
+                in the markup.
+
+        Returns:
+            True if the markup was parsed successfully.
+
+        """
+        self._logger.info("Parsing HTML markup events")
+        self._event_handler = handler
+        try:
+            return self.parse(markup_text)
+        finally:
+            self._event_handler = None
+
+    def iter_events(self, markup_text, block_size=None):
+        """Parse HTML markup, yielding each parser event.
+
+        A generator version of parse_events(). The markup is parsed in blocks,
+        and the events of each block are yielded before the next one is
+        parsed.
+
+        Args:
+            markup_text: The HTML markup text to parse.
+            block_size: The number of characters to parse at a time, or None
+                to use file_block_size.
+
+        Yields:
+            (event, name, attributes, data) tuples, as passed to the handler
+            of parse_events().
+
+        """
+        self._logger.info("Parsing HTML markup events")
+        if not block_size:
+            block_size = self.file_block_size
+        events = []
+        self._event_handler = lambda *event: events.append(event)
+        try:
+            self._start_document()
+            for offset in xrange(0, len(markup_text or ''), block_size):
+                self.feed_chunk(markup_text[offset:offset + block_size])
+                for event in events:
+                    yield event
+                del events[:]
+            self.close()
+            for event in events:
+                yield event
+        finally:
+            self._event_handler = None
+
+    def _start_document(self):
+        """Reset the parser and start a new document at the root Tag."""
+        self._parsed_data = []
+        self._tag_list = []
+        self._subtree_ends = []
+        self._tag_index = {}
+        self._attribute_index = {} if self.index_attributes else None
+        self._root = Tag(name='root', children=[])
+        self._current_tag = self._root
+        self._number_of_tags = 0
+        self._pending_markup = ''
+        self._debug_logging = self._logger.isEnabledFor(logging.DEBUG)
+        self.reset()
+        self._parsing = True
+
+    def _feed_markup(self, markup_text):
+        """Feed markup to the parser.
+
+        Args:
+            markup_text: The HTML markup text to parse.
+
+        """
+        try:
+            # Feed our data to the parser
+            self.feed(markup_text)
+        except HTMLParser.HTMLParseError as excep:
+            raise Error("Error parsing HTML: %s", str(excep))
+
     def _store_tag(self, tag):
         """Store the current tag.
 
+        Store the tag and all of its descendants, in pre-order, using an
+        explicit stack so deeply nested documents do not hit the recursion
+        limit. The end of each tag's subtree is recorded, so searches can be
+        limited to a tag's descendants.
+
         Args:
             tag: The Tag object to store in the flat list.
 
         """
         if tag:
             self._logger.info("Storing tag")
-            # Store the tag data to the list of tags
-            self._parsed_data.append([tag.name, tag.attributes, tag.data])
-            self._logger.debug("Adding tag: [%s, %s, %s]", str(tag.name),
-                               str(tag.attributes), str(tag.data))
-            # If the tag has children, recursively call this function to
-            # store them as well
-            if tag.children and len(tag.children) > 0:
-                self._logger.debug("Adding %i children", len(tag.children))
-                for i in range(0, len(tag.children)):
-                    self._store_tag(tag.children[i])
+            parsed_data = self._parsed_data
+            tag_list = self._tag_list
+            subtree_ends = self._subtree_ends
+            tag_index = self._tag_index
+            attribute_index = self._attribute_index
+            stack = [tag]
+            while stack:
+                tag = stack.pop()
+                if tag.__class__ is int:
+                    # All descendants of the tag at this position are stored
+                    subtree_ends[tag] = len(parsed_data)
+                    continue
+                # Store the tag data to the list of tags and index its
+                # position by lowercased tag name
+                position = len(parsed_data)
+                parsed_data.append([tag.name, tag.attributes, tag.data])
+                tag_list.append(tag)
+                subtree_ends.append(position + 1)
+                name = tag.name.lower() if tag.name else tag.name
+                positions = tag_index.get(name)
+                if positions is None:
+                    tag_index[name] = [position]
+                else:
+                    positions.append(position)
+                if attribute_index is not None and tag.attributes:
+                    for attribute_name, value in tag.attributes:
+                        values = attribute_index.setdefault(attribute_name,
+                                                            {})
+                        values.setdefault(value, []).append(position)
+                # Push the children in reverse so they are stored in order,
+                # after a marker to record the end of the subtree
+                if tag.children:
+                    stack.append(position)
+                    stack.extend(reversed(tag.children))
         else:
             self._logger.error("No tag specified")
 
@@ -375,10 +911,15 @@ class HTML(HTMLParser.HTMLParser):
             attrs: A list of the tag's attributes.
 
         """
-        self._logger.debug("start tag - %s / %s", tag, str(attrs))
+        if self._debug_logging:
+            self._logger.debug("start tag - %s / %s", tag, attrs)
+        if self._event_handler:
+            self._event_handler('starttag', tag, attrs, None)
+            return
         new_tag = Tag(name=tag, attributes=attrs, parent=self._current_tag,
                       data='')
-        self._logger.debug("parent tag: %s", str(self._current_tag.name))
+        if self._debug_logging:
+            self._logger.debug("parent tag: %s", self._current_tag.name)
         if not self._current_tag.children:
             self._current_tag.children = []
         self._current_tag.children.append(new_tag)
@@ -393,8 +934,12 @@ class HTML(HTMLParser.HTMLParser):
             tag: The HTML tag.
 
         """
-        self._logger.debug("end tag - %s", tag)
-        self._current_tag.data = ''.join(self._current_tag.string_concat_list)
+        if self._debug_logging:
+            self._logger.debug("end tag - %s", tag)
+        if self._event_handler:
+            self._event_handler('endtag', tag, None, None)
+            return
+        self._current_tag.data = self._current_tag.joined_string()
         if tag == 'em':
             self._current_tag.parent.string_concat_list.append(
                                                         self._current_tag.data)
@@ -411,7 +956,11 @@ class HTML(HTMLParser.HTMLParser):
             attrs: A list of the tag's attributes.
 
         """
-        self._logger.debug("start/end tag - %s / %s", tag, str(attrs))
+        if self._debug_logging:
+            self._logger.debug("start/end tag - %s / %s", tag, attrs)
+        if self._event_handler:
+            self._event_handler('startendtag', tag, attrs, None)
+            return
         if tag == 'br':
             self._current_tag.string_concat_list.append(" ")
         new_tag = Tag(name=tag, attributes=attrs, parent=self._current_tag)
@@ -428,7 +977,11 @@ class HTML(HTMLParser.HTMLParser):
             data: The tag's data.
 
         """
-        self._logger.debug("data - %s", data)
+        if self._debug_logging:
+            self._logger.debug("data - %s", data)
+        if self._event_handler:
+            self._event_handler('data', None, None, data)
+            return
         if data:
             data = data.replace("\n", "")
             data = data.replace("\r", "")
@@ -437,6 +990,30 @@ class HTML(HTMLParser.HTMLParser):
                     self._current_tag.data = ""
                 self._current_tag.string_concat_list.append(data)
 
+    def handle_entityref(self, name):
+        """Handle a named character reference.
+
+        The reference is kept in the tag's data as found, to be replaced by
+        unescape_text() or unescape_document().
+
+        Args:
+            name: The name of the reference.
+
+        """
+        self.handle_data('&%s;' % name)
+
+    def handle_charref(self, name):
+        """Handle a numeric character reference.
+
+        The reference is kept in the tag's data as found, to be replaced by
+        unescape_text() or unescape_document().
+
+        Args:
+            name: The number of the reference, e.g. '8217' or 'x2019'.
+
+        """
+        self.handle_data('&#%s;' % name)
+
     def handle_comment(self, data):
         """Handle a comment.
 
@@ -446,7 +1023,11 @@ class HTML(HTMLParser.HTMLParser):
             data: The comment.
 
         """
-        self._logger.debug("comment - %s", data)
+        if self._debug_logging:
+            self._logger.debug("comment - %s", data)
+        if self._event_handler:
+            self._event_handler('comment', None, None, data)
+            return
         if data:
             data = data.replace("\n", "")
             data = data.replace("\r", "")
@@ -466,7 +1047,11 @@ class HTML(HTMLParser.HTMLParser):
             decl: The declaration.
 
         """
-        self._logger.debug("declaration - %s", decl)
+        if self._debug_logging:
+            self._logger.debug("declaration - %s", decl)
+        if self._event_handler:
+            self._event_handler('decl', None, None, decl)
+            return
         if decl:
             decl = decl.replace("\n", "")
             decl = decl.replace("\r", "")
@@ -486,7 +1071,11 @@ class HTML(HTMLParser.HTMLParser):
             data: The declaration.
 
         """
-        self._logger.debug("declaration - %s", data)
+        if self._debug_logging:
+            self._logger.debug("declaration - %s", data)
+        if self._event_handler:
+            self._event_handler('unknown_decl', None, None, data)
+            return
         if data:
             data = data.replace("\n", "")
             data = data.replace("\r", "")
@@ -514,7 +1103,7 @@ class HTML(HTMLParser.HTMLParser):
         return self.find_next_tag(tag_type, tag_attributes, tag_data)
 
     def find_next_tag(self, tag_type, tag_attributes=None, tag_data=None,
-                      index=0):
+                      index=0, end=None):
         """Find the next matching tag.
 
         Find the next matching tag using tag type attributes, or content.
@@ -524,32 +1113,343 @@ class HTML(HTMLParser.HTMLParser):
             tag_attributes: The tag attributes to search for.
             tag_data: The tag data to search for.
             index: the starting point in the flat list of tags.
+            end: The position in the flat list to stop the search at, or None
+                to search to the end of the document.
 
         Returns:
             The index in the flat list of the next matching tag, or -1.
 
         """
-        self._logger.info("Find next tag")
-        self._logger.debug("type = %s, attributes = %s, data = %s, index = %i",
-                           str(tag_type), str(tag_attributes), str(tag_data),
-                           index)
+        if self._debug_logging:
+            self._logger.debug("Find next tag: type = %s, attributes = %s, "
+                               "data = %s, index = %i", tag_type,
+                               tag_attributes, tag_data, index)
+        if end is None or end > self._number_of_tags:
+            end = self._number_of_tags
         if tag_type:
-            for i in range(index, self._number_of_tags):
+            # Only visit the positions of tags with a matching name
+            positions = self._tag_index.get(tag_type.lower(), [])
+            start = bisect.bisect_left(positions, index)
+            for j in xrange(start, len(positions)):
+                i = positions[j]
+                if i >= end:
+                    break
                 data = self._parsed_data[i]
-                if data[0].lower() == tag_type.lower():
-                    match = True
-                    if tag_attributes and len(data) > 1:
-                        if data[1] != tag_attributes:
-                            match = False
-                    if tag_data and len(data) > 2:
-                        if data[2] != tag_data:
-                            match = False
-                    if match:
+                match = True
+                if tag_attributes and len(data) > 1:
+                    if data[1] != tag_attributes:
+                        match = False
+                if tag_data and len(data) > 2:
+                    if data[2] != tag_data:
+                        match = False
+                if match:
+                    if self._debug_logging:
                         self._logger.debug("Matching tag index: %i", i)
-                        return i
-        self._logger.debug("Tag not found")
+                    return i
+        if self._debug_logging:
+            self._logger.debug("Tag not found")
+        return -1
+
+    def find_first_tag_with_attributes(self, tag_attributes, tag_type=None,
+                                       tag_data=None):
+        """Find the first tag having a set of attributes.
+
+        Args:
+            tag_attributes: A dictionary of attribute name/value pairs that
+                the tag must have. Other attributes of the tag are ignored.
+            tag_type: The type of tag to search for, or None for any type.
+            tag_data: The tag data to search for.
+
+        Returns:
+            The index in the flat list of the first matching tag, or -1.
+
+        """
+        return self.find_next_tag_with_attributes(tag_attributes, tag_type,
+                                                  tag_data)
+
+    def find_next_tag_with_attributes(self, tag_attributes, tag_type=None,
+                                      tag_data=None, index=0, end=None):
+        """Find the next tag having a set of attributes.
+
+        The lookup is answered from the attribute index when it was built
+        during parsing, visiting only the tags that carry the rarest of the
+        requested attribute values.
+
+        Args:
+            tag_attributes: A dictionary of attribute name/value pairs that
+                the tag must have. Other attributes of the tag are ignored.
+            tag_type: The type of tag to search for, or None for any type.
+            tag_data: The tag data to search for.
+            index: the starting point in the flat list of tags.
+            end: The position in the flat list to stop the search at, or None
+                to search to the end of the document.
+
+        Returns:
+            The index in the flat list of the next matching tag, or -1.
+
+        """
+        if self._debug_logging:
+            self._logger.debug("Find next tag with attributes: attributes = "
+                               "%s, type = %s, data = %s, index = %i",
+                               tag_attributes, tag_type, tag_data, index)
+        if end is None or end > self._number_of_tags:
+            end = self._number_of_tags
+        if not tag_attributes:
+            if self._debug_logging:
+                self._logger.debug("No attributes specified")
+            return -1
+        if self._attribute_index is not None:
+            candidates = None
+            for name, value in tag_attributes.iteritems():
+                positions = self._attribute_index.get(name, {}).get(value)
+                if not positions:
+                    if self._debug_logging:
+                        self._logger.debug("Tag not found")
+                    return -1
+                if candidates is None or len(positions) < len(candidates):
+                    candidates = positions
+        else:
+            candidates = xrange(end)
+        if tag_type:
+            tag_type = tag_type.lower()
+        start = bisect.bisect_left(candidates, index)
+        for j in xrange(start, len(candidates)):
+            i = candidates[j]
+            if i >= end:
+                break
+            data = self._parsed_data[i]
+            if tag_type and (not data[0] or data[0].lower() != tag_type):
+                continue
+            if tag_data and data[2] != tag_data:
+                continue
+            attributes = dict(data[1] or [])
+            match = True
+            for name, value in tag_attributes.iteritems():
+                if name not in attributes or attributes[name] != value:
+                    match = False
+                    break
+            if match:
+                if self._debug_logging:
+                    self._logger.debug("Matching tag index: %i", i)
+                return i
+        if self._debug_logging:
+            self._logger.debug("Tag not found")
         return -1
 
+    def find_all(self, tag_type=None, tag_attributes=None, tag_data=None,
+                 predicate=None, index=0, end=None, limit=None):
+        """Find all matching tags.
+
+        Args:
+            tag_type: The type of tag to search for, or None for any type.
+            tag_attributes: A dictionary of attribute name/value pairs that
+                the tag must have, or None. Other attributes of the tag are
+                ignored.
+            tag_data: The tag data to search for.
+            predicate: A callable taking a tag from the flat list and
+                returning True if it matches, or None.
+            index: the starting point in the flat list of tags.
+            end: The position in the flat list to stop the search at, or None
+                to search to the end of the document.
+            limit: The maximum number of tags to find, or None for all.
+
+        Returns:
+            A list of the indexes in the flat list of the matching tags.
+
+        """
+        return [i for i, tag in self.iter_tags(tag_type, tag_attributes,
+                                               tag_data, predicate, index,
+                                               end, limit)]
+
+    def iter_tags(self, tag_type=None, tag_attributes=None, tag_data=None,
+                  predicate=None, index=0, end=None, limit=None):
+        """Iterate over the matching tags in a single pass.
+
+        Only the tags in the tag or attribute index for the requested type
+        or attributes are visited, whichever are fewer.
+
+        Args:
+            tag_type: The type of tag to search for, or None for any type.
+            tag_attributes: A dictionary of attribute name/value pairs that
+                the tag must have, or None. Other attributes of the tag are
+                ignored.
+            tag_data: The tag data to search for.
+            predicate: A callable taking a tag from the flat list and
+                returning True if it matches, or None.
+            index: the starting point in the flat list of tags.
+            end: The position in the flat list to stop the search at, or None
+                to search to the end of the document.
+            limit: The maximum number of tags to find, or None for all.
+
+        Yields:
+            (index, tag) tuples of the matching tags in document order, where
+            tag is the list returned by get_tag().
+
+        """
+        if self._debug_logging:
+            self._logger.debug("Iterate tags: type = %s, attributes = %s, "
+                               "data = %s, index = %i", tag_type,
+                               tag_attributes, tag_data, index)
+        if limit is not None and limit <= 0:
+            return
+        if end is None or end > self._number_of_tags:
+            end = self._number_of_tags
+        candidates = None
+        check_type = False
+        if tag_type:
+            tag_type = tag_type.lower()
+            candidates = self._tag_index.get(tag_type, [])
+        if tag_attributes and self._attribute_index is not None:
+            for name, value in tag_attributes.iteritems():
+                positions = self._attribute_index.get(name, {}).get(value)
+                if not positions:
+                    return
+                if candidates is None or len(positions) < len(candidates):
+                    candidates = positions
+                    check_type = bool(tag_type)
+        if candidates is None:
+            candidates = xrange(end)
+        if tag_attributes:
+            tag_attributes = tag_attributes.items()
+        parsed_data = self._parsed_data
+        found = 0
+        start = bisect.bisect_left(candidates, index)
+        for j in xrange(start, len(candidates)):
+            i = candidates[j]
+            if i >= end:
+                break
+            tag = parsed_data[i]
+            if check_type and (not tag[0] or tag[0].lower() != tag_type):
+                continue
+            if tag_data and tag[2] != tag_data:
+                continue
+            if tag_attributes:
+                attributes = dict(tag[1] or [])
+                match = True
+                for name, value in tag_attributes:
+                    if name not in attributes or attributes[name] != value:
+                        match = False
+                        break
+                if not match:
+                    continue
+            if predicate is not None and not predicate(tag):
+                continue
+            yield i, tag
+            found += 1
+            if found == limit:
+                return
+
+    def get_subtree_end(self, index):
+        """Get the end of a tag's subtree in the flat list.
+
+        The tag's descendants are stored right after it, so they are the
+        tags from index + 1 up to, but not including, the subtree end.
+
+        Args:
+            index: The index of the tag in the flat list.
+
+        Returns:
+            The index after the tag's last descendant, or -1 if the index is
+            out of range.
+
+        """
+        if index >= 0 and index < self._number_of_tags:
+            return self._subtree_ends[index]
+        self._logger.warning("Index out of range")
+        return -1
+
+    def find_descendant_tag(self, ancestor_index, tag_type,
+                            tag_attributes=None, tag_data=None, index=None):
+        """Find the next matching tag among a tag's descendants.
+
+        The search stops at the end of the ancestor's subtree, so it only
+        costs the size of the subtree.
+
+        Args:
+            ancestor_index: The index of the ancestor tag in the flat list.
+            tag_type: The type of tag to search for.
+            tag_attributes: The tag attributes to search for.
+            tag_data: The tag data to search for.
+            index: The starting point in the flat list, or None to start at
+                the ancestor's first descendant.
+
+        Returns:
+            The index in the flat list of the next matching descendant, or
+            -1.
+
+        """
+        end = self.get_subtree_end(ancestor_index)
+        if end == -1:
+            return -1
+        if index is None or index <= ancestor_index:
+            index = ancestor_index + 1
+        return self.find_next_tag(tag_type, tag_attributes, tag_data, index,
+                                  end)
+
+    def find_descendant_tag_with_attributes(self, ancestor_index,
+                                            tag_attributes, tag_type=None,
+                                            tag_data=None, index=None):
+        """Find the next tag having a set of attributes among a tag's
+        descendants.
+
+        Args:
+            ancestor_index: The index of the ancestor tag in the flat list.
+            tag_attributes: A dictionary of attribute name/value pairs that
+                the tag must have. Other attributes of the tag are ignored.
+            tag_type: The type of tag to search for, or None for any type.
+            tag_data: The tag data to search for.
+            index: The starting point in the flat list, or None to start at
+                the ancestor's first descendant.
+
+        Returns:
+            The index in the flat list of the next matching descendant, or
+            -1.
+
+        """
+        end = self.get_subtree_end(ancestor_index)
+        if end == -1:
+            return -1
+        if index is None or index <= ancestor_index:
+            index = ancestor_index + 1
+        return self.find_next_tag_with_attributes(tag_attributes, tag_type,
+                                                  tag_data, index, end)
+
+    def iter_descendants(self, ancestor_index):
+        """Iterate over the positions of a tag's descendants.
+
+        Args:
+            ancestor_index: The index of the ancestor tag in the flat list.
+
+        Returns:
+            An iterator over the flat-list indexes of the descendants, in
+            document order. It is empty if the index is out of range.
+
+        """
+        end = self.get_subtree_end(ancestor_index)
+        if end == -1:
+            return iter(())
+        return iter(xrange(ancestor_index + 1, end))
+
+    def iter_children(self, parent_index):
+        """Iterate over the positions of a tag's children.
+
+        Each child's subtree is skipped in one step, so this costs only the
+        number of children.
+
+        Args:
+            parent_index: The index of the parent tag in the flat list.
+
+        Yields:
+            The flat-list indexes of the children, in document order.
+
+        """
+        end = self.get_subtree_end(parent_index)
+        subtree_ends = self._subtree_ends
+        child = parent_index + 1
+        while child < end:
+            yield child
+            child = subtree_ends[child]
+
     def get_tag(self, index):
         """Get the specified tag.
 
@@ -561,14 +1461,246 @@ class HTML(HTMLParser.HTMLParser):
             and tag content], or None on error.
 
         """
-        self._logger.info("Get tag")
-        self._logger.debug("Index: %i", index)
+        if self._debug_logging:
+            self._logger.debug("Get tag: index = %i", index)
         if index >= 0 and index < len(self._parsed_data):
             return self._parsed_data[index]
         else:
             self._logger.warning("Index out of range")
             return None
 
+    def get_compact_document(self):
+        """Get a compact copy of the parsed document.
+
+        The CompactDocument holds the same tags as the flat list, in the same
+        order, in arrays instead of per-tag Python objects. It can be kept
+        after this parser and its Tag tree are released.
+
+        Returns:
+            A CompactDocument of the parsed document.
+
+        """
+        self._logger.info("Get compact document")
+        return CompactDocument(self._root)
+
+    def select(self, selector, limit=None):
+        """Find the tags matching a CSS selector.
+
+        Selectors are compiled once and cached, see the selector module for
+        the supported syntax.
+
+        Args:
+            selector: The selector text, e.g. 'div.item > a[href^=http]'.
+            limit: The maximum number of tags to find, or None for all.
+
+        Returns:
+            A list of the matching Tag objects, in document order.
+
+        """
+        try:
+            return compile_selector(selector).select(self._root, limit)
+        except SelectorError as excep:
+            raise Error("Invalid selector: %s", str(excep))
+
+    def select_one(self, selector):
+        """Find the first tag matching a CSS selector.
+
+        Args:
+            selector: The selector text.
+
+        Returns:
+            The first matching Tag object, or None.
+
+        """
+        found = self.select(selector, 1)
+        if found:
+            return found[0]
+        return None
+
+    def xpath(self, expression, tag=None):
+        """Evaluate an XPath expression.
+
+        Expressions are compiled once and cached, see the xpath module for
+        the supported subset. A leading //name[@attr] step is answered from
+        the tag and attribute indexes.
+
+        Args:
+            expression: The expression text, e.g.
+                "//table[@id='x']/tr/td[2]/text()".
+            tag: The Tag relative paths start from, or None for the root.
+
+        Returns:
+            A list of the selected Tag objects in document order, or a list
+            of strings if the expression ends with text() or an attribute.
+
+        """
+        if tag is None:
+            tag = self._root
+        try:
+            return compile_xpath(expression).evaluate(
+                tag, self._tag_list, self._tag_index, self._attribute_index)
+        except XPathError as excep:
+            raise Error("Invalid XPath expression: %s", str(excep))
+
+    def unescape_document(self):
+        """Replace the character references in the data of every tag.
+
+        Tag data keeps character references as found while parsing. This
+        unescapes the data of all tags at once, except comments,
+        declarations and the contents of script and style tags.
+
+        """
+        self._logger.info("Unescaping the document")
+        if not self._parsed_data:
+            return
+        tags = []
+        stack = [self._root]
+        while stack:
+            tag = stack.pop()
+            tags.append(tag)
+            if tag.children:
+                stack.extend(reversed(tag.children))
+        values = unescape_texts([tag.data if tag.name not in _RAW_TEXT_TAGS
+                                 else None for tag in tags])
+        for position, tag in enumerate(tags):
+            value = values[position]
+            if value is not None and value is not tag.data:
+                tag.data = value
+                self._parsed_data[position][2] = value
+
+    def save_document(self, file_name):
+        """Save the parsed document to a binary file.
+
+        The file can be loaded with document.load_document(), memory-mapped,
+        to search it without parsing the markup again.
+
+        Args:
+            file_name: The file to write.
+
+        """
+        self._logger.info("Saving the document to: %s", file_name)
+        try:
+            self.get_compact_document().save(file_name)
+        except IOError as excep:
+            raise Error("IOError saving the document: %s", str(excep))
+
+
+def create_session(pool_connections=10, pool_maxsize=10,
+                   host_pool_sizes=None):
+    """Create an HTTP session with keep-alive connection pools.
+
+    Args:
+        pool_connections: The number of per-host connection pools to keep.
+        pool_maxsize: The number of connections to keep per host.
+        host_pool_sizes: A dictionary of host name to the number of
+            connections to keep for that host, overriding pool_maxsize.
+
+    Returns:
+        A requests.Session.
+
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if host_pool_sizes:
+        for host, pool_size in host_pool_sizes.iteritems():
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=pool_size)
+            session.mount('http://%s/' % host, adapter)
+            session.mount('https://%s/' % host, adapter)
+    return session
+
+def parse_documents(sources, processes=None, from_files=False,
+                    chunksize=1):
+    """Parse many documents across a pool of processes.
+
+    Parsing is CPU-bound, so spreading documents over processes uses all
+    cores. Each document is returned as a CompactDocument, which holds the
+    flat list of tags and the tree structure in arrays and is cheap to send
+    back from a worker, unlike a Tag tree with parent references.
+
+    Args:
+        sources: A list of HTML markup texts, or of file names if from_files
+            is True.
+        processes: The number of worker processes, or None for one per CPU.
+            With 1, documents are parsed in this process.
+        from_files: True if sources are file names to parse.
+        chunksize: The number of documents sent to a worker at a time.
+
+    Returns:
+        A list with, for each source in order, a CompactDocument, or None if
+        the source could not be parsed.
+
+    """
+    tasks = [(source, from_files) for source in sources]
+    if processes == 1:
+        return [_parse_document(task) for task in tasks]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_parse_document, tasks, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+def _parse_document(task):
+    """Parse one document of parse_documents() in a worker.
+
+    Args:
+        task: A tuple of (source, from_files), as passed to parse_documents.
+
+    Returns:
+        A CompactDocument of the parsed document, or None.
+
+    """
+    source, from_files = task
+    parser = HTML(configure_log=False)
+    try:
+        if from_files:
+            parsed = parser.parse_file(source)
+        else:
+            parsed = parser.parse(source)
+    except Error as excep:
+        parser._logger.error("Error parsing document: %s", excep)
+        return None
+    if not parsed:
+        return None
+    return parser.get_compact_document()
+
+def configure_logging(log_handler=None):
+    """Configure the log handler shared by all HTML parsers.
+
+    The module logger has at most one handler installed through this
+    function. Installing a different handler replaces the previous one, so
+    creating many parsers does not duplicate log records.
+
+    Args:
+        log_handler: The log handler to install, or None to keep the
+            installed handler, installing the default one if there is none.
+
+    Returns:
+        The installed log handler.
+
+    """
+    global _log_handler
+    with _log_lock:
+        logger = logging.getLogger(__name__)
+        if not log_handler:
+            if _log_handler:
+                return _log_handler
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s:'
+                                          '%(name)s:%(message)s')
+            log_handler = logging.StreamHandler(stream=sys.stdout)
+            log_handler.setLevel(logging.INFO)
+            log_handler.setFormatter(formatter)
+        if log_handler is not _log_handler:
+            if _log_handler:
+                logger.removeHandler(_log_handler)
+            logger.addHandler(log_handler)
+            _log_handler = log_handler
+        return _log_handler
+
 def escape_text(text):
     """Replace special characters with HTML escape codes.
 
@@ -585,8 +1717,74 @@ def escape_text(text):
         text = text.replace("'", "&#039;")
     return text
 
+
+def escape_texts(texts):
+    """Escape many texts at once.
+
+    The texts are joined into one buffer and escaped together, so each
+    special character costs one pass over the whole batch instead of
+    several passes and allocations per text, and characters missing from
+    the batch cost no pass at all. Gives the same results as escape_text(),
+    except that non-ASCII bytes in strings are kept as they are.
+
+    Args:
+        texts: An iterable of texts to escape.
+
+    Returns:
+        A list of the escaped texts, in order.
+
+    """
+    results = list(texts)
+    positions = [i for i, text in enumerate(results) if text]
+    if not positions:
+        return results
+    try:
+        joined = _BATCH_SEPARATOR.join([results[i] for i in positions])
+    except UnicodeDecodeError:
+        joined = None
+    # Texts holding the separator, or non-ASCII strings mixed with unicode,
+    # are escaped one at a time
+    if (joined is None or
+        joined.count(_BATCH_SEPARATOR) != len(positions) - 1):
+        for i in positions:
+            results[i] = _escape_batch(results[i])
+        return results
+    joined = _escape_batch(joined)
+    if len(positions) == len(results):
+        return joined.split(_BATCH_SEPARATOR)
+    for i, text in zip(positions, joined.split(_BATCH_SEPARATOR)):
+        results[i] = text
+    return results
+
+
+def _escape_batch(text):
+    """Escape a text, or texts joined by escape_texts().
+
+    Args:
+        text: The text to escape.
+
+    Returns:
+        The escaped text, with unicode encoded to ASCII and non-ASCII bytes
+        in strings kept as they are.
+
+    """
+    for character, reference in _ESCAPES:
+        if character in text:
+            text = text.replace(character, reference)
+    if isinstance(text, unicode):
+        text = text.encode('ascii', 'xmlcharrefreplace')
+    return text
+
+
 def unescape_text(text):
-    """Replace HTML escape codes with special characters.
+    """Replace HTML character references with the characters they stand for.
+
+    Named references from the full HTML5 table, and decimal and hexadecimal
+    references, are replaced. The most common references are replaced with
+    str.replace first, and only text holding other references is scanned
+    for them, in a single pass. &nbsp; is replaced with a plain space.
+    Unicode text gets unicode replacements; in a string, replacements are
+    encoded as UTF-8.
 
     Args:
         text: The text to unescape.
@@ -595,12 +1793,117 @@ def unescape_text(text):
         The unescaped text.
 
     """
-    if text:
-        text = text.replace("&quot;", "\"")
-        text = text.replace("&#039;", "'")
-        text = text.replace("&lt;", "<")
-        text = text.replace("&gt;", ">")
-        text = text.replace("&nbsp;", " ")
-        text = text.replace("&amp;", "&")
+    if text and '&' in text:
+        for reference, character in _COMMON_REFERENCES:
+            text = text.replace(reference, character)
+        # &amp; goes last, so the '&' it leaves is not read as a reference.
+        # If each '&' left began an &amp;, the text is 4 shorter per '&'
+        # and there are no other references to scan for
+        unescaped = text.replace('&amp;', '&')
+        if text.count('&') * 4 == len(text) - len(unescaped):
+            return unescaped
+        # A replacement can run on from a reference without a semicolon, as
+        # in &amp&quot;, which the scan still reads as &amp and then text
+        if isinstance(text, unicode):
+            references = _UNICODE_REFERENCES
+        else:
+            references = _STRING_REFERENCES
+        # Split into text and references in one pass, and replace the
+        # references by table lookups that stay in C for known references
+        parts = _CHARACTER_REFERENCE.split(text)
+        parts[1::2] = map(references.__getitem__, parts[1::2])
+        text = ''.join(parts)
     return text
 
+def unescape_texts(texts):
+    """Unescape many texts at once.
+
+    The strings, and the unicode texts, are joined into one buffer each and
+    unescaped together, which saves the per-text passes and calls of
+    unescape_text(). Gives the same results as unescape_text().
+
+    Args:
+        texts: An iterable of texts to unescape.
+
+    Returns:
+        A list of the unescaped texts, in order.
+
+    """
+    results = list(texts)
+    positions = [i for i, text in enumerate(results) if text]
+    unicode_positions = [i for i in positions
+                         if isinstance(results[i], unicode)]
+    if unicode_positions:
+        # Joining strings with unicode would make them unicode too
+        _unescape_batch(results, unicode_positions)
+        positions = [i for i in positions
+                     if not isinstance(results[i], unicode)]
+    _unescape_batch(results, positions)
+    return results
+
+
+def _unescape_batch(results, positions):
+    """Unescape texts of one type joined into one buffer, in place.
+
+    Args:
+        results: The list of texts.
+        positions: The positions in results of the texts to unescape, all
+            strings or all unicode.
+
+    """
+    if not positions:
+        return
+    joined = _BATCH_SEPARATOR.join([results[i] for i in positions])
+    # Texts holding the separator are unescaped one at a time
+    if joined.count(_BATCH_SEPARATOR) != len(positions) - 1:
+        for i in positions:
+            results[i] = unescape_text(results[i])
+        return
+    joined = unescape_text(joined)
+    if len(positions) == len(results):
+        results[:] = joined.split(_BATCH_SEPARATOR)
+        return
+    for i, text in zip(positions, joined.split(_BATCH_SEPARATOR)):
+        results[i] = text
+
+
+def _get_reference_text(reference, entity_table, encode):
+    """Get the replacement of a character reference.
+
+    Args:
+        reference: The reference without the leading '&'.
+        entity_table: A dictionary of reference names to replacement texts.
+        encode: True to encode numeric replacements as UTF-8.
+
+    Returns:
+        The replacement text.
+
+    """
+    if reference[0] == '#':
+        if reference[1] in 'xX':
+            number = int(reference[2:].rstrip(';'), 16)
+        else:
+            number = int(reference[1:].rstrip(';'))
+        if number in _INVALID_CHARACTER_REFERENCES:
+            character = _INVALID_CHARACTER_REFERENCES[number]
+        elif 0xD800 <= number <= 0xDFFF or number > 0x10FFFF:
+            character = u'\ufffd'
+        else:
+            try:
+                character = unichr(number)
+            except ValueError:
+                # Characters outside the BMP on narrow unicode builds
+                character = ('\\U%08x' % number).decode('unicode-escape')
+        if encode:
+            return character.encode('utf-8')
+        return character
+    text = entity_table.get(reference)
+    if text is not None:
+        return text
+    # Legacy references are also recognized without the semicolon, even
+    # when followed by other text
+    for length in xrange(len(reference) - 1, 1, -1):
+        text = entity_table.get(reference[:length])
+        if text is not None:
+            return text + reference[length:]
+    return '&' + reference
@@ -0,0 +1,335 @@
+"""This module provides request rate limiters.
+
+    Packages(s) required:
+    - collections
+    - multiprocessing
+    - threading
+    - time
+    - urlparse
+
+"""
+
+# Imports
+import collections
+import multiprocessing
+import threading
+import time
+import urlparse
+
+
+class RateLimiter(object):
+    """Sliding-window request rate limiter.
+
+    Allows at most requests_per_minute permits in any 60 second window, with
+    at least minimum_time_between_requests seconds between permits. Waiting
+    callers sleep exactly until the next permit is available. Safe to share
+    between threads.
+
+    Attributes:
+        requests_per_minute: The maximum number of requests allowed per minute,
+            or 0 for no limit.
+        minimum_time_between_requests: The minimum time required between
+            requests, in seconds.
+
+    """
+    # Public member variables
+    requests_per_minute = 120
+    minimum_time_between_requests = 0
+
+    # Private member variables
+    _window = None  # times of the permits given in the last minute
+    _last_request_time = None  # time of the last permit
+    _lock = None
+
+    def __init__(self, requests_per_minute=120,
+                 minimum_time_between_requests=0):
+        """Create a rate limiter with no permits given.
+
+        Args:
+            requests_per_minute: The maximum number of requests allowed per
+                minute, or 0 for no limit.
+            minimum_time_between_requests: The minimum time required between
+                requests, in seconds.
+
+        """
+        self.requests_per_minute = requests_per_minute
+        self.minimum_time_between_requests = minimum_time_between_requests
+        self._window = collections.deque()
+        self._lock = threading.Lock()
+
+    def time_until_next_permit(self):
+        """Get the time until the next permit is available.
+
+        Returns:
+            The number of seconds to wait, or 0 if a permit is available now.
+
+        """
+        with self._lock:
+            return self._delay(time.time())
+
+    def acquire(self, wait=True):
+        """Take a permit for one request.
+
+        Args:
+            wait: True to sleep until a permit is available.
+
+        Returns:
+            True if a permit was taken, or False if none was available and
+            wait is False.
+
+        """
+        while True:
+            with self._lock:
+                current_time = time.time()
+                delay = self._delay(current_time)
+                if delay <= 0:
+                    self._window.append(current_time)
+                    self._last_request_time = current_time
+                    return True
+            if not wait:
+                return False
+            time.sleep(delay)
+
+    def _delay(self, current_time):
+        """Get the time until the next permit, with the lock held.
+
+        Args:
+            current_time: The current time, from time.time().
+
+        Returns:
+            The number of seconds to wait, or 0.
+
+        """
+        # Forget permits that have left the window
+        window = self._window
+        while window and window[0] <= current_time - 60:
+            window.popleft()
+        delay = 0
+        if self._last_request_time is not None:
+            delay = (self._last_request_time +
+                     self.minimum_time_between_requests - current_time)
+        if (self.requests_per_minute and
+            len(window) >= self.requests_per_minute):
+            # The next permit is due when enough permits leave the window
+            oldest = window[len(window) - self.requests_per_minute]
+            delay = max(delay, oldest + 60 - current_time)
+        return max(delay, 0)
+
+
+class HostRateLimiter(object):
+    """Rate limiter keeping a separate RateLimiter per host.
+
+    Requests to different hosts do not wait for each other.
+
+    Attributes:
+        requests_per_minute: The maximum number of requests allowed per minute
+            to each host, or 0 for no limit.
+        minimum_time_between_requests: The minimum time required between
+            requests to each host, in seconds.
+
+    """
+    # Public member variables
+    requests_per_minute = 120
+    minimum_time_between_requests = 0
+
+    # Private member variables
+    _limiters = None  # host -> RateLimiter
+    _lock = None
+
+    def __init__(self, requests_per_minute=120,
+                 minimum_time_between_requests=0):
+        """Create a per-host rate limiter.
+
+        Args:
+            requests_per_minute: The maximum number of requests allowed per
+                minute to each host, or 0 for no limit.
+            minimum_time_between_requests: The minimum time required between
+                requests to each host, in seconds.
+
+        """
+        self.requests_per_minute = requests_per_minute
+        self.minimum_time_between_requests = minimum_time_between_requests
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get_limiter(self, url):
+        """Get the rate limiter for the host of a URL.
+
+        The limiter is updated to the current limits.
+
+        Args:
+            url: The URL, or None.
+
+        Returns:
+            The RateLimiter for the URL's host.
+
+        """
+        host = get_host(url)
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if not limiter:
+                limiter = RateLimiter()
+                self._limiters[host] = limiter
+        limiter.requests_per_minute = self.requests_per_minute
+        limiter.minimum_time_between_requests = (
+            self.minimum_time_between_requests)
+        return limiter
+
+    def time_until_next_permit(self, url=None):
+        """Get the time until the next permit for a URL's host.
+
+        Args:
+            url: The URL, or None.
+
+        Returns:
+            The number of seconds to wait, or 0 if a permit is available now.
+
+        """
+        return self.get_limiter(url).time_until_next_permit()
+
+    def acquire(self, url=None, wait=True):
+        """Take a permit for one request to a URL's host.
+
+        Args:
+            url: The URL, or None.
+            wait: True to sleep until a permit is available.
+
+        Returns:
+            True if a permit was taken, or False if none was available and
+            wait is False.
+
+        """
+        return self.get_limiter(url).acquire(wait)
+
+
+class SharedRateLimiter(object):
+    """Sliding-window rate limiter shared by threads and processes.
+
+    Enforces one global limit for every HTML instance, thread and worker
+    process using it. The permit times are kept in a ring buffer in shared
+    memory, guarded by a multiprocessing lock that is only held while a
+    permit is checked or taken. Create the limiter before starting the
+    worker processes and pass it to them when they start, e.g. as a
+    Process argument or a Pool initializer argument.
+
+    Attributes:
+        requests_per_minute: The maximum number of requests allowed per minute,
+            or 0 for no limit. It is fixed when the limiter is created.
+        minimum_time_between_requests: The minimum time required between
+            requests, in seconds.
+
+    """
+    # Public member variables
+    requests_per_minute = 120
+    minimum_time_between_requests = 0
+
+    # Private member variables
+    _times = None  # ring buffer of the last requests_per_minute permit times
+    _state = None  # index of the oldest permit time, time of the last permit
+    _lock = None
+
+    def __init__(self, requests_per_minute=120,
+                 minimum_time_between_requests=0):
+        """Create a shared rate limiter with no permits given.
+
+        Args:
+            requests_per_minute: The maximum number of requests allowed per
+                minute, or 0 for no limit.
+            minimum_time_between_requests: The minimum time required between
+                requests, in seconds.
+
+        """
+        self.requests_per_minute = requests_per_minute
+        self.minimum_time_between_requests = minimum_time_between_requests
+        self._times = multiprocessing.RawArray('d', max(requests_per_minute,
+                                                        1))
+        self._state = multiprocessing.RawArray('d', 2)
+        self._lock = multiprocessing.Lock()
+
+    def time_until_next_permit(self):
+        """Get the time until the next permit is available.
+
+        Returns:
+            The number of seconds to wait, or 0 if a permit is available now.
+
+        """
+        with self._lock:
+            return self._delay(time.time())
+
+    def acquire(self, wait=True):
+        """Take a permit for one request.
+
+        Args:
+            wait: True to sleep until a permit is available.
+
+        Returns:
+            True if a permit was taken, or False if none was available and
+            wait is False.
+
+        """
+        while True:
+            with self._lock:
+                current_time = time.time()
+                delay = self._delay(current_time)
+                if delay <= 0:
+                    if self.requests_per_minute:
+                        oldest = int(self._state[0])
+                        self._times[oldest] = current_time
+                        oldest += 1
+                        self._state[0] = oldest % self.requests_per_minute
+                    self._state[1] = current_time
+                    return True
+            if not wait:
+                return False
+            time.sleep(delay)
+
+    def get_limiter(self, url):
+        """Get the limiter for a URL, which is always this limiter.
+
+        The limit is shared by all hosts.
+
+        Args:
+            url: The URL, or None.
+
+        Returns:
+            This SharedRateLimiter.
+
+        """
+        return self
+
+    def _delay(self, current_time):
+        """Get the time until the next permit, with the lock held.
+
+        Args:
+            current_time: The current time, from time.time().
+
+        Returns:
+            The number of seconds to wait, or 0.
+
+        """
+        delay = 0
+        if self._state[1]:
+            delay = (self._state[1] + self.minimum_time_between_requests -
+                     current_time)
+        if self.requests_per_minute:
+            # The slot to be reused holds the oldest of the last
+            # requests_per_minute permits, or 0 if there were fewer
+            oldest = self._times[int(self._state[0])]
+            if oldest:
+                delay = max(delay, oldest + 60 - current_time)
+        return max(delay, 0)
+
+
+def get_host(url):
+    """Get the lowercased host and port of a URL.
+
+    Args:
+        url: The URL, or None.
+
+    Returns:
+        The host, or '' if the URL has none.
+
+    """
+    if not url:
+        return ''
+    return urlparse.urlsplit(url).netloc.lower()
@@ -0,0 +1,604 @@
+"""This module provides a CSS selector engine over the Tag tree.
+
+    Selectors are compiled once into match functions and cached by their
+    text, so a selector used on many documents is only parsed once.
+
+    Supported syntax:
+    - Type, universal, #id and .class selectors
+    - Attribute selectors: [a], [a=v], [a~=v], [a|=v], [a^=v], [a$=v] and
+      [a*=v], with quoted or unquoted values
+    - :first-child, :last-child, :only-child, :first-of-type,
+      :last-of-type, :only-of-type, :empty, :nth-child(),
+      :nth-last-child(), :nth-of-type(), :nth-last-of-type() and :not()
+    - Descendant, child (>), adjacent sibling (+) and general sibling (~)
+      combinators
+    - Selector lists separated by commas
+
+    Only tags with an attribute list are elements; the root, comments and
+    declarations are not.
+
+    Packages(s) required:
+    - collections
+    - re
+    - threading
+
+"""
+
+# Imports
+import collections
+import re
+import threading
+
+_IDENTIFIER = re.compile(r'[-\w]+', re.UNICODE)
+_COMBINATOR = re.compile(r'\s*([>+~])\s*|\s+')
+_ATTRIBUTE = re.compile(r'\[\s*([-\w:.]+)\s*(?:([~|^$*]?=)\s*'
+                        r'(?:"([^"]*)"|\'([^\']*)\'|([-\w.:/#%?&@+]+))\s*)?\]',
+                        re.UNICODE)
+_NTH = re.compile(r'^([+-]?\d*)n(?:\s*([+-])\s*(\d+))?$|^([+-]?\d+)$')
+_MAX_CACHED_SELECTORS = 256
+
+_cache = collections.OrderedDict()  # selector text -> Selector
+_cache_lock = threading.Lock()
+
+
+class Error(Exception):
+    """General base exception class for this module."""
+    pass
+
+
+class Selector(object):
+    """A compiled CSS selector list.
+
+    A Selector does not depend on any document and can be used with any
+    number of Tag trees.
+
+    Attributes:
+        text: The selector text.
+
+    """
+    # Public member variables
+    text = None
+
+    # Private member variables
+    _selectors = None  # list of compiled complex selectors, see _match()
+
+    def __init__(self, text):
+        """Compile a selector list.
+
+        Args:
+            text: The selector text, e.g. 'div.item > a[href^=http]'.
+
+        """
+        self.text = text
+        self._selectors = _Parser(text).parse()
+
+    def matches(self, tag):
+        """Check whether a tag matches the selector.
+
+        Args:
+            tag: The Tag to check.
+
+        Returns:
+            True if the tag is an element matching any selector in the list.
+
+        """
+        if tag is None or tag.attributes is None:
+            return False
+        context = {}
+        for steps in self._selectors:
+            if _match(tag, steps, 0, context):
+                return True
+        return False
+
+    def select(self, root, limit=None):
+        """Find the descendants of a tag matching the selector.
+
+        Args:
+            root: The Tag to search in, e.g. the root of a parsed document.
+            limit: The maximum number of tags to find, or None for all.
+
+        Returns:
+            A list of the matching Tags, in document order.
+
+        """
+        found = []
+        if root is None or not root.children or limit == 0:
+            return found
+        context = {}
+        selectors = self._selectors
+        stack = list(reversed(root.children))
+        while stack:
+            tag = stack.pop()
+            if tag.attributes is not None:
+                for steps in selectors:
+                    if _match(tag, steps, 0, context):
+                        found.append(tag)
+                        if limit is not None and len(found) >= limit:
+                            return found
+                        break
+            if tag.children:
+                stack.extend(reversed(tag.children))
+        return found
+
+    def select_one(self, root):
+        """Find the first descendant of a tag matching the selector.
+
+        Args:
+            root: The Tag to search in.
+
+        Returns:
+            The first matching Tag in document order, or None.
+
+        """
+        found = self.select(root, 1)
+        if found:
+            return found[0]
+        return None
+
+
+def compile_selector(text):
+    """Get the compiled Selector for a selector text.
+
+    Compiled selectors are cached, so each selector text is only parsed
+    once.
+
+    Args:
+        text: The selector text.
+
+    Returns:
+        The Selector.
+
+    """
+    with _cache_lock:
+        selector = _cache.pop(text, None)
+        if selector is not None:
+            _cache[text] = selector
+            return selector
+    selector = Selector(text)
+    with _cache_lock:
+        _cache[text] = selector
+        while len(_cache) > _MAX_CACHED_SELECTORS:
+            _cache.popitem(last=False)
+    return selector
+
+
+def select(root, text, limit=None):
+    """Find the descendants of a tag matching a CSS selector.
+
+    Args:
+        root: The Tag to search in.
+        text: The selector text.
+        limit: The maximum number of tags to find, or None for all.
+
+    Returns:
+        A list of the matching Tags, in document order.
+
+    """
+    return compile_selector(text).select(root, limit)
+
+
+def _match(tag, steps, step, context):
+    """Match a tag against a complex selector from one of its steps.
+
+    Args:
+        tag: The element to match.
+        steps: The compound selectors from right to left, as a list of
+            (match function, combinator to the next step) tuples.
+        step: The index of the step the tag must match.
+        context: A dictionary caching sibling lists during a search.
+
+    Returns:
+        True if the tag and its relatives match the remaining steps.
+
+    """
+    compound, combinator = steps[step]
+    if not compound(tag, context):
+        return False
+    step += 1
+    if step == len(steps):
+        return True
+    if combinator == '>':
+        parent = tag.parent
+        return (parent is not None and parent.attributes is not None and
+                _match(parent, steps, step, context))
+    if combinator == ' ':
+        parent = tag.parent
+        while parent is not None and parent.attributes is not None:
+            if _match(parent, steps, step, context):
+                return True
+            parent = parent.parent
+        return False
+    siblings, positions = _get_siblings(tag, context)
+    position = positions[id(tag)]
+    if combinator == '+':
+        return position > 0 and _match(siblings[position - 1], steps, step,
+                                        context)
+    for sibling in siblings[position - 1::-1] if position > 0 else ():
+        if _match(sibling, steps, step, context):
+            return True
+    return False
+
+
+def _get_siblings(tag, context):
+    """Get the element siblings of a tag, including the tag itself.
+
+    Args:
+        tag: The element.
+        context: A dictionary caching sibling lists during a search.
+
+    Returns:
+        A tuple of the list of sibling elements in order, and a dictionary
+        of id(sibling) to its position in the list.
+
+    """
+    parent = tag.parent
+    if parent is None:
+        return [tag], {id(tag): 0}
+    key = id(parent)
+    siblings = context.get(key)
+    if siblings is None:
+        elements = [child for child in parent.children
+                    if child.attributes is not None]
+        siblings = (elements, dict((id(element), position)
+                                   for position, element
+                                   in enumerate(elements)))
+        context[key] = siblings
+    return siblings
+
+
+def _get_attribute(tag, name):
+    """Get the value of a tag's attribute.
+
+    Args:
+        tag: The element.
+        name: The lowercased attribute name.
+
+    Returns:
+        The value, '' for an attribute without a value, or None if the tag
+        does not have the attribute.
+
+    """
+    for attribute_name, value in tag.attributes:
+        if attribute_name == name or attribute_name.lower() == name:
+            return value if value is not None else ''
+    return None
+
+
+def _nth_matcher(argument):
+    """Compile the argument of an :nth-* pseudo-class.
+
+    Args:
+        argument: The argument, e.g. 'odd', '3' or '2n+1'.
+
+    Returns:
+        A function of a 1-based position, true if the position matches.
+
+    """
+    argument = argument.strip().lower().replace(' ', '')
+    if argument == 'odd':
+        argument = '2n+1'
+    elif argument == 'even':
+        argument = '2n'
+    match = _NTH.match(argument)
+    if not match:
+        raise Error("Invalid :nth- argument: %s" % argument)
+    if match.group(4) is not None:
+        a, b = 0, int(match.group(4))
+    else:
+        a = match.group(1)
+        a = -1 if a == '-' else int(a) if a not in ('', '+') else 1
+        b = int(match.group(3) or 0)
+        if match.group(2) == '-':
+            b = -b
+    if a == 0:
+        return lambda position: position == b
+    return lambda position: ((position - b) % a == 0 and
+                             (position - b) // a >= 0)
+
+
+class _Parser(object):
+    """Parser compiling selector text into match functions."""
+
+    # Private member variables
+    _text = None
+    _position = 0
+
+    def __init__(self, text):
+        """Create a parser for a selector text.
+
+        Args:
+            text: The selector text.
+
+        """
+        self._text = text.strip() if text else ''
+        self._position = 0
+
+    def parse(self):
+        """Compile the selector list.
+
+        Returns:
+            A list of complex selectors, each a list of (match function,
+            combinator) tuples from right to left.
+
+        """
+        selectors = []
+        while True:
+            selectors.append(self._parse_complex())
+            self._skip_whitespace()
+            if self._position == len(self._text):
+                return selectors
+            if self._text[self._position] != ',':
+                self._fail("Unexpected character")
+            self._position += 1
+            self._skip_whitespace()
+
+    def _parse_complex(self):
+        """Compile one complex selector, e.g. 'div.item > a'.
+
+        Returns:
+            A list of (match function, combinator) tuples from right to left.
+
+        """
+        steps = [(self._parse_compound(), None)]
+        while self._position < len(self._text):
+            match = _COMBINATOR.match(self._text, self._position)
+            if not match:
+                break
+            end = match.end()
+            if end == len(self._text) or self._text[end] == ',':
+                if match.group(1):
+                    self._fail("Expected a selector after %s" %
+                               match.group(1))
+                self._position = end
+                break
+            self._position = end
+            steps.append((self._parse_compound(), match.group(1) or ' '))
+        # Each step holds the combinator to the step on its left, so the
+        # reversed list is in matching order
+        steps.reverse()
+        return steps
+
+    def _parse_compound(self):
+        """Compile a compound selector, e.g. 'a.link[href]:first-child'.
+
+        Returns:
+            A match function taking (tag, context).
+
+        """
+        tests = []
+        name = None
+        universal = False
+        text = self._text
+        if self._position < len(text) and text[self._position] == '*':
+            universal = True
+            self._position += 1
+        else:
+            match = _IDENTIFIER.match(text, self._position)
+            if match:
+                name = match.group().lower()
+                self._position = match.end()
+        while self._position < len(text):
+            character = text[self._position]
+            if character == '#':
+                tests.append(self._attribute_test('id', '=',
+                                                  self._identifier(1)))
+            elif character == '.':
+                tests.append(self._attribute_test('class', '~=',
+                                                  self._identifier(1)))
+            elif character == '[':
+                match = _ATTRIBUTE.match(text, self._position)
+                if not match:
+                    self._fail("Invalid attribute selector")
+                self._position = match.end()
+                value = match.group(3)
+                if value is None:
+                    value = match.group(4)
+                if value is None:
+                    value = match.group(5)
+                tests.append(self._attribute_test(match.group(1).lower(),
+                                                  match.group(2), value))
+            elif character == ':':
+                tests.append(self._parse_pseudo_class())
+            else:
+                break
+        if name is None and not tests and not universal:
+            self._fail("Expected a selector")
+        return _compound_test(name, tests)
+
+    def _parse_pseudo_class(self):
+        """Compile a pseudo-class, e.g. ':nth-child(2n+1)'.
+
+        Returns:
+            A match function taking (tag, context).
+
+        """
+        name = self._identifier(1).lower()
+        argument = None
+        if (self._position < len(self._text) and
+            self._text[self._position] == '('):
+            end = self._find_closing_parenthesis()
+            argument = self._text[self._position + 1:end]
+            self._position = end + 1
+        if name == 'not':
+            if argument is None:
+                self._fail(":not() needs an argument")
+            parser = _Parser(argument)
+            inner = parser._parse_compound()
+            if parser._position != len(parser._text):
+                self._fail(":not() takes a compound selector")
+            return lambda tag, context: not inner(tag, context)
+        if name == 'empty':
+            return lambda tag, context: not tag.data and not any(
+                child.attributes is not None for child in tag.children or ())
+        simple = {'first-child': ('nth-child', '1'),
+                  'last-child': ('nth-last-child', '1'),
+                  'first-of-type': ('nth-of-type', '1'),
+                  'last-of-type': ('nth-last-of-type', '1')}
+        if name in simple:
+            if argument is not None:
+                self._fail("Unexpected argument")
+            name, argument = simple[name]
+        if name == 'only-child':
+            return lambda tag, context: len(
+                _get_siblings(tag, context)[0]) == 1
+        if name == 'only-of-type':
+            return lambda tag, context: len(
+                _get_typed_siblings(tag, context)[0]) == 1
+        if name not in ('nth-child', 'nth-last-child', 'nth-of-type',
+                        'nth-last-of-type'):
+            self._fail("Unsupported pseudo-class :%s" % name)
+        if argument is None:
+            self._fail(":%s() needs an argument" % name)
+        try:
+            nth = _nth_matcher(argument)
+        except Error:
+            self._fail("Invalid :%s() argument" % name)
+        from_end = 'last' in name
+        of_type = name.endswith('of-type')
+
+        def test(tag, context):
+            """Check the position of the tag among its siblings."""
+            if of_type:
+                siblings, positions = _get_typed_siblings(tag, context)
+            else:
+                siblings, positions = _get_siblings(tag, context)
+            position = positions[id(tag)]
+            if from_end:
+                position = len(siblings) - position
+            else:
+                position += 1
+            return nth(position)
+        return test
+
+    def _attribute_test(self, name, operator, value):
+        """Compile an attribute test.
+
+        Args:
+            name: The lowercased attribute name.
+            operator: The comparison operator, or None to test presence.
+            value: The value to compare with.
+
+        Returns:
+            A match function taking (tag, context).
+
+        """
+        if operator is None:
+            return lambda tag, context: _get_attribute(tag, name) is not None
+        if operator == '=':
+            compare = lambda found: found == value
+        elif operator == '~=':
+            compare = lambda found: value in found.split()
+        elif operator == '|=':
+            compare = lambda found: (found == value or
+                                     found.startswith(value + '-'))
+        elif not value:
+            # Empty ^=, $= and *= values match nothing
+            return lambda tag, context: False
+        elif operator == '^=':
+            compare = lambda found: found.startswith(value)
+        elif operator == '$=':
+            compare = lambda found: found.endswith(value)
+        else:
+            compare = lambda found: value in found
+
+        def test(tag, context):
+            """Compare the attribute's value."""
+            found = _get_attribute(tag, name)
+            return found is not None and compare(found)
+        return test
+
+    def _identifier(self, skip):
+        """Read an identifier.
+
+        Args:
+            skip: The number of characters to skip before the identifier.
+
+        Returns:
+            The identifier.
+
+        """
+        match = _IDENTIFIER.match(self._text, self._position + skip)
+        if not match:
+            self._fail("Expected a name")
+        self._position = match.end()
+        return match.group()
+
+    def _find_closing_parenthesis(self):
+        """Find the parenthesis closing the one at the current position.
+
+        Returns:
+            The index of the closing parenthesis.
+
+        """
+        depth = 0
+        for index in xrange(self._position, len(self._text)):
+            if self._text[index] == '(':
+                depth += 1
+            elif self._text[index] == ')':
+                depth -= 1
+                if depth == 0:
+                    return index
+        self._fail("Missing )")
+
+    def _skip_whitespace(self):
+        """Move past any whitespace."""
+        while (self._position < len(self._text) and
+               self._text[self._position].isspace()):
+            self._position += 1
+
+    def _fail(self, message):
+        """Raise an error for the current position.
+
+        Args:
+            message: The description of the error.
+
+        """
+        raise Error("%s at position %i in selector: %s" %
+                    (message, self._position, self._text))
+
+
+def _compound_test(name, tests):
+    """Combine the tests of a compound selector into one match function.
+
+    Args:
+        name: The lowercased tag name to match, or None for any.
+        tests: A list of match functions taking (tag, context).
+
+    Returns:
+        A match function taking (tag, context).
+
+    """
+    def test(tag, context):
+        """Check the tag name and all tests."""
+        if name is not None and tag.name != name and (
+                not tag.name or tag.name.lower() != name):
+            return False
+        for attribute_test in tests:
+            if not attribute_test(tag, context):
+                return False
+        return True
+    return test
+
+
+def _get_typed_siblings(tag, context):
+    """Get the element siblings of a tag with the same name as the tag.
+
+    Args:
+        tag: The element.
+        context: A dictionary caching sibling lists during a search.
+
+    Returns:
+        A tuple of the list of siblings with the tag's name, including the
+        tag, and a dictionary of id(sibling) to its position in the list.
+
+    """
+    key = (id(tag.parent), tag.name)
+    siblings = context.get(key)
+    if siblings is None:
+        elements = [sibling for sibling in _get_siblings(tag, context)[0]
+                    if sibling.name == tag.name]
+        siblings = (elements, dict((id(element), position)
+                                   for position, element
+                                   in enumerate(elements)))
+        context[key] = siblings
+    return siblings
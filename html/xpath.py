@@ -0,0 +1,1027 @@
+"""This module provides an XPath subset evaluator over the Tag tree.
+
+    Expressions are parsed once into query plans and cached by their text,
+    so an expression used on many documents is only parsed once. With the
+    flat-list indexes of a parsed document, a leading //name[@attr] step is
+    answered from the tag and attribute indexes instead of a traversal.
+
+    Supported syntax:
+    - Absolute and relative location paths with / and // steps
+    - Name tests, *, . and ..
+    - A final text(), @name or @* step, selecting the tags' data or
+      attribute values instead of tags
+    - Predicates with positions ([2], [last()], [position() < 3]),
+      attribute tests ([@id], [@id='x']), text tests ([text()='x']),
+      child tests ([td], [span='x']), comparisons (=, !=, <, <=, >, >=),
+      + and -, and, or, and the functions not(), contains(),
+      starts-with(), ends-with(), normalize-space(), string-length(),
+      count(), position() and last()
+    - Unions of paths with |
+
+    Only tags with an attribute list are elements; the root, comments and
+    declarations are not. The text of a tag is its data, so text() and .
+    both compare the tag's own text.
+
+    Packages(s) required:
+    - collections
+    - re
+    - threading
+
+"""
+
+# Imports
+import collections
+import re
+import threading
+
+_TOKEN = re.compile(r'\s*(?:(\d+(?:\.\d*)?|\.\d+)|"([^"]*)"|\'([^\']*)\'|'
+                    r'([A-Za-z_][-\w.]*)|(//|\.\.|!=|<=|>=|[/\[\]().,@*|='
+                    r'<>+-]))', re.UNICODE)
+_MAX_CACHED_EXPRESSIONS = 256
+
+_cache = collections.OrderedDict()  # expression text -> XPath
+_cache_lock = threading.Lock()
+
+
+class Error(Exception):
+    """General base exception class for this module."""
+    pass
+
+
+class XPath(object):
+    """A compiled XPath expression.
+
+    An XPath does not depend on any document and can be evaluated against
+    any number of Tag trees.
+
+    Attributes:
+        expression: The expression text.
+
+    """
+    # Public member variables
+    expression = None
+
+    # Private member variables
+    _paths = None  # list of (absolute, steps) tuples, one per union member
+
+    def __init__(self, expression):
+        """Compile an expression into a query plan.
+
+        Args:
+            expression: The expression text, e.g. "//tr/td[2]/text()".
+
+        """
+        self.expression = expression
+        self._paths = _Parser(expression).parse()
+
+    def evaluate(self, context, tag_list=None, tag_index=None,
+                 attribute_index=None):
+        """Evaluate the expression.
+
+        The indexes are optional. When given, they must describe the
+        document the context tag belongs to, as built by the HTML parser.
+
+        Args:
+            context: The Tag relative paths start from, e.g. the root of a
+                parsed document. Absolute paths start from the root of the
+                context's tree.
+            tag_list: The Tags in flat-list order, or None.
+            tag_index: A dictionary of lowercased tag name to sorted
+                flat-list positions, or None.
+            attribute_index: A dictionary of attribute name to value to
+                sorted flat-list positions, or None.
+
+        Returns:
+            A list of the selected Tags in document order, or a list of
+            strings if the paths end with text() or an attribute step.
+
+        """
+        if context is None:
+            return []
+        indexes = None
+        if tag_list and tag_index is not None:
+            indexes = (tag_list, tag_index, attribute_index)
+        results = []
+        for absolute, steps in self._paths:
+            start = context
+            if absolute:
+                while start.parent is not None:
+                    start = start.parent
+            results.append(_evaluate_path(start, steps, indexes))
+        if len(results) == 1:
+            return results[0]
+        if all(_is_tag_list(result) for result in results):
+            return _document_order([tag for result in results
+                                    for tag in result])
+        return [value for result in results for value in result]
+
+
+def compile_xpath(expression):
+    """Get the compiled XPath for an expression.
+
+    Compiled expressions are cached, so each expression is only parsed
+    once.
+
+    Args:
+        expression: The expression text.
+
+    Returns:
+        The XPath.
+
+    """
+    with _cache_lock:
+        xpath = _cache.pop(expression, None)
+        if xpath is not None:
+            _cache[expression] = xpath
+            return xpath
+    xpath = XPath(expression)
+    with _cache_lock:
+        _cache[expression] = xpath
+        while len(_cache) > _MAX_CACHED_EXPRESSIONS:
+            _cache.popitem(last=False)
+    return xpath
+
+
+def evaluate(context, expression):
+    """Evaluate an XPath expression without indexes.
+
+    Args:
+        context: The Tag relative paths start from.
+        expression: The expression text.
+
+    Returns:
+        A list of Tags or strings, see XPath.evaluate().
+
+    """
+    return compile_xpath(expression).evaluate(context)
+
+
+def _evaluate_path(start, steps, indexes):
+    """Evaluate the steps of a location path.
+
+    Args:
+        start: The Tag the path starts from.
+        steps: A list of _Step objects.
+        indexes: A tuple of the tag list, tag index and attribute index of
+            the start Tag's document, or None.
+
+    Returns:
+        A list of Tags in document order, or a list of strings.
+
+    """
+    tags = [start]
+    nested = False  # True if some tags may be descendants of others
+    first = 0
+    if (indexes and steps and indexes[0][0] is start and
+            steps[0].axis == 'descendant' and steps[0].indexable):
+        tags = _indexed_step(steps[0], indexes)
+        nested = True
+        first = 1
+    for step in steps[first:]:
+        axis = step.axis
+        if axis == 'child':
+            found = []
+            for tag in tags:
+                found.extend(step.filter(_child_elements(tag, step.name)))
+            if nested and len(tags) > 1:
+                found = _document_order(found)
+            tags = found
+        elif axis == 'descendant':
+            tags = _descendant_step(tags, step)
+            nested = True
+        elif axis == 'parent':
+            tags = _document_order([tag.parent for tag in tags
+                                    if tag.parent is not None])
+            nested = True
+        elif axis == 'text':
+            if step.descendant:
+                tags = _descendants_or_self(tags)
+            return [tag.data for tag in tags
+                    if tag.attributes is not None and tag.data]
+        elif axis == 'attribute':
+            values = []
+            for tag in tags:
+                for name, value in tag.attributes or ():
+                    if step.name is None or name.lower() == step.name:
+                        values.append(value if value is not None else '')
+            return values
+    return tags
+
+
+def _indexed_step(step, indexes):
+    """Answer a leading //name[@attr] step from the flat-list indexes.
+
+    Args:
+        step: The first _Step of the path, a descendant step without
+            positional predicates.
+        indexes: A tuple of the tag list, tag index and attribute index.
+
+    Returns:
+        A list of the selected Tags in document order.
+
+    """
+    tag_list, tag_index, attribute_index = indexes
+    candidates = None
+    if step.name is not None:
+        candidates = tag_index.get(step.name, [])
+    if attribute_index is not None:
+        for name, value in step.hints:
+            values = attribute_index.get(name)
+            if values is None:
+                return []
+            if value is not None:
+                positions = values.get(value, [])
+            else:
+                positions = sorted(position for group in values.itervalues()
+                                   for position in group)
+            if candidates is None or len(positions) < len(candidates):
+                candidates = positions
+    if candidates is None:
+        return _descendant_step([tag_list[0]], step)
+    name = step.name
+    tags = [tag_list[position] for position in candidates]
+    return step.filter([tag for tag in tags if tag.attributes is not None and
+                        (name is None or tag.name == name)])
+
+
+def _descendant_step(tags, step):
+    """Select the children of the tags and their descendants matching a step.
+
+    Args:
+        tags: The context Tags, in document order.
+        step: The _Step to apply to every context and descendant Tag.
+
+    Returns:
+        A list of the selected Tags in document order.
+
+    """
+    found = []
+    visited = set()
+    for context in tags:
+        if id(context) in visited:
+            # Already searched as part of an earlier context
+            continue
+        selected = set()
+        stack = [context]
+        while stack:
+            tag = stack.pop()
+            visited.add(id(tag))
+            if id(tag) in selected:
+                found.append(tag)
+            if tag.children:
+                for child in step.filter(_child_elements(tag, step.name)):
+                    selected.add(id(child))
+                stack.extend(reversed(tag.children))
+    return found
+
+
+def _descendants_or_self(tags):
+    """Get the tags and all of their descendants.
+
+    Args:
+        tags: The Tags, in document order.
+
+    Returns:
+        A list of Tags in document order, without duplicates.
+
+    """
+    found = []
+    visited = set()
+    for context in tags:
+        stack = [context]
+        while stack:
+            tag = stack.pop()
+            if id(tag) in visited:
+                continue
+            visited.add(id(tag))
+            found.append(tag)
+            if tag.children:
+                stack.extend(reversed(tag.children))
+    return found
+
+
+def _child_elements(tag, name):
+    """Get the element children of a tag matching a name test.
+
+    Args:
+        tag: The parent Tag.
+        name: The lowercased tag name, or None for any element.
+
+    Returns:
+        A list of the matching children, in order.
+
+    """
+    if name is None:
+        return [child for child in tag.children or ()
+                if child.attributes is not None]
+    return [child for child in tag.children or ()
+            if child.name == name and child.attributes is not None]
+
+
+def _document_order(tags):
+    """Sort tags from one tree into document order and drop duplicates.
+
+    Args:
+        tags: A list of Tags.
+
+    Returns:
+        The list of distinct Tags, in document order.
+
+    """
+    if len(tags) < 2:
+        return tags
+    wanted = set(id(tag) for tag in tags)
+    top = tags[0]
+    while top.parent is not None:
+        top = top.parent
+    ordered = []
+    stack = [top]
+    while stack and len(ordered) < len(wanted):
+        tag = stack.pop()
+        if id(tag) in wanted:
+            ordered.append(tag)
+        if tag.children:
+            stack.extend(reversed(tag.children))
+    return ordered
+
+
+def _is_tag_list(values):
+    """Check whether a path result holds Tags rather than strings.
+
+    Args:
+        values: The result of a path.
+
+    Returns:
+        True unless the first value is a string.
+
+    """
+    return not values or not isinstance(values[0], basestring)
+
+
+class _Step(object):
+    """One step of a location path.
+
+    Attributes:
+        axis: 'child', 'descendant', 'parent', 'text' or 'attribute'.
+        name: The lowercased name test, or None for *.
+        descendant: True if the step followed //.
+        predicates: A list of (function, positional) tuples, where function
+            takes (tag, position, size).
+        indexable: True if no predicate depends on the position.
+        hints: A list of (attribute name, value) tuples every selected tag
+            must have, with None for any value.
+
+    """
+    # Public member variables
+    axis = None
+    name = None
+    descendant = False
+    predicates = None
+    indexable = True
+    hints = None
+
+    def __init__(self, axis, name=None, descendant=False):
+        """Create a step without predicates.
+
+        Args:
+            axis: The axis of the step.
+            name: The lowercased name test, or None for *.
+            descendant: True if the step followed //.
+
+        """
+        self.axis = axis
+        self.name = name
+        self.descendant = descendant
+        self.predicates = []
+        self.hints = []
+
+    def filter(self, tags):
+        """Apply the predicates to the candidates of one context.
+
+        Args:
+            tags: The candidate Tags, in document order.
+
+        Returns:
+            The Tags satisfying every predicate.
+
+        """
+        for predicate, positional in self.predicates:
+            size = len(tags)
+            found = []
+            for position, tag in enumerate(tags, 1):
+                result = predicate(tag, position, size)
+                if isinstance(result, (int, long, float)) and not (
+                        isinstance(result, bool)):
+                    result = result == position
+                elif isinstance(result, list):
+                    result = bool(result)
+                if result:
+                    found.append(tag)
+            tags = found
+        return tags
+
+
+class _Parser(object):
+    """Parser compiling an expression into location paths."""
+
+    # Private member variables
+    _expression = None
+    _tokens = None  # list of (kind, value) tuples
+    _position = 0  # index of the next token
+    _positional = False  # True once position() or last() is used
+
+    def __init__(self, expression):
+        """Create a parser for an expression.
+
+        Args:
+            expression: The expression text.
+
+        """
+        self._expression = expression.strip() if expression else ''
+        self._tokens = _tokenize(self._expression)
+        self._position = 0
+
+    def parse(self):
+        """Compile the expression.
+
+        Returns:
+            A list of (absolute, steps) tuples, one per path in the union.
+
+        """
+        if not self._tokens:
+            self._fail("Empty expression")
+        paths = [self._parse_path()]
+        while self._accept('|'):
+            paths.append(self._parse_path())
+        if self._position < len(self._tokens):
+            self._fail("Unexpected %s" % self._tokens[self._position][1])
+        return paths
+
+    def _parse_path(self):
+        """Compile one location path, e.g. "//table[@id='x']/tr".
+
+        Returns:
+            A tuple of True if the path is absolute, and the list of
+            _Step objects.
+
+        """
+        steps = []
+        absolute = False
+        descendant = False
+        if self._accept('//'):
+            absolute = descendant = True
+        elif self._accept('/'):
+            absolute = True
+            if not self._starts_step():
+                return absolute, steps
+        while True:
+            step = self._parse_step(descendant)
+            if step is not None:
+                if steps and steps[-1].axis in ('text', 'attribute'):
+                    self._fail("%s must be the last step" %
+                               steps[-1].axis)
+                steps.append(step)
+            if self._accept('//'):
+                descendant = True
+            elif self._accept('/'):
+                descendant = False
+            else:
+                return absolute, steps
+
+    def _parse_step(self, descendant):
+        """Compile one step and its predicates.
+
+        Args:
+            descendant: True if the step followed //.
+
+        Returns:
+            The _Step, or None for a '.' step that selects the context.
+
+        """
+        if self._accept('.'):
+            if descendant:
+                return _Step('descendant')
+            return None
+        if self._accept('..'):
+            if descendant:
+                self._fail("Unsupported //..")
+            return _Step('parent')
+        if self._accept('@'):
+            if self._accept('*'):
+                return _Step('attribute')
+            return _Step('attribute', self._name().lower())
+        if self._accept('*'):
+            step = _Step('descendant' if descendant else 'child')
+        else:
+            name = self._name()
+            if self._peek() == '(':
+                if name != 'text':
+                    self._fail("Unsupported node test %s()" % name)
+                self._expect('(')
+                self._expect(')')
+                return _Step('text', descendant=descendant)
+            step = _Step('descendant' if descendant else 'child',
+                         name.lower())
+        while self._accept('['):
+            self._positional = False
+            predicate, kind = self._parse_or()
+            self._expect(']')
+            positional = self._positional or kind == 'number'
+            step.predicates.append((predicate, positional))
+            if positional:
+                step.indexable = False
+            elif step.indexable:
+                step.hints.extend(getattr(predicate, 'hints', ()))
+        return step
+
+    def _parse_or(self):
+        """Compile an 'or' expression.
+
+        Returns:
+            A tuple of the function taking (tag, position, size), and the
+            static kind of its value: 'number', 'boolean' or 'value'.
+
+        """
+        left, kind = self._parse_and()
+        while self._accept_name('or'):
+            right = self._parse_and()[0]
+            left = _or(left, right)
+            kind = 'boolean'
+        return left, kind
+
+    def _parse_and(self):
+        """Compile an 'and' expression.
+
+        Returns:
+            A tuple of the function and its static kind.
+
+        """
+        left, kind = self._parse_comparison()
+        while self._accept_name('and'):
+            right = self._parse_comparison()[0]
+            hints = (getattr(left, 'hints', []) +
+                     getattr(right, 'hints', []))
+            left = _and(left, right)
+            left.hints = hints
+            kind = 'boolean'
+        return left, kind
+
+    def _parse_comparison(self):
+        """Compile a comparison, e.g. "@id='x'" or 'position() < 3'.
+
+        Returns:
+            A tuple of the function and its static kind.
+
+        """
+        left, kind = self._parse_additive()
+        operator = self._peek()
+        if operator in ('=', '!=', '<', '<=', '>', '>='):
+            self._position += 1
+            right, right_kind = self._parse_additive()
+            comparison = _comparison(left, operator, right)
+            attribute = getattr(left, 'attribute', None)
+            value = getattr(right, 'constant', None)
+            if (operator == '=' and attribute and
+                    isinstance(value, basestring) and value):
+                # Only tags with this value can match
+                comparison.hints = [(attribute, value)]
+            return comparison, 'boolean'
+        attribute = getattr(left, 'attribute', None)
+        if attribute:
+            left.hints = [(attribute, None)]
+        return left, kind
+
+    def _parse_additive(self):
+        """Compile + and - arithmetic.
+
+        Returns:
+            A tuple of the function and its static kind.
+
+        """
+        left, kind = self._parse_value()
+        while self._peek() in ('+', '-'):
+            operator = self._tokens[self._position][1]
+            self._position += 1
+            right = self._parse_value()[0]
+            left = _arithmetic(left, operator, right)
+            kind = 'number'
+        return left, kind
+
+    def _parse_value(self):
+        """Compile a literal, attribute, path or function call.
+
+        Returns:
+            A tuple of the function and its static kind.
+
+        """
+        if self._position >= len(self._tokens):
+            self._fail("Unexpected end of expression")
+        kind, value = self._tokens[self._position]
+        if kind == 'number':
+            self._position += 1
+            number = float(value)
+            if number == int(number):
+                number = int(number)
+            return _constant(number), 'number'
+        if kind == 'string':
+            self._position += 1
+            return _constant(value), 'value'
+        if self._accept('('):
+            result = self._parse_or()
+            self._expect(')')
+            return result
+        if self._accept('@'):
+            name = self._name().lower()
+            function = lambda tag, position, size: _attribute_values(
+                tag, name)
+            function.attribute = name
+            return function, 'value'
+        if self._accept('.'):
+            return (lambda tag, position, size: tag.data or '', 'value')
+        if kind != 'name':
+            self._fail("Unexpected %s" % value)
+        name = self._name()
+        if self._peek() != '(':
+            name = name.lower()
+            return (lambda tag, position, size: [
+                child.data or '' for child in _child_elements(tag, name)],
+                'value')
+        self._expect('(')
+        arguments = []
+        if not self._accept(')'):
+            arguments.append(self._parse_or()[0])
+            while self._accept(','):
+                arguments.append(self._parse_or()[0])
+            self._expect(')')
+        return self._function(name, arguments)
+
+    def _function(self, name, arguments):
+        """Compile a function call.
+
+        Args:
+            name: The function name.
+            arguments: The compiled argument functions.
+
+        Returns:
+            A tuple of the function and its static kind.
+
+        """
+        counts = {'text': 0, 'position': 0, 'last': 0, 'not': 1,
+                  'contains': 2, 'starts-with': 2, 'ends-with': 2,
+                  'normalize-space': (0, 1), 'string-length': (0, 1),
+                  'count': 1}
+        if name not in counts:
+            self._fail("Unsupported function %s()" % name)
+        expected = counts[name]
+        if not isinstance(expected, tuple):
+            expected = (expected,)
+        if len(arguments) not in expected:
+            self._fail("Wrong number of arguments for %s()" % name)
+        if name == 'text':
+            return (lambda tag, position, size:
+                    [tag.data] if tag.data else [], 'value')
+        if name == 'position':
+            self._positional = True
+            return lambda tag, position, size: position, 'number'
+        if name == 'last':
+            self._positional = True
+            return lambda tag, position, size: size, 'number'
+        if name == 'not':
+            inner = arguments[0]
+            return (lambda tag, position, size:
+                    not _boolean(inner(tag, position, size)), 'boolean')
+        if name == 'count':
+            inner = arguments[0]
+            return (lambda tag, position, size:
+                    len(_as_list(inner(tag, position, size))), 'number')
+        if not arguments:
+            arguments = [lambda tag, position, size: tag.data or '']
+        strings = [_string_function(argument) for argument in arguments]
+        if name == 'normalize-space':
+            inner = strings[0]
+            return (lambda tag, position, size:
+                    ' '.join(inner(tag, position, size).split()), 'value')
+        if name == 'string-length':
+            inner = strings[0]
+            return (lambda tag, position, size:
+                    len(inner(tag, position, size)), 'number')
+        first, second = strings
+        if name == 'contains':
+            compare = lambda text, part: part in text
+        elif name == 'starts-with':
+            compare = lambda text, part: text.startswith(part)
+        else:
+            compare = lambda text, part: text.endswith(part)
+        return (lambda tag, position, size:
+                compare(first(tag, position, size),
+                        second(tag, position, size)), 'boolean')
+
+    def _starts_step(self):
+        """Check whether the next token can start a step.
+
+        Returns:
+            True if a step follows.
+
+        """
+        if self._position >= len(self._tokens):
+            return False
+        kind, value = self._tokens[self._position]
+        return kind == 'name' or value in ('.', '..', '@', '*')
+
+    def _peek(self):
+        """Get the next operator token without consuming it.
+
+        Returns:
+            The operator, or None if the next token is not an operator.
+
+        """
+        if self._position < len(self._tokens):
+            kind, value = self._tokens[self._position]
+            if kind == 'operator':
+                return value
+        return None
+
+    def _accept(self, operator):
+        """Consume the next token if it is an operator.
+
+        Args:
+            operator: The operator to accept.
+
+        Returns:
+            True if the operator was consumed.
+
+        """
+        if self._peek() == operator:
+            self._position += 1
+            return True
+        return False
+
+    def _accept_name(self, name):
+        """Consume the next token if it is a name.
+
+        Args:
+            name: The name to accept, e.g. 'and'.
+
+        Returns:
+            True if the name was consumed.
+
+        """
+        if (self._position < len(self._tokens) and
+                self._tokens[self._position] == ('name', name)):
+            self._position += 1
+            return True
+        return False
+
+    def _expect(self, operator):
+        """Consume an operator that must come next.
+
+        Args:
+            operator: The expected operator.
+
+        """
+        if not self._accept(operator):
+            self._fail("Expected %s" % operator)
+
+    def _name(self):
+        """Consume a name that must come next.
+
+        Returns:
+            The name.
+
+        """
+        if (self._position >= len(self._tokens) or
+                self._tokens[self._position][0] != 'name'):
+            self._fail("Expected a name")
+        self._position += 1
+        return self._tokens[self._position - 1][1]
+
+    def _fail(self, message):
+        """Raise an error for the current token.
+
+        Args:
+            message: The description of the error.
+
+        """
+        raise Error("%s at token %i in expression: %s" %
+                    (message, self._position, self._expression))
+
+
+def _tokenize(expression):
+    """Split an expression into tokens.
+
+    Args:
+        expression: The expression text.
+
+    Returns:
+        A list of (kind, value) tuples, where kind is 'number', 'string',
+        'name' or 'operator'.
+
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise Error("Invalid character at position %i in expression: %s"
+                        % (position, expression))
+        number, double, single, name, operator = match.groups()
+        if number is not None:
+            tokens.append(('number', number))
+        elif double is not None or single is not None:
+            tokens.append(('string', double if double is not None
+                           else single))
+        elif name is not None:
+            tokens.append(('name', name))
+        else:
+            tokens.append(('operator', operator))
+        position = match.end()
+    return tokens
+
+
+def _attribute_values(tag, name):
+    """Get the values of a tag's attribute, as a node-set.
+
+    Args:
+        tag: The Tag.
+        name: The lowercased attribute name.
+
+    Returns:
+        A list holding the value, '' for an attribute without a value, or
+        an empty list if the tag does not have the attribute.
+
+    """
+    for attribute_name, value in tag.attributes or ():
+        if attribute_name == name or attribute_name.lower() == name:
+            return [value if value is not None else '']
+    return []
+
+
+def _constant(value):
+    """Compile a literal.
+
+    Args:
+        value: The number or string.
+
+    Returns:
+        A function taking (tag, position, size) returning the value.
+
+    """
+    function = lambda tag, position, size: value
+    function.constant = value
+    return function
+
+
+def _or(left, right):
+    """Combine two functions with a logical or."""
+    return lambda tag, position, size: (
+        _boolean(left(tag, position, size)) or
+        _boolean(right(tag, position, size)))
+
+
+def _and(left, right):
+    """Combine two functions with a logical and."""
+    return lambda tag, position, size: (
+        _boolean(left(tag, position, size)) and
+        _boolean(right(tag, position, size)))
+
+
+def _arithmetic(left, operator, right):
+    """Combine two functions with + or -.
+
+    Args:
+        left: The left operand function.
+        operator: '+' or '-'.
+        right: The right operand function.
+
+    Returns:
+        A function taking (tag, position, size).
+
+    """
+    sign = 1 if operator == '+' else -1
+
+    def calculate(tag, position, size):
+        """Add or subtract the operands as numbers."""
+        return (_number(left(tag, position, size)) +
+                sign * _number(right(tag, position, size)))
+    return calculate
+
+
+def _comparison(left, operator, right):
+    """Combine two functions with a comparison operator.
+
+    Node-sets compare true if any of their values does, as in XPath.
+
+    Args:
+        left: The left operand function.
+        operator: One of =, !=, <, <=, > and >=.
+        right: The right operand function.
+
+    Returns:
+        A function taking (tag, position, size).
+
+    """
+    def compare(tag, position, size):
+        """Compare the operands."""
+        left_values = _as_list(left(tag, position, size))
+        right_values = _as_list(right(tag, position, size))
+        for left_value in left_values:
+            for right_value in right_values:
+                if _compare(left_value, operator, right_value):
+                    return True
+        return False
+    return compare
+
+
+def _compare(left, operator, right):
+    """Compare two values.
+
+    Args:
+        left: A string, number or boolean.
+        operator: One of =, !=, <, <=, > and >=.
+        right: A string, number or boolean.
+
+    Returns:
+        The result of the comparison.
+
+    """
+    if operator in ('=', '!='):
+        if isinstance(left, bool) or isinstance(right, bool):
+            equal = _boolean(left) == _boolean(right)
+        elif (isinstance(left, basestring) and
+              isinstance(right, basestring)):
+            equal = left == right
+        else:
+            equal = _number(left) == _number(right)
+        return equal if operator == '=' else not equal
+    left = _number(left)
+    right = _number(right)
+    if left != left or right != right:
+        # Comparisons with NaN are false
+        return False
+    if operator == '<':
+        return left < right
+    if operator == '<=':
+        return left <= right
+    if operator == '>':
+        return left > right
+    return left >= right
+
+
+def _as_list(value):
+    """Wrap a value in a list, unless it is a node-set already."""
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _boolean(value):
+    """Convert a value to a boolean, as XPath's boolean() does."""
+    if isinstance(value, float) and value != value:
+        return False
+    return bool(value)
+
+
+def _number(value):
+    """Convert a value to a number, as XPath's number() does.
+
+    Args:
+        value: A string, number, boolean or node-set.
+
+    Returns:
+        The number, or NaN if the value is not a number.
+
+    """
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    if isinstance(value, (bool, int, long, float)):
+        return value
+    try:
+        return float(value.strip())
+    except ValueError:
+        return float('nan')
+
+
+def _string_function(function):
+    """Wrap a function so it returns a string, as XPath's string() does.
+
+    Args:
+        function: A function taking (tag, position, size).
+
+    Returns:
+        A function taking (tag, position, size) returning a string.
+
+    """
+    def string(tag, position, size):
+        """Convert the value to a string."""
+        value = function(tag, position, size)
+        if isinstance(value, list):
+            return value[0] if value else ''
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, float) and value == int(value):
+            value = int(value)
+        if isinstance(value, basestring):
+            return value
+        return str(value)
+    return string
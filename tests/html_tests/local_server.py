@@ -0,0 +1,139 @@
+"""This module provides a local HTTP server for tests.
+
+    Packages(s) required:
+    - BaseHTTPServer
+    - SocketServer
+    - threading
+    - time
+
+"""
+
+# Imports
+import BaseHTTPServer
+import SocketServer
+import threading
+import time
+
+
+class CountingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serve the server's pages over keep-alive connections."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        """Count each accepted connection."""
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        """Serve a page."""
+        self._send_page()
+
+    def do_POST(self):
+        """Serve a page, ignoring the form data."""
+        length = int(self.headers.getheader('content-length') or 0)
+        self.rfile.read(length)
+        self._send_page()
+
+    def _send_page(self):
+        """Send the page for the request path, a redirect, a 304 or a 404."""
+        with self.server.lock:
+            self.server.hits.append(self.path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        location = self.server.redirects.get(self.path)
+        if location:
+            self.send_response(301)
+            self.send_header('Location', location)
+            body = '<p>Moved</p>'
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = self.server.pages.get(self.path)
+        etag = self.server.etags.get(self.path)
+        last_modified = self.server.last_modified.get(self.path)
+        if body is None:
+            self.send_response(404)
+            body = 'Not found'
+        elif ((etag and self.headers.getheader('if-none-match') == etag) or
+              (last_modified and
+               self.headers.getheader('if-modified-since') == last_modified)):
+            with self.server.lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            body = ''
+        else:
+            self.send_response(200)
+        if etag:
+            self.send_header('ETag', etag)
+        if last_modified:
+            self.send_header('Last-Modified', last_modified)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Do not log requests to stderr."""
+        pass
+
+
+class LocalServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """A threaded HTTP server on localhost counting connections and hits.
+
+    Attributes:
+        pages: A dictionary of path to page body.
+        connections: The number of accepted connections.
+        hits: The paths of all requests, in order.
+        delay: The number of seconds to wait before each response.
+        etags: A dictionary of path to the ETag of the page.
+        last_modified: A dictionary of path to the Last-Modified date of the
+            page.
+        not_modified: The number of 304 responses sent.
+        redirects: A dictionary of path to the location it redirects to.
+
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 64
+
+    def __init__(self, pages=None, handler=CountingHandler):
+        """Start the server on a free port.
+
+        Args:
+            pages: A dictionary of path to page body.
+            handler: The request handler class.
+
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), handler)
+        self.pages = pages or {}
+        self.connections = 0
+        self.hits = []
+        self.delay = 0
+        self.etags = {}
+        self.last_modified = {}
+        self.not_modified = 0
+        self.redirects = {}
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def url(self, path='/'):
+        """Get the URL of a path on this server.
+
+        Args:
+            path: The path on the server.
+
+        Returns:
+            The URL.
+
+        """
+        return 'http://127.0.0.1:%i%s' % (self.server_address[1], path)
+
+    def stop(self):
+        """Stop the server and close its socket."""
+        self.shutdown()
+        self.server_close()
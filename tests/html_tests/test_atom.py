@@ -6,6 +6,7 @@
 """
 
 # Imports
+import pickle
 import pytest
 
 import sys, os
@@ -43,3 +44,35 @@ class TestTag:
         assert t.children == c
         assert t.string_concat_list == []
 
+
+    def test_tag_has_no_instance_dictionary(self):
+        t = atom.Tag()
+        assert not hasattr(t, '__dict__')
+        with pytest.raises(AttributeError):
+            t.unknown_attribute = 1
+
+    def test_string_concat_list_is_allocated_lazily(self):
+        t = atom.Tag()
+        assert t._string_concat_list == None
+        assert t.joined_string() == ''
+        assert t._string_concat_list == None
+        t.string_concat_list.append('a')
+        t.string_concat_list.append('b')
+        assert t.joined_string() == 'ab'
+
+    def test_pickle(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            t = pickle.loads(pickle.dumps(atom.Tag('p', [], 'x'), protocol))
+            assert (t.name, t.attributes, t.data) == ('p', [], 'x')
+            assert t.parent == None
+            assert t.children == None
+            assert t.joined_string() == ''
+
+    def test_pickle_tree(self):
+        root = atom.Tag('div', [('id', 'a')], '', children=[])
+        root.children.append(atom.Tag('p', [], 'x', parent=root))
+        root.children[0].string_concat_list.append('y')
+        t = pickle.loads(pickle.dumps(root))
+        assert t.attributes == [('id', 'a')]
+        assert t.children[0].parent is t
+        assert t.children[0].joined_string() == 'y'
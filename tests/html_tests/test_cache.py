@@ -0,0 +1,140 @@
+"""This module tests functions in the cache module.
+
+    Packages(s) required:
+    - html
+    - os
+    - pytest
+    - shutil
+    - tempfile
+    - time
+
+"""
+
+# Imports
+import os
+import pytest
+import shutil
+import tempfile
+import time
+
+import sys
+sys.path.append(os.path.realpath('.'))
+from html import cache
+from html import document
+from html import html
+
+
+class TestResponseCache:
+    """Test the ResponseCache class."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.directory = tempfile.mkdtemp()
+        self.cache = cache.ResponseCache(self.directory, ttl=60,
+                                         max_size=None)
+
+    def teardown_method(self, method):
+        """Remove the cache directory."""
+        shutil.rmtree(self.directory)
+
+    def test_get_missing(self):
+        assert self.cache.get('http://example.com/') == None
+        assert self.cache.get_fresh('http://example.com/') == None
+
+    def test_put_and_get(self):
+        self.cache.put('http://example.com/', None, '<p>a</p>', '"v1"',
+                       'Sat, 01 Jan 2000 00:00:00 GMT')
+        response = self.cache.get_fresh('http://example.com/')
+        assert response.body == '<p>a</p>'
+        assert response.get_validators() == {
+            'If-None-Match': '"v1"',
+            'If-Modified-Since': 'Sat, 01 Jan 2000 00:00:00 GMT'}
+        assert len(self.cache) == 1
+
+    def test_keyed_by_form_data(self):
+        self.cache.put('http://example.com/', None, 'get')
+        self.cache.put('http://example.com/', {'a': '1', 'b': '2'}, u'post')
+        assert self.cache.get('http://example.com/').body == 'get'
+        response = self.cache.get('http://example.com/', {'b': '2', 'a': '1'})
+        assert response.body == u'post'
+        assert self.cache.get('http://example.com/', {'a': '2'}) == None
+
+    def test_keyed_by_unicode_form_data(self):
+        self.cache.put('http://example.com/', {u'q': u'caf\xe9'}, 'cafe')
+        response = self.cache.get('http://example.com/', {'q': 'caf\xc3\xa9'})
+        assert response.body == 'cafe'
+        assert self.cache.get('http://example.com/', {u'q': u'cafe'}) == None
+
+    def test_stale_after_ttl(self):
+        response = self.cache.put('http://example.com/', None, 'a')
+        response.stored_time = time.time() - 61
+        self.cache.store(response)
+        assert self.cache.get_fresh('http://example.com/') == None
+        assert self.cache.get('http://example.com/').body == 'a'
+        self.cache.refresh(response)
+        assert self.cache.get_fresh('http://example.com/').body == 'a'
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('http://example.com/1', None, 'x' * 1000)
+        size = self.cache._size
+        self.cache.max_size = size * 2
+        self.cache.put('http://example.com/2', None, 'x' * 1000)
+        assert self.cache.get('http://example.com/1')
+        self.cache.put('http://example.com/3', None, 'x' * 1000)
+        assert self.cache.get('http://example.com/2') == None
+        assert self.cache.get('http://example.com/1')
+        assert self.cache.get('http://example.com/3')
+        assert len(os.listdir(self.directory)) == 2
+
+    def test_reopen_keeps_responses(self):
+        self.cache.put('http://example.com/1', None, 'a')
+        self.cache.put('http://example.com/2', None, 'b')
+        reopened = cache.ResponseCache(self.directory)
+        assert len(reopened) == 2
+        assert reopened._size == self.cache._size
+        assert reopened.get_fresh('http://example.com/2').body == 'b'
+
+    def test_clear(self):
+        self.cache.put('http://example.com/1', None, 'a')
+        self.cache.clear()
+        assert len(self.cache) == 0
+        assert self.cache.get('http://example.com/1') == None
+        assert os.listdir(self.directory) == []
+
+
+class TestDocumentCache:
+    """Test the DocumentCache class."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_method(self, method):
+        """Remove the cache directory."""
+        shutil.rmtree(self.directory)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        documents = cache.DocumentCache(max_documents=2)
+        documents.put('a', 1)
+        documents.put('b', 2)
+        assert documents.get('a') == 1
+        documents.put('c', 3)
+        assert documents.get('b') == None
+        assert documents.get('a') == 1
+        assert documents.get('c') == 3
+        assert documents.load('a') == None
+
+    def test_disk_tier(self):
+        parser = html.HTML(configure_log=False)
+        parser.parse('<p class="x">a</p>')
+        documents = cache.DocumentCache(directory=self.directory)
+        documents.save('a', document.CompactDocument(parser._root))
+        reopened = cache.DocumentCache(directory=self.directory)
+        assert reopened.load('a').get_tag(1) == ['p', [('class', 'x')], 'a']
+        reopened.clear()
+        assert reopened.load('a') == None
+
+    def test_get_markup_key(self):
+        assert cache.get_markup_key('<p>') == cache.get_markup_key('<p>')
+        assert cache.get_markup_key('<p>') != cache.get_markup_key('<b>')
+        assert cache.get_markup_key('<p>') != cache.get_markup_key(u'<p>')
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""This module tests functions in the CompactDocument class.
+
+    Packages(s) required:
+    - html
+    - logging
+    - mmap
+    - pytest
+    - shutil
+    - tempfile
+
+"""
+
+# Imports
+import logging
+import mmap
+import pytest
+import shutil
+import tempfile
+
+import sys,os
+sys.path.append(os.path.realpath('.'))
+from html import html
+from html import atom
+from html import document
+
+
+class TestCompactDocument:
+    """Test the CompactDocument class."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.h = html.HTML(logging.NullHandler())
+        text = ("<!DOCTYPE html><table id=\"t\"><tr class=\"r\"><td>1</td>"
+                "<td nowrap>2</td></tr><tr><td>3</td></tr></table>"
+                "<br/><!-- note -->")
+        self.h.parse(text)
+        self.d = self.h.get_compact_document()
+
+    def test_empty_constructor(self):
+        d = document.CompactDocument()
+        assert len(d) == 0
+        assert d.get_tag(0) == None
+        assert d.find_first_tag("td") == -1
+
+    def test_same_tags_as_flat_list(self):
+        assert len(self.d) == self.h._number_of_tags
+        for i in range(len(self.d)):
+            assert self.d.get_tag(i) == self.h.get_tag(i)
+
+    def test_get_tag_negative_index(self):
+        assert self.d.get_tag(-1) == None
+
+    def test_get_tag_index_equal_to_tag_count(self):
+        assert self.d.get_tag(len(self.d)) == None
+
+    def test_get_tag_keeps_none_attributes_and_data(self):
+        expected_root = ['root', None, None]
+        expected_br = ['br', [], None]
+        assert self.d.get_tag(0) == expected_root
+        assert self.d.get_tag(self.d.find_first_tag("br")) == expected_br
+
+    def test_get_tag_attribute_without_value(self):
+        index = self.d.find_first_tag("td", tag_data="2")
+        assert self.d.get_tag(index)[1] == [('nowrap', None)]
+
+    def test_get_parent_and_children(self):
+        table = self.d.find_first_tag("table")
+        rows = self.d.get_children(table)
+        assert [self.d.get_tag(i)[0] for i in rows] == ['tr', 'tr']
+        assert self.d.get_parent(rows[0]) == table
+        assert self.d.get_parent(0) == -1
+        assert self.d.get_children(-1) == []
+
+    def test_find_next_tag_matches_html(self):
+        for tag_type, attributes, data in (("td", None, None),
+                                           ("TR", [('class', 'r')], None),
+                                           ("td", None, "3"),
+                                           ("comment", None, None),
+                                           ("missing", None, None)):
+            index = self.h.find_first_tag(tag_type, attributes, data)
+            assert self.d.find_first_tag(tag_type, attributes, data) == index
+            if index != -1:
+                assert (self.d.find_next_tag(tag_type, attributes, data,
+                                             index + 1) ==
+                        self.h.find_next_tag(tag_type, attributes, data,
+                                             index + 1))
+
+    def test_unicode_text_round_trip(self):
+        root = atom.Tag(name='root', children=[])
+        root.children.append(atom.Tag(name=u'p', attributes=[(u'title', u'café')],
+                                      parent=root, data=u'naïve'))
+        d = document.CompactDocument(root)
+        assert d.get_tag(1) == [u'p', [(u'title', u'café')], u'naïve']
+
+    def test_mixed_string_and_unicode_values(self):
+        for text in ('<p>caf\xe9</p><a href="?a=1&amp;b=2">l</a>',
+                     '<p>caf\xc3\xa9</p><a href="?a=1&amp;b=2">l</a>'):
+            self.h.parse(text)
+            assert isinstance(self.h.get_tag(2)[1][0][1], unicode)
+            d = self.h.get_compact_document()
+            for i in range(len(d)):
+                assert d.get_tag(i) == self.h.get_tag(i)
+                assert map(type, d.get_tag(i)) == map(type, self.h.get_tag(i))
+            assert type(d.get_tag(1)[2]) is str
+            assert type(d.get_tag(2)[1][0][1]) is unicode
+            data = self.h.get_tag(1)[2]
+            assert d.find_first_tag('p', tag_data=data) == 1
+            assert self.h.find_first_tag('p', tag_data=data) == 1
+            tree = d.get_tree()
+            assert type(tree.children[0].data) is str
+
+    def test_deeply_nested_tree(self):
+        depth = 5000
+        root = atom.Tag(name='root', children=[])
+        tag = root
+        for i in range(depth):
+            child = atom.Tag(name='div', attributes=[], parent=tag, data='')
+            tag.children = [child]
+            tag = child
+        d = document.CompactDocument(root)
+        assert len(d) == depth + 1
+        assert d.get_parent(depth) == depth - 1
+
+    def test_get_tree_matches_parsed_tree(self):
+        root = self.d.get_tree()
+        parser = html.HTML(configure_log=False)
+        parser._store_tag(root)
+        assert parser._parsed_data == self.h._parsed_data
+        assert root.children[0].parent is root
+        assert document.CompactDocument().get_tree() == None
+
+
+class TestDocumentFile:
+    """Test saving and loading CompactDocuments."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.h = html.HTML(logging.NullHandler())
+        self.h.parse("<!DOCTYPE html><table id=\"t\"><tr class=\"r\">"
+                     "<td>1</td><td nowrap>2</td></tr><tr><td>3</td></tr>"
+                     "</table><br/><!-- note -->")
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'document.bin')
+
+    def teardown_method(self, method):
+        """Remove the saved files."""
+        shutil.rmtree(self.directory)
+
+    def check_document(self, d):
+        assert len(d) == self.h._number_of_tags
+        for i in range(len(d)):
+            assert d.get_tag(i) == self.h.get_tag(i)
+        table = d.find_first_tag("table")
+        assert d.get_children(table) == [3, 6]
+        assert d.get_parent(3) == table
+        assert d.find_next_tag("td", None, "3", 4) == 7
+        assert d.find_first_tag("tr", [('class', 'r')]) == 3
+
+    def test_save_and_load(self):
+        self.h.save_document(self.file_name)
+        self.check_document(document.load_document(self.file_name, False))
+
+    def test_save_and_load_mapped(self):
+        self.h.save_document(self.file_name)
+        d = document.load_document(self.file_name)
+        self.check_document(d)
+        parser = html.HTML(configure_log=False)
+        parser._store_tag(d.get_tree())
+        assert parser._parsed_data == self.h._parsed_data
+        d.close()
+
+    def test_unicode_round_trip(self):
+        root = atom.Tag(name='root', children=[])
+        root.children.append(atom.Tag(name=u'p', attributes=[(u'tïtle', u'café')],
+                                      parent=root, data=u'naïve'))
+        document.CompactDocument(root).save(self.file_name)
+        for use_mmap in (True, False):
+            d = document.load_document(self.file_name, use_mmap)
+            assert d.get_tag(1) == [u'p', [(u'tïtle', u'café')], u'naïve']
+
+    def test_mixed_string_and_unicode_values_round_trip(self):
+        self.h.parse('<p>caf\xc3\xa9</p><a href="?a=1&amp;b=2">\xe9</a>')
+        self.h.save_document(self.file_name)
+        for use_mmap in (True, False):
+            d = document.load_document(self.file_name, use_mmap)
+            for i in range(len(d)):
+                assert d.get_tag(i) == self.h.get_tag(i)
+                assert map(type, d.get_tag(i)) == map(type, self.h.get_tag(i))
+            assert type(d.get_tag(2)[1][0][1]) is unicode
+            assert d.find_first_tag('p', tag_data='caf\xc3\xa9') == 1
+            assert d.get_tag(2)[2] == '\xe9'
+            d.close()
+
+    def test_load_previous_version(self):
+        self.h.save_document(self.file_name)
+        with open(self.file_name, 'r+b') as saved_file:
+            saved_file.seek(8)
+            saved_file.write('\x01\x00\x00\x00')
+        with pytest.raises(document.Error):
+            document.load_document(self.file_name, False)
+
+    def test_empty_document(self):
+        document.CompactDocument().save(self.file_name)
+        d = document.load_document(self.file_name, False)
+        assert len(d) == 0
+        assert d.find_first_tag("p") == -1
+
+    def test_load_invalid_file(self):
+        with open(self.file_name, 'wb') as bad_file:
+            bad_file.write('<html>not a document</html>')
+        with pytest.raises(document.Error):
+            document.load_document(self.file_name)
+        with pytest.raises(document.Error):
+            document.load_document(os.path.join(self.directory, 'missing'))
+
+    def test_load_truncated_file(self):
+        self.h.save_document(self.file_name)
+        with open(self.file_name, 'rb') as saved_file:
+            data = saved_file.read()
+        with open(self.file_name, 'wb') as saved_file:
+            saved_file.write(data[:-3])
+        with pytest.raises(document.Error):
+            document.load_document(self.file_name, False)
+        with pytest.raises(document.Error):
+            document.load_document(self.file_name)
+
+    def test_load_empty_file(self):
+        open(self.file_name, 'wb').close()
+        for use_mmap in (True, False):
+            with pytest.raises(document.Error):
+                document.load_document(self.file_name, use_mmap)
+
+    def test_load_invalid_file_closes_mapping(self, monkeypatch):
+        mappings = []
+        base = mmap.mmap
+
+        class TrackedMap(base):
+            def close(self):
+                mappings.remove(self)
+                base.close(self)
+
+        def track(*args, **kwargs):
+            mappings.append(TrackedMap(*args, **kwargs))
+            return mappings[-1]
+        monkeypatch.setattr(document.mmap, 'mmap', track)
+        with open(self.file_name, 'wb') as bad_file:
+            bad_file.write('<html>not a document</html>' * 4)
+        with pytest.raises(document.Error):
+            document.load_document(self.file_name)
+        assert mappings == []
@@ -0,0 +1,112 @@
+"""This module tests functions in the fetch module.
+
+    Packages(s) required:
+    - html
+    - local_server
+    - pytest
+    - time
+
+"""
+
+# Imports
+import pytest
+import time
+
+import sys,os
+sys.path.append(os.path.realpath('.'))
+from html import fetch
+from local_server import LocalServer
+
+
+class TestFetcher:
+    """Test the Fetcher class."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.server = LocalServer({'/a': '<p>a</p>', '/b': '<p>b</p>'})
+        self.fetcher = fetch.Fetcher(timeout=5)
+        self.finished = []
+
+    def teardown_method(self, method):
+        """Stop the server after each test."""
+        self.server.stop()
+
+    def run(self):
+        """Poll until every request has finished."""
+        while len(self.fetcher):
+            self.fetcher.poll(0.05)
+
+    def test_get_page(self):
+        self.fetcher.get(self.server.url('/a'), self.finished.append)
+        assert len(self.fetcher) == 1
+        self.run()
+        assert len(self.finished) == 1
+        request = self.finished[0]
+        assert request.error == None
+        assert request.status == 200
+        assert request.headers['content-type'] == 'text/html'
+        assert request.body == '<p>a</p>'
+
+    def test_get_missing_page(self):
+        self.fetcher.get(self.server.url('/missing'), self.finished.append)
+        self.run()
+        assert self.finished[0].status == 404
+        assert self.finished[0].body == 'Not found'
+
+    def test_get_many_pages_concurrently(self):
+        self.server.delay = 0.5
+        start_time = time.time()
+        for i in range(20):
+            self.fetcher.get(self.server.url('/a' if i % 2 else '/b'),
+                             self.finished.append)
+        self.run()
+        elapsed_time = time.time() - start_time
+        assert len(self.finished) == 20
+        assert all(r.status == 200 for r in self.finished)
+        assert elapsed_time < 1.5
+
+    def test_get_follows_redirects(self):
+        self.server.redirects['/old'] = '/older'
+        self.server.redirects['/older'] = self.server.url('/a')
+        self.fetcher.get(self.server.url('/old'), self.finished.append)
+        self.run()
+        assert len(self.finished) == 1
+        assert self.finished[0].status == 200
+        assert self.finished[0].url == self.server.url('/a')
+        assert self.finished[0].body == '<p>a</p>'
+        assert self.server.hits == ['/old', '/older', '/a']
+
+    def test_get_too_many_redirects(self):
+        self.server.redirects['/loop'] = '/loop'
+        self.fetcher.max_redirects = 3
+        self.fetcher.get(self.server.url('/loop'), self.finished.append)
+        self.run()
+        assert len(self.finished) == 1
+        assert isinstance(self.finished[0].error, ValueError)
+        assert len(self.server.hits) == 4
+
+    def test_get_connection_refused(self):
+        url = self.server.url('/a')
+        self.server.stop()
+        self.fetcher.get(url, self.finished.append)
+        self.run()
+        assert self.finished[0].error != None
+        assert self.finished[0].status == None
+        self.server = LocalServer()
+
+    def test_get_unsupported_url(self):
+        self.fetcher.get('ftp://example.com/', self.finished.append)
+        assert len(self.fetcher) == 0
+        assert isinstance(self.finished[0].error, ValueError)
+
+    def test_get_timeout(self):
+        self.server.delay = 2
+        self.fetcher.timeout = 0.3
+        self.fetcher.get(self.server.url('/a'), self.finished.append)
+        self.run()
+        assert self.finished[0].error != None
+        assert self.finished[0].body == None
+
+    def test_decode_chunked(self):
+        body = "4\r\nWiki\r\n5;ext\r\npedia\r\n0\r\n\r\n"
+        assert fetch._decode_chunked(body) == "Wikipedia"
@@ -1,8 +1,11 @@
 """This module tests functions in the HTML class.
 
     Packages(s) required:
-    - datetime
     - html
+    - local_server
+    - requests
+    - shutil
+    - tempfile
     - time
     - pytest
     - logging
@@ -11,16 +14,21 @@
 """
 
 # Imports
-import datetime
 import logging
 import pytest
+import requests
+import shutil
 import sys
+import tempfile
 import time
 
 import sys,os
 sys.path.append(os.path.realpath('.'))
 from html import html
 from html import atom
+from html import cache
+from html import ratelimit
+from local_server import LocalServer
 
 
 class TestHtml:
@@ -65,6 +73,99 @@ class TestHtml:
         expected_result = None
         assert self.h.unescape_text(text) == expected_result
 
+    def test_escape_texts(self):
+        texts = ["& \" ' < >", None, "", "plain", u"caf\xe9 <b>", "x&y"]
+        expected_result = ["&amp; &quot; &#039; &lt; &gt;", None, "", "plain",
+                           "caf&#233; &lt;b&gt;", "x&amp;y"]
+        assert html.escape_texts(texts) == expected_result
+        assert html.escape_texts(iter(["<", ">"])) == ["&lt;", "&gt;"]
+        assert html.escape_texts([]) == []
+
+    def test_escape_texts_matches_escape_text(self):
+        texts = ["<td>%i & %i</td>" % (i, i) for i in range(100)]
+        texts += [u"\u2019%i\"" % i for i in range(100)]
+        assert html.escape_texts(texts) == [html.escape_text(text)
+                                            for text in texts]
+
+    def test_escape_texts_with_separator_in_text(self):
+        texts = ["a\x00<", "b"]
+        assert html.escape_texts(texts) == ["a\x00&lt;", "b"]
+
+    def test_escape_texts_keeps_non_ascii_bytes(self):
+        assert html.escape_texts(["caf\xc3\xa9 &"]) == ["caf\xc3\xa9 &amp;"]
+
+    def test_escape_texts_non_ascii_bytes_mixed_with_unicode(self):
+        texts = ["caf\xc3\xa9 <", u"x\u2019 >", "a\x00&"]
+        expected_result = ["caf\xc3\xa9 &lt;", "x&#8217; &gt;", "a\x00&amp;"]
+        assert html.escape_texts(texts) == expected_result
+
+    def test_unescape_text_named_references(self):
+        text = "&eacute;t&eacute; &hellip; &NotEqualTilde; &amp;lt;"
+        expected_result = "\xc3\xa9t\xc3\xa9 \xe2\x80\xa6 \xe2\x89\x82\xcc\xb8 &lt;"
+        assert html.unescape_text(text) == expected_result
+
+    def test_unescape_text_numeric_references(self):
+        text = "&#8217;&#x2019;&#X2019;&#39;&#150;&#0;&#xD800;&#1114112;"
+        expected_result = ("\xe2\x80\x99" * 3 + "'\xe2\x80\x93" +
+                           "\xef\xbf\xbd" * 3)
+        assert html.unescape_text(text) == expected_result
+
+    def test_unescape_text_legacy_references(self):
+        text = "&amp &copy2016 &notit; &lt&gt"
+        expected_result = "& \xc2\xa92016 \xc2\xacit; <>"
+        assert html.unescape_text(text) == expected_result
+
+    def test_unescape_text_keeps_unknown_references(self):
+        text = "&bogus; & x &#; &#x;"
+        assert html.unescape_text(text) == text
+
+    def test_unescape_text_common_references_with_others(self):
+        text = "&amp;lt; &amp;amp; &amp&quot;; &lt&eacute; &bogus&gt;;"
+        expected_result = '&lt; &amp; &"; <\xc3\xa9 &bogus>;'
+        assert html.unescape_text(text) == expected_result
+        assert html.unescape_text(text.replace("&eacute;", "")) == (
+            expected_result.replace("\xc3\xa9", ""))
+
+    def test_unescape_text_nbsp_as_space(self):
+        assert html.unescape_text("a&nbsp;b&nbsp") == "a b "
+
+    def test_unescape_text_unicode(self):
+        text = u"caf&eacute; &#128512; &nbsp;"
+        expected_result = u"caf\xe9 \U0001f600  "
+        assert html.unescape_text(text) == expected_result
+        assert isinstance(html.unescape_text("&eacute;"), str)
+
+    def test_unescape_texts(self):
+        texts = ["&lt;b&gt;", None, "", "plain", "&lt;b&gt;", u"&eacute;"]
+        expected_result = ["<b>", None, "", "plain", "<b>", u"\xe9"]
+        assert html.unescape_texts(texts) == expected_result
+        assert html.unescape_texts(iter([])) == []
+
+    def test_unescape_texts_match_unescape_text(self):
+        texts = ["&lt;", u"&lt;", "&amp", "lt;", "&copy", "&eacute; &#8211",
+                 "0;", u"&not", u"it;", "a\x00&amp", "&bogus;", "&amp;lt;"]
+        # Without the text holding the separator, the texts are joined
+        for texts in (texts, texts[:-3]):
+            expected_result = [html.unescape_text(text) for text in texts]
+            result = html.unescape_texts(texts)
+            assert result == expected_result
+            assert map(type, result) == map(type, expected_result)
+
+    def test_parse_keeps_character_references(self):
+        self.h.parse("<p>a &amp; b &#8217; c</p>")
+        assert self.h.get_tag(1) == ['p', [], 'a &amp; b &#8217; c']
+
+    def test_unescape_document(self):
+        self.h.parse("<div>&lt;1&gt;<p>caf&eacute;</p><br/>&amp;</div>"
+                     "<script>a &amp;&amp; b</script><!-- &amp; -->")
+        self.h.unescape_document()
+        assert self.h.get_tag(1) == ['div', [], '<1> &']
+        assert self.h.get_tag(2) == ['p', [], 'caf\xc3\xa9']
+        assert self.h.get_tag(4) == ['script', [], 'a &amp;&amp; b']
+        assert self.h.get_tag(5) == ['comment', None, ' &amp; ']
+        assert self.h._root.children[0].children[0].data == 'caf\xc3\xa9'
+        assert self.h.find_first_tag('p', tag_data='caf\xc3\xa9') == 2
+
     def test_handle_starttag_empty_tag_named_mytag(self):
         tag = "mytag"
         attrs = []
@@ -521,15 +622,19 @@ class TestHtml:
         assert self.h._parsed_data[2][1] == attrs2
         assert self.h._parsed_data[2][2] == tag_data2
 
+    def _set_rate_limit_history(self, request_ages):
+        limiter = self.h._get_rate_limiter(None)
+        current_time = time.time()
+        for age in sorted(request_ages, reverse=True):
+            limiter._window.append(current_time - age)
+        limiter._last_request_time = current_time - min(request_ages)
+
     def test_check_rate_limiting_not_limited(self):
         wait = False
         expected_result = True
-        current_time = datetime.datetime.now()
         self.h.minimum_time_between_requests = 30
         self.h.requests_per_minute = 5
-        self.h._last_request_time = current_time - datetime.timedelta(seconds=35)
-        self.h._rate_limit_count = 3
-        self.h._rate_limit_counter_time = current_time - datetime.timedelta(seconds=5)
+        self._set_rate_limit_history([35, 40, 45])
         start_time = time.time()
         assert self.h._check_rate_limiting(wait) == expected_result
         elapsed_time = time.time() - start_time
@@ -538,78 +643,76 @@ class TestHtml:
     def test_check_rate_limiting_limited_between_requests_wait(self):
         wait = True
         expected_result = True
-        current_time = datetime.datetime.now()
-        self.h.minimum_time_between_requests = 30
+        self.h.minimum_time_between_requests = 1.5
         self.h.requests_per_minute = 5
-        self.h._last_request_time = current_time - datetime.timedelta(seconds=20)
-        self.h._rate_limit_count = 3
-        self.h._rate_limit_counter_time = current_time - datetime.timedelta(seconds=5)
+        self._set_rate_limit_history([0.5, 3, 4])
         start_time = time.time()
         assert self.h._check_rate_limiting(wait) == expected_result
         elapsed_time = time.time() - start_time
-        assert elapsed_time > 30
-        assert elapsed_time < 31
+        assert elapsed_time > 0.9
+        assert elapsed_time < 1.5
 
     def test_check_rate_limiting_limited_between_requests_no_wait(self):
         wait = False
         expected_result = False
-        current_time = datetime.datetime.now()
         self.h.minimum_time_between_requests = 30
         self.h.requests_per_minute = 5
-        self.h._last_request_time = current_time - datetime.timedelta(seconds=20)
-        self.h._rate_limit_count = 3
-        self.h._rate_limit_counter_time = current_time - datetime.timedelta(seconds=5)
+        self._set_rate_limit_history([20, 25, 30])
         start_time = time.time()
         assert self.h._check_rate_limiting(wait) == expected_result
         elapsed_time = time.time() - start_time
-        assert elapsed_time > 0
         assert elapsed_time < 1
 
     def test_check_rate_limiting_limited_per_minute_wait_remaining_time(self):
         wait = True
         expected_result = True
-        current_time = datetime.datetime.now()
-        self.h.minimum_time_between_requests = 30
+        self.h.minimum_time_between_requests = 0.5
         self.h.requests_per_minute = 5
-        self.h._last_request_time = current_time - datetime.timedelta(seconds=35)
-        self.h._rate_limit_count = 5
-        self.h._rate_limit_counter_time = current_time - datetime.timedelta(seconds=5)
+        self._set_rate_limit_history([1, 2, 3, 4, 58])
         start_time = time.time()
         assert self.h._check_rate_limiting(wait) == expected_result
         elapsed_time = time.time() - start_time
-        assert elapsed_time > 54
-        assert elapsed_time < 56
+        assert elapsed_time > 1.9
+        assert elapsed_time < 2.5
 
-    def test_check_rate_limiting_limited_per_minute_wait_between_time(self):
+    def test_check_rate_limiting_limited_per_minute_window_expired(self):
         wait = True
         expected_result = True
-        current_time = datetime.datetime.now()
         self.h.minimum_time_between_requests = 30
         self.h.requests_per_minute = 5
-        self.h._last_request_time = current_time - datetime.timedelta(seconds=35)
-        self.h._rate_limit_count = 5
-        self.h._rate_limit_counter_time = current_time - datetime.timedelta(seconds=61)
+        self._set_rate_limit_history([35, 40, 45, 61, 62])
         start_time = time.time()
         assert self.h._check_rate_limiting(wait) == expected_result
         elapsed_time = time.time() - start_time
-        assert elapsed_time > 30
-        assert elapsed_time < 31
+        assert elapsed_time < 1
 
     def test_check_rate_limiting_limited_per_minute_no_wait(self):
         wait = False
         expected_result = False
-        current_time = datetime.datetime.now()
         self.h.minimum_time_between_requests = 30
         self.h.requests_per_minute = 5
-        self.h._last_request_time = current_time - datetime.timedelta(seconds=35)
-        self.h._rate_limit_count = 5
-        self.h._rate_limit_counter_time = current_time - datetime.timedelta(seconds=5)
+        self._set_rate_limit_history([35, 40, 45, 50, 55])
         start_time = time.time()
         assert self.h._check_rate_limiting(wait) == expected_result
         elapsed_time = time.time() - start_time
-        assert elapsed_time > 0
         assert elapsed_time < 1
 
+    def test_check_rate_limiting_per_host(self):
+        self.h.requests_per_minute = 1
+        assert self.h._check_rate_limiting(False, 'http://a.example.com/x')
+        assert not self.h._check_rate_limiting(False, 'http://a.example.com/y')
+        assert self.h._check_rate_limiting(False, 'http://b.example.com/x')
+
+    def test_check_rate_limiting_shared_limiter(self):
+        limiter = ratelimit.SharedRateLimiter(requests_per_minute=2)
+        other = html.HTML(configure_log=False)
+        self.h.rate_limiter = limiter
+        other.rate_limiter = limiter
+        assert self.h._check_rate_limiting(False, 'http://example.com/')
+        assert other._check_rate_limiting(False, 'http://example.org/')
+        assert not self.h._check_rate_limiting(False, 'http://example.net/')
+        assert other._rate_limit_delay() > 59
+
     def test_parse_markup_as_none(self):
         text = None
         expected_result = True
@@ -671,6 +774,27 @@ class TestHtml:
         expected_result = True
         assert self.h.parse_file(filename) == expected_result
 
+    def test_parse_file_in_small_blocks(self):
+        filename = "tests/files/test.html"
+        expected = html.HTML(logging.NullHandler())
+        expected.parse(open(filename).read())
+        assert self.h.parse_file(filename, block_size=13) == True
+        assert self.h._parsed_data == expected._parsed_data
+
+    def test_parse_file_with_mmap(self):
+        filename = "tests/files/test.html"
+        expected = html.HTML(logging.NullHandler())
+        expected.parse(open(filename).read())
+        assert self.h.parse_file(filename, block_size=100, use_mmap=True) == True
+        assert self.h._parsed_data == expected._parsed_data
+
+    def test_parse_file_with_mmap_empty_file(self, tmpdir):
+        filename = tmpdir.join("empty.html")
+        filename.write("")
+        expected_tag_count = 1
+        assert self.h.parse_file(str(filename), use_mmap=True) == True
+        assert self.h._number_of_tags == expected_tag_count
+
     def test_parse_file_non_existant_file(self):
         filename = "tests/files/invalid_file.html"
         with pytest.raises(html.Error):
@@ -978,3 +1102,712 @@ class TestHtml:
         assert newtag[1] == expected_attributes
         assert newtag[2] == expected_data
 
+
+    def test_find_next_tag_walks_every_match(self):
+        text = "<table><tr><td>1</td></tr><tr><td>2</td></tr><tr><td>3</td></tr></table>"
+        expected_rows = [2, 4, 6]
+        assert self.h.parse(text) == True
+        rows = []
+        i = self.h.find_first_tag("tr")
+        while i != -1:
+            rows.append(i)
+            i = self.h.find_next_tag("tr", index=i + 1)
+        assert rows == expected_rows
+
+    def test_find_next_tag_type_is_case_insensitive(self):
+        text = "<DIV>a</DIV><p>b</p><div>c</div>"
+        expected_result = 3
+        assert self.h.parse(text) == True
+        assert self.h.find_next_tag("Div", index=2) == expected_result
+
+    def test_find_next_tag_index_is_reset_by_parse(self):
+        assert self.h.parse("<b>one</b>") == True
+        assert self.h.parse("<i>two</i>") == True
+        assert self.h.find_first_tag("b") == -1
+        assert self.h.find_first_tag("i") == 1
+
+    def test_find_first_tag_with_attributes_subset_match(self):
+        text = "<div id=\"a\" class=\"item\">1</div><span id=\"b\" class=\"price\" title=\"t\">2</span>"
+        attr = {'class': 'price'}
+        expected_result = 2
+        assert self.h.parse(text) == True
+        assert self.h.find_first_tag_with_attributes(attr) == expected_result
+
+    def test_find_first_tag_with_attributes_by_id(self):
+        text = "<p id=\"x\">1</p><p id=\"y\">2</p><p id=\"z\">3</p>"
+        attr = {'id': 'y'}
+        expected_result = 2
+        assert self.h.parse(text) == True
+        assert self.h.find_first_tag_with_attributes(attr) == expected_result
+
+    def test_find_first_tag_with_attributes_type_mismatch(self):
+        text = "<p id=\"x\">1</p>"
+        attr = {'id': 'x'}
+        expected_result = -1
+        assert self.h.parse(text) == True
+        assert self.h.find_first_tag_with_attributes(attr, tag_type="div") == expected_result
+
+    def test_find_first_tag_with_attributes_not_all_present(self):
+        text = "<p id=\"x\" class=\"a\">1</p><p id=\"y\" class=\"b\">2</p>"
+        attr = {'id': 'x', 'class': 'b'}
+        expected_result = -1
+        assert self.h.parse(text) == True
+        assert self.h.find_first_tag_with_attributes(attr) == expected_result
+
+    def test_find_next_tag_with_attributes_walks_every_match(self):
+        text = "<td class=\"c\">1</td><td>2</td><td class=\"c\">3</td><i class=\"c\">4</i>"
+        attr = {'class': 'c'}
+        expected_result = [1, 3]
+        assert self.h.parse(text) == True
+        matches = []
+        i = self.h.find_first_tag_with_attributes(attr, tag_type="TD")
+        while i != -1:
+            matches.append(i)
+            i = self.h.find_next_tag_with_attributes(attr, tag_type="TD", index=i + 1)
+        assert matches == expected_result
+
+    def test_find_next_tag_with_attributes_without_index(self):
+        text = "<p id=\"x\">1</p><p id=\"y\">2</p><p id=\"y\">3</p>"
+        attr = {'id': 'y'}
+        expected_result = 3
+        self.h.index_attributes = False
+        assert self.h.parse(text) == True
+        assert self.h._attribute_index == None
+        assert self.h.find_next_tag_with_attributes(attr, index=3) == expected_result
+
+    def test_find_next_tag_with_attributes_none_as_attributes(self):
+        text = "<p id=\"x\">1</p>"
+        expected_result = -1
+        assert self.h.parse(text) == True
+        assert self.h.find_next_tag_with_attributes(None) == expected_result
+
+    def test_store_tag_records_subtree_ends(self):
+        text = "<table><tr><td>1</td><td>2</td></tr><tr><td>3</td></tr></table><p>x</p>"
+        expected_ends = [8, 7, 5, 4, 5, 7, 7, 8]
+        assert self.h.parse(text) == True
+        assert self.h._subtree_ends == expected_ends
+        assert self.h.get_subtree_end(1) == 7
+        assert self.h.get_subtree_end(8) == -1
+
+    def test_find_descendant_tag_stops_at_subtree_end(self):
+        text = "<table><tr><td>1</td></tr><tr><th>h</th></tr><tr><td>3</td></tr></table>"
+        assert self.h.parse(text) == True
+        rows = list(self.h.iter_children(1))
+        assert rows == [2, 4, 6]
+        assert self.h.find_descendant_tag(rows[0], "td") == 3
+        assert self.h.find_descendant_tag(rows[1], "td") == -1
+        assert self.h.find_next_tag("td", index=5) == 7
+        assert self.h.find_descendant_tag(rows[2], "td", tag_data="3") == 7
+        assert self.h.find_descendant_tag(1, "td", index=4) == 7
+        assert self.h.find_descendant_tag(99, "td") == -1
+
+    def test_find_descendant_tag_with_attributes_stops_at_subtree_end(self):
+        text = "<ul><li class=\"a\">1</li></ul><ul><li>2</li></ul><ul><li class=\"a\">3</li></ul>"
+        attr = {'class': 'a'}
+        for index_attributes in (True, False):
+            self.h.index_attributes = index_attributes
+            assert self.h.parse(text) == True
+            assert self.h.find_descendant_tag_with_attributes(1, attr) == 2
+            assert self.h.find_descendant_tag_with_attributes(3, attr) == -1
+            assert self.h.find_descendant_tag_with_attributes(5, attr, tag_type="li") == 6
+            assert self.h.find_descendant_tag_with_attributes(1, attr, index=3) == -1
+
+    def test_iter_descendants_and_children(self):
+        text = "<div><p>a<b>b</b></p><!-- c --><p>d</p></div><p>e</p>"
+        assert self.h.parse(text) == True
+        assert list(self.h.iter_descendants(1)) == [2, 3, 4, 5]
+        assert list(self.h.iter_children(1)) == [2, 4, 5]
+        assert list(self.h.iter_children(0)) == [1, 6]
+        assert list(self.h.iter_children(3)) == []
+        assert list(self.h.iter_descendants(-1)) == []
+        assert list(self.h.iter_children(7)) == []
+
+    def test_document_cache_keeps_subtree_ends(self):
+        text = "<div><p>a</p></div><div><p>b</p><p>c</p></div>"
+        self.h.document_cache = cache.DocumentCache()
+        assert self.h.parse(text) == True
+        expected_ends = list(self.h._subtree_ends)
+        other = html.HTML(logging.NullHandler())
+        other.document_cache = self.h.document_cache
+        assert other.parse(text) == True
+        assert other._subtree_ends == expected_ends
+        assert list(other.iter_children(3)) == [4, 5]
+
+    def test_find_all_matches_find_next_tag_loop(self):
+        text = "<table><tr><td>1</td></tr><tr><td>2</td></tr><tr><td>3</td></tr></table><TD>4</TD>"
+        assert self.h.parse(text) == True
+        expected_result = []
+        i = self.h.find_first_tag("td")
+        while i != -1:
+            expected_result.append(i)
+            i = self.h.find_next_tag("td", index=i + 1)
+        assert self.h.find_all("td") == expected_result
+        assert self.h.find_all("TD", tag_data="2") == [5]
+        assert self.h.find_all("td", index=4, end=7) == [5]
+        assert self.h.find_all("th") == []
+
+    def test_find_all_limit_and_predicate(self):
+        text = "<ul><li>1</li><li>22</li><li>3</li><li>44</li></ul>"
+        assert self.h.parse(text) == True
+        assert self.h.find_all("li", limit=2) == [2, 3]
+        assert self.h.find_all("li", limit=0) == []
+        assert self.h.find_all("li", predicate=lambda tag: len(tag[2]) == 2) == [3, 5]
+        assert self.h.find_all(predicate=lambda tag: tag[2] == "3") == [4]
+        assert len(self.h.find_all()) == self.h._number_of_tags
+
+    def test_find_all_with_attributes(self):
+        text = "<p class=\"a\" id=\"1\">1</p><i class=\"a\">2</i><p class=\"b\">3</p><p class=\"a\">4</p>"
+        attr = {'class': 'a'}
+        for index_attributes in (True, False):
+            self.h.index_attributes = index_attributes
+            assert self.h.parse(text) == True
+            assert self.h.find_all(tag_attributes=attr) == [1, 2, 4]
+            assert self.h.find_all("P", attr) == [1, 4]
+            assert self.h.find_all("p", {'class': 'a', 'id': '1'}) == [1]
+            assert self.h.find_all("p", {'class': 'c'}) == []
+
+    def test_iter_tags_yields_indexes_and_tags(self):
+        text = "<div><b>x</b></div><div><b>y</b></div>"
+        assert self.h.parse(text) == True
+        tags = self.h.iter_tags("b")
+        assert next(tags) == (2, ['b', [], 'x'])
+        assert list(tags) == [(4, ['b', [], 'y'])]
+        assert list(self.h.iter_tags("b", end=self.h.get_subtree_end(3),
+                                     index=3)) == [(4, ['b', [], 'y'])]
+
+    def test_feed_chunk_builds_same_document_as_parse(self):
+        text = "<html><body><a href=\"x\">link</a><p>some text</p><br/></body></html>"
+        expected = html.HTML(logging.NullHandler())
+        expected.parse(text)
+        for i in range(0, len(text), 7):
+            self.h.feed_chunk(text[i:i + 7])
+        assert self.h.close() == True
+        assert self.h._parsed_data == expected._parsed_data
+        assert self.h._number_of_tags == expected._number_of_tags
+
+    def test_feed_chunk_tree_grows_before_close(self):
+        self.h.feed_chunk("<div><p>first</p>")
+        assert len(self.h._root.children) == 1
+        assert self.h._root.children[0].name == "div"
+        assert self.h._root.children[0].children[0].data == "first"
+        self.h.feed_chunk("</div>")
+        assert self.h.close() == True
+        assert self.h._number_of_tags == 3
+
+    def test_feed_chunk_endtag_as_only_slash_split_across_chunks(self):
+        expected_tag_data = "test"
+        expected_tag_count = 3
+        self.h.feed_chunk("<a href=\"test\">test<")
+        self.h.feed_chunk("/")
+        self.h.feed_chunk("><br/>")
+        assert self.h.close() == True
+        assert self.h._number_of_tags == expected_tag_count
+        assert self.h._parsed_data[1][2] == expected_tag_data
+        assert self.h._parsed_data[2][0] == "br"
+
+    def test_close_without_chunks(self):
+        expected_tag_count = 1
+        assert self.h.close() == True
+        assert self.h._number_of_tags == expected_tag_count
+        assert self.h._parsed_data[0][0] == 'root'
+
+    def test_feed_chunk_starts_new_document_after_close(self):
+        self.h.feed_chunk("<b>one</b>")
+        self.h.close()
+        self.h.feed_chunk("<i>two</i>")
+        self.h.close()
+        assert self.h._number_of_tags == 2
+        assert self.h._parsed_data[1][0] == "i"
+
+    def test_parse_events_calls_handler_for_each_event(self):
+        text = "<!DOCTYPE html><a href=\"x\">link</a><br/><!-- note -->"
+        expected_events = [
+            ('decl', None, None, 'DOCTYPE html'),
+            ('starttag', 'a', [('href', 'x')], None),
+            ('data', None, None, 'link'),
+            ('endtag', 'a', None, None),
+            ('startendtag', 'br', [], None),
+            ('comment', None, None, ' note '),
+        ]
+        events = []
+        handler = lambda *event: events.append(event)
+        assert self.h.parse_events(text, handler) == True
+        assert events == expected_events
+
+    def test_parse_events_builds_no_tags(self):
+        text = "<div><a href=\"x\">link</a></div>"
+        expected_tag_count = 1
+        assert self.h.parse_events(text, lambda *event: None) == True
+        assert self.h._root.children == []
+        assert self.h._number_of_tags == expected_tag_count
+        assert self.h._event_handler == None
+
+    def test_iter_events_collects_hrefs(self):
+        text = "<p><a href=\"one\">1</a><a name=\"x\">2</a><a href=\"two\">3</a></p>"
+        expected_hrefs = ['one', 'two']
+        hrefs = [dict(attrs)['href']
+                 for event, name, attrs, data in self.h.iter_events(text, block_size=5)
+                 if event == 'starttag' and name == 'a' and dict(attrs).get('href')]
+        assert hrefs == expected_hrefs
+
+    def test_iter_events_none_as_markup(self):
+        assert list(self.h.iter_events(None)) == []
+
+    def test_parse_deeply_nested_tags(self):
+        depth = 5000
+        text = "<div>" * depth + "deep" + "</div>" * depth
+        expected_tag_count = depth + 1
+        assert self.h.parse(text) == True
+        assert self.h._number_of_tags == expected_tag_count
+        assert self.h._parsed_data[depth][2] == "deep"
+        assert self.h.find_next_tag("div", index=depth) == depth
+
+    def test_parse_debug_logging_off_by_default(self):
+        assert self.h.parse("<b>x</b>") == True
+        assert self.h._debug_logging == False
+
+    def test_parse_debug_logging_follows_logger_level(self):
+        logger = logging.getLogger(html.__name__)
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            assert self.h.parse("<b>x</b>") == True
+            assert self.h._debug_logging == True
+            assert self.h.find_first_tag("b") == 1
+        finally:
+            logger.setLevel(level)
+        assert self.h.parse("<b>x</b>") == True
+        assert self.h._debug_logging == False
+
+    def test_init_does_not_accumulate_handlers(self):
+        logger = logging.getLogger(html.__name__)
+        handler = logging.NullHandler()
+        html.HTML(handler)
+        expected_handlers = len(logger.handlers)
+        for i in range(10):
+            html.HTML(handler)
+            html.HTML()
+        assert len(logger.handlers) == expected_handlers
+        assert handler in logger.handlers
+
+    def test_init_without_configuring_logging(self):
+        logger = logging.getLogger(html.__name__)
+        handler = logging.NullHandler()
+        handlers = list(logger.handlers)
+        h = html.HTML(handler, configure_log=False)
+        assert logger.handlers == handlers
+        assert h.parse("<b>x</b>") == True
+
+    def test_configure_logging_replaces_handler(self):
+        logger = logging.getLogger(html.__name__)
+        first = logging.NullHandler()
+        second = logging.NullHandler()
+        assert html.configure_logging(first) == first
+        assert html.configure_logging() == first
+        assert html.configure_logging(second) == second
+        assert first not in logger.handlers
+        assert second in logger.handlers
+
+    def test_parse_url_reuses_connections(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        try:
+            for i in range(5):
+                assert self.h.parse_url(server.url('/page')) == True
+                assert self.h._parsed_data[1] == ['b', [], 'data']
+            assert self.h.parse_url_with_post_form(server.url('/page'),
+                                                   {'a': 'b'}) == True
+            assert len(server.hits) == 6
+            assert server.connections == 1
+        finally:
+            server.stop()
+
+    def test_parse_url_session_shared_between_parsers(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        try:
+            session = html.create_session()
+            for i in range(3):
+                h = html.HTML(configure_log=False)
+                h.session = session
+                assert h.parse_url(server.url('/page')) == True
+            assert server.connections == 1
+        finally:
+            server.stop()
+
+    def test_parse_url_http_error_status(self):
+        server = LocalServer()
+        try:
+            with pytest.raises(html.Error):
+                self.h.parse_url(server.url('/missing'))
+        finally:
+            server.stop()
+
+    def test_create_session_host_pool_sizes(self):
+        session = html.create_session(pool_maxsize=3,
+                                      host_pool_sizes={'example.com': 20})
+        assert session.get_adapter('http://example.com/a')._pool_maxsize == 20
+        assert session.get_adapter('https://example.com/')._pool_maxsize == 20
+        assert session.get_adapter('http://example.org/')._pool_maxsize == 3
+
+    def test_parse_url_uses_fresh_cached_response(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory)
+            self.h.requests_per_minute = 1
+            assert self.h.parse_url(server.url('/page'), False)
+            assert self.h.parse_url(server.url('/page'), False)
+            assert self.h.get_tag(1) == ['b', [], 'data']
+            assert len(server.hits) == 1
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_parse_url_with_post_form_caches_unicode_form_data(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory)
+            url = server.url('/page')
+            assert self.h.parse_url_with_post_form(url, {'q': u'caf\xe9'})
+            assert self.h.parse_url_with_post_form(url, {'q': u'caf\xe9'})
+            assert self.h.get_tag(1) == ['b', [], 'data']
+            assert len(server.hits) == 1
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_get_url_revalidates_with_etag(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        server.etags['/page'] = '"v1"'
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory, ttl=0)
+            assert self.h.get_url(server.url('/page')) == '<b>data</b>'
+            assert self.h.get_url(server.url('/page')) == '<b>data</b>'
+            assert len(server.hits) == 2
+            assert server.not_modified == 1
+            server.etags['/page'] = '"v2"'
+            server.pages['/page'] = '<b>new</b>'
+            assert self.h.get_url(server.url('/page')) == '<b>new</b>'
+            assert server.not_modified == 1
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_get_url_revalidates_with_last_modified(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        server.last_modified['/page'] = 'Sat, 01 Jan 2000 00:00:00 GMT'
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory, ttl=0)
+            assert self.h.get_url(server.url('/page')) == '<b>data</b>'
+            assert self.h.get_url(server.url('/page')) == '<b>data</b>'
+            assert server.not_modified == 1
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_get_url_caches_post_by_form_data(self):
+        server = LocalServer({'/form': '<b>data</b>'})
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory)
+            for i in range(2):
+                assert self.h.get_url(server.url('/form'), {'a': '1'}) == \
+                    u'<b>data</b>'
+            assert self.h.get_url(server.url('/form'), {'a': '2'})
+            assert len(server.hits) == 2
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_parse_urls_async_uses_cached_responses(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory)
+            documents = self.h.parse_urls_async([server.url('/page')])
+            documents += self.h.parse_urls_async([server.url('/page')])
+            assert [d.get_tag(1) for d in documents] == [['b', [], 'data']] * 2
+            assert len(server.hits) == 1
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_parse_restores_document_from_memory_cache(self):
+        markup = '<div><p class="x">a</p><p>b</p></div>'
+        self.h.document_cache = cache.DocumentCache()
+        assert self.h.parse(markup)
+        parsed_data = self.h._parsed_data
+        other = html.HTML(configure_log=False)
+        other.document_cache = self.h.document_cache
+        other._feed_markup = None
+        assert other.parse(markup)
+        assert other._parsed_data == parsed_data
+        assert other._parsed_data is not parsed_data
+        assert other.find_first_tag_with_attributes({'class': 'x'}) == 2
+        assert other.find_next_tag('p', index=3) == 3
+
+    def test_parse_cached_document_keeps_value_types(self):
+        def types(parsed_data):
+            return [(type(name), [map(type, a) for a in attributes or []], type(data))
+                    for name, attributes, data in parsed_data]
+        for markup in ('<p>caf\xe9</p><a href="?a=1&amp;b=2">l</a>',
+                       '<p>caf\xc3\xa9</p><a href="?a=1&amp;b=2">l</a>'):
+            directory = tempfile.mkdtemp()
+            try:
+                expected = html.HTML(configure_log=False)
+                expected.parse(markup)
+                for max_documents in (128, 0):
+                    self.h.document_cache = cache.DocumentCache(
+                        max_documents, directory)
+                    for i in range(2):
+                        assert self.h.parse(markup)
+                        assert self.h._parsed_data == expected._parsed_data
+                        assert types(self.h._parsed_data) == types(expected._parsed_data)
+                        assert self.h.find_first_tag('p', tag_data=expected.get_tag(1)[2]) == 1
+            finally:
+                shutil.rmtree(directory)
+
+    def test_parse_cached_document_is_not_shared(self):
+        markup = '<p>a &amp; b</p>'
+        self.h.document_cache = cache.DocumentCache()
+        assert self.h.parse(markup)
+        self.h.unescape_document()
+        self.h._root.children[0].children = None
+        assert self.h.get_tag(1) == ['p', [], 'a & b']
+        other = html.HTML(configure_log=False)
+        other.document_cache = self.h.document_cache
+        assert other.parse(markup)
+        assert other.get_tag(1) == ['p', [], 'a &amp; b']
+        assert other._root.children[0].name == 'p'
+
+    def test_parse_events_bypasses_document_cache(self):
+        markup = '<div><b>x</b></div>'
+        self.h.document_cache = cache.DocumentCache()
+        for i in range(2):
+            events = []
+            assert self.h.parse_events(markup, lambda *event: events.append(event))
+            assert ('starttag', 'b', [], None) in events
+        assert len(self.h.document_cache) == 0
+        assert self.h.parse(markup)
+        assert self.h.get_tag(2) == ['b', [], 'x']
+        events = []
+        assert self.h.parse_events(markup, lambda *event: events.append(event))
+        assert ('starttag', 'b', [], None) in events
+
+    def test_parse_restores_document_from_disk_cache(self):
+        markup = '<div><p class="x">a</p><!-- c --><br/></div>'
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.document_cache = cache.DocumentCache(directory=directory)
+            assert self.h.parse(markup)
+            other = html.HTML(configure_log=False)
+            other.document_cache = cache.DocumentCache(directory=directory)
+            other._feed_markup = None
+            assert other.parse(markup)
+            assert other._parsed_data == self.h._parsed_data
+            assert other._attribute_index == self.h._attribute_index
+            assert other.find_first_tag_with_attributes({'class': 'x'}) == 2
+            assert len(other.document_cache) == 1
+        finally:
+            shutil.rmtree(directory)
+
+    def test_parse_cached_document_without_attribute_index(self):
+        markup = '<p class="x">a</p>'
+        self.h.document_cache = cache.DocumentCache()
+        self.h.index_attributes = False
+        self.h.parse(markup)
+        assert self.h._attribute_index == None
+        other = html.HTML(configure_log=False)
+        other.document_cache = self.h.document_cache
+        other.parse(markup)
+        assert other._attribute_index == {'class': {'x': [1]}}
+
+    def test_parse_urls_returns_one_document_per_url(self):
+        pages = dict(('/%i' % i, '<p>page %i</p>' % i) for i in range(8))
+        server = LocalServer(pages)
+        try:
+            urls = [server.url('/%i' % i) for i in range(8)]
+            urls.insert(3, server.url('/missing'))
+            documents = self.h.parse_urls(urls, workers=4)
+            assert len(documents) == 9
+            assert documents[3] == None
+            del documents[3]
+            for i, document in enumerate(documents):
+                assert document.get_tag(1) == ['p', [], 'page %i' % i]
+            assert len(self.h._get_rate_limiter(urls[0])._window) == 9
+        finally:
+            server.stop()
+
+    def test_parse_urls_skips_unparseable_pages(self):
+        server = LocalServer({'/good': '<p>good</p>',
+                              '/bad': '<p>x</p><![x y'})
+        try:
+            documents = self.h.parse_urls([server.url('/good'),
+                                           server.url('/bad'),
+                                           server.url('/good')], workers=2)
+            assert documents[1] == None
+            assert documents[0].get_tag(1) == ['p', [], 'good']
+            assert documents[2].get_tag(1) == ['p', [], 'good']
+        finally:
+            server.stop()
+
+    def test_parse_urls_creates_one_session(self, monkeypatch):
+        server = LocalServer({'/page': '<b>data</b>'})
+        sessions = []
+
+        def create_session(*args):
+            # Widen the window between checking and assigning the session
+            time.sleep(0.05)
+            sessions.append(requests.Session())
+            return sessions[-1]
+        monkeypatch.setattr(html, 'create_session', create_session)
+        try:
+            self.h.requests_per_minute = 0
+            documents = self.h.parse_urls([server.url('/page')] * 8, workers=8)
+            assert len([d for d in documents if d]) == 8
+            assert len(sessions) == 1
+        finally:
+            server.stop()
+
+    def test_parse_urls_honors_minimum_time_between_requests(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        try:
+            self.h.minimum_time_between_requests = 0.2
+            start_time = time.time()
+            documents = self.h.parse_urls([server.url('/page')] * 4, workers=4)
+            elapsed_time = time.time() - start_time
+            assert len([d for d in documents if d]) == 4
+            assert elapsed_time > 0.6
+        finally:
+            server.stop()
+
+    def test_parse_urls_no_wait_for_rate_limiting(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        try:
+            self.h.requests_per_minute = 2
+            documents = self.h.parse_urls([server.url('/page')] * 4, workers=2,
+                                          wait_for_rate_limiting=False)
+            assert len([d for d in documents if d]) == 2
+            assert len(server.hits) == 2
+        finally:
+            server.stop()
+
+    def test_parse_urls_async_returns_one_document_per_url(self):
+        pages = dict(('/%i' % i, '<p>page %i</p>' % i) for i in range(10))
+        server = LocalServer(pages)
+        try:
+            urls = [server.url('/%i' % i) for i in range(10)]
+            urls.insert(2, server.url('/missing'))
+            urls.insert(4, None)
+            documents = self.h.parse_urls_async(urls, max_in_flight=3)
+            assert len(documents) == 12
+            assert documents[2] == None
+            assert documents[4] == None
+            documents = [d for i, d in enumerate(documents) if i not in (2, 4)]
+            for i, document in enumerate(documents):
+                assert document.get_tag(1) == ['p', [], 'page %i' % i]
+        finally:
+            server.stop()
+
+    def test_parse_urls_async_skips_unparseable_pages(self):
+        server = LocalServer({'/good': '<p>good</p>',
+                              '/bad': '<p>x</p><![x y'})
+        try:
+            documents = self.h.parse_urls_async([server.url('/good'),
+                                                 server.url('/bad'),
+                                                 server.url('/good')])
+            assert documents[1] == None
+            assert documents[0].get_tag(1) == ['p', [], 'good']
+            assert documents[2].get_tag(1) == ['p', [], 'good']
+        finally:
+            server.stop()
+
+    def test_parse_urls_async_follows_redirects(self):
+        server = LocalServer({'/new': '<b>real</b>'})
+        server.redirects['/old'] = '/new'
+        try:
+            async_document = self.h.parse_urls_async([server.url('/old')])[0]
+            assert self.h.parse_url(server.url('/old'))
+            assert async_document.get_tag(1) == ['b', [], 'real']
+            assert self.h.get_tag(1) == ['b', [], 'real']
+        finally:
+            server.stop()
+
+    def test_parse_urls_async_caches_redirects_by_requested_url(self):
+        server = LocalServer({'/new': '<b>real</b>'})
+        server.redirects['/old'] = '/new'
+        directory = tempfile.mkdtemp()
+        try:
+            self.h.response_cache = cache.ResponseCache(directory)
+            assert self.h.parse_urls_async([server.url('/old')])[0]
+            assert self.h.parse_url(server.url('/old'))
+            assert self.h.get_tag(1) == ['b', [], 'real']
+            assert server.hits == ['/old', '/new']
+        finally:
+            server.stop()
+            shutil.rmtree(directory)
+
+    def test_parse_urls_async_honors_minimum_time_between_requests(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        try:
+            self.h.minimum_time_between_requests = 0.2
+            start_time = time.time()
+            documents = self.h.parse_urls_async([server.url('/page')] * 4)
+            elapsed_time = time.time() - start_time
+            assert len([d for d in documents if d]) == 4
+            assert elapsed_time > 0.6
+            assert elapsed_time < 1.5
+        finally:
+            server.stop()
+
+    def test_rate_limit_delay(self):
+        self.h.minimum_time_between_requests = 30
+        self.h.requests_per_minute = 5
+        self._set_rate_limit_history([20, 30, 40])
+        assert 9 < self.h._rate_limit_delay() <= 10
+        self.h.minimum_time_between_requests = 0
+        self.h.requests_per_minute = 3
+        assert 19 < self.h._rate_limit_delay() <= 20
+        self.h.requests_per_minute = 4
+        assert self.h._rate_limit_delay() == 0
+        assert self.h._rate_limit_delay('http://example.com/') == 0
+
+    def test_parse_urls_async_limits_each_host(self):
+        server = LocalServer({'/page': '<b>data</b>'})
+        try:
+            self.h.minimum_time_between_requests = 0.5
+            urls = [server.url('/page'),
+                    server.url('/page').replace('127.0.0.1', 'localhost')] * 2
+            start_time = time.time()
+            documents = self.h.parse_urls_async(urls)
+            elapsed_time = time.time() - start_time
+            assert len([d for d in documents if d]) == 4
+            assert elapsed_time > 0.4
+            assert elapsed_time < 0.9
+        finally:
+            server.stop()
+
+    def test_parse_documents_from_strings(self):
+        texts = ["<p>%i</p>" % i for i in range(6)] + [None]
+        documents = html.parse_documents(texts, processes=2)
+        assert len(documents) == 7
+        for i in range(6):
+            assert documents[i].get_tag(1) == ['p', [], str(i)]
+        assert len(documents[6]) == 1
+
+    def test_parse_documents_from_files(self):
+        filename = "tests/files/test.html"
+        expected = html.HTML(logging.NullHandler())
+        expected.parse_file(filename)
+        documents = html.parse_documents([filename, "tests/files/invalid_file.html"],
+                                         processes=2, from_files=True)
+        assert documents[1] == None
+        assert len(documents[0]) == expected._number_of_tags
+        for i in range(len(documents[0])):
+            assert documents[0].get_tag(i) == expected.get_tag(i)
+
+    def test_parse_documents_in_this_process(self):
+        documents = html.parse_documents(["<b>x</b>"], processes=1)
+        assert documents[0].get_tag(1) == ['b', [], 'x']
@@ -0,0 +1,172 @@
+"""This module tests functions in the ratelimit module.
+
+    Packages(s) required:
+    - html
+    - multiprocessing
+    - pytest
+    - threading
+    - time
+
+"""
+
+# Imports
+import multiprocessing
+import pytest
+import threading
+import time
+
+import sys,os
+sys.path.append(os.path.realpath('.'))
+from html import ratelimit
+
+
+class TestRateLimiter:
+    """Test the RateLimiter class."""
+
+    def test_acquire_not_limited(self):
+        limiter = ratelimit.RateLimiter(requests_per_minute=0)
+        for i in range(100):
+            assert limiter.acquire(False)
+        assert limiter.time_until_next_permit() == 0
+
+    def test_acquire_minimum_time_between_requests(self):
+        limiter = ratelimit.RateLimiter(minimum_time_between_requests=0.3)
+        assert limiter.acquire(False)
+        assert not limiter.acquire(False)
+        assert 0.2 < limiter.time_until_next_permit() <= 0.3
+        start_time = time.time()
+        assert limiter.acquire()
+        elapsed_time = time.time() - start_time
+        assert elapsed_time > 0.2
+        assert elapsed_time < 0.5
+
+    def test_acquire_requests_per_minute(self):
+        limiter = ratelimit.RateLimiter(requests_per_minute=3)
+        for i in range(3):
+            assert limiter.acquire(False)
+        assert not limiter.acquire(False)
+        assert 59 < limiter.time_until_next_permit() <= 60
+
+    def test_window_slides(self):
+        limiter = ratelimit.RateLimiter(requests_per_minute=2)
+        current_time = time.time()
+        limiter._window.extend([current_time - 70, current_time - 30])
+        limiter._last_request_time = current_time - 30
+        assert limiter.time_until_next_permit() == 0
+        assert limiter.acquire(False)
+        assert 29 < limiter.time_until_next_permit() <= 30
+        assert len(limiter._window) == 2
+
+    def test_acquire_from_threads(self):
+        limiter = ratelimit.RateLimiter(requests_per_minute=5)
+        results = []
+
+        def acquire():
+            results.append(limiter.acquire(False))
+
+        threads = [threading.Thread(target=acquire) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results.count(True) == 5
+
+
+def acquire_permits(limiter, count, results):
+    """Take permits without waiting in a worker process.
+
+    Args:
+        limiter: The SharedRateLimiter.
+        count: The number of permits to try to take.
+        results: A queue receiving the number of permits taken.
+
+    """
+    results.put(sum(1 for i in range(count) if limiter.acquire(False)))
+
+
+class TestSharedRateLimiter:
+    """Test the SharedRateLimiter class."""
+
+    def test_acquire_requests_per_minute(self):
+        limiter = ratelimit.SharedRateLimiter(requests_per_minute=3)
+        for i in range(3):
+            assert limiter.acquire(False)
+        assert not limiter.acquire(False)
+        assert 59 < limiter.time_until_next_permit() <= 60
+
+    def test_acquire_minimum_time_between_requests(self):
+        limiter = ratelimit.SharedRateLimiter(
+            requests_per_minute=0, minimum_time_between_requests=0.3)
+        assert limiter.acquire(False)
+        assert not limiter.acquire(False)
+        start_time = time.time()
+        assert limiter.acquire()
+        elapsed_time = time.time() - start_time
+        assert elapsed_time > 0.2
+        assert elapsed_time < 0.5
+
+    def test_window_slides(self):
+        limiter = ratelimit.SharedRateLimiter(requests_per_minute=2)
+        current_time = time.time()
+        limiter._times[0] = current_time - 70
+        limiter._times[1] = current_time - 30
+        limiter._state[1] = current_time - 30
+        assert limiter.time_until_next_permit() == 0
+        assert limiter.acquire(False)
+        assert 29 < limiter.time_until_next_permit() <= 30
+
+    def test_one_limit_for_all_hosts(self):
+        limiter = ratelimit.SharedRateLimiter(requests_per_minute=1)
+        assert limiter.get_limiter('http://example.com/').acquire(False)
+        assert not limiter.get_limiter('http://example.org/').acquire(False)
+
+    def test_acquire_from_threads(self):
+        limiter = ratelimit.SharedRateLimiter(requests_per_minute=5)
+        results = []
+
+        def acquire():
+            results.append(limiter.acquire(False))
+
+        threads = [threading.Thread(target=acquire) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results.count(True) == 5
+
+    def test_acquire_from_processes(self):
+        limiter = ratelimit.SharedRateLimiter(requests_per_minute=7)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=acquire_permits,
+                                             args=(limiter, 5, results))
+                     for i in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert sum(results.get() for process in processes) == 7
+        assert not limiter.acquire(False)
+
+
+class TestHostRateLimiter:
+    """Test the HostRateLimiter class."""
+
+    def test_hosts_limited_separately(self):
+        limiter = ratelimit.HostRateLimiter(requests_per_minute=1)
+        assert limiter.acquire('http://example.com/a', False)
+        assert not limiter.acquire('http://EXAMPLE.com/b', False)
+        assert limiter.acquire('http://example.org/a', False)
+        assert limiter.time_until_next_permit('http://example.net/') == 0
+        assert limiter.time_until_next_permit('http://example.com/') > 59
+
+    def test_limits_follow_attributes(self):
+        limiter = ratelimit.HostRateLimiter(requests_per_minute=1)
+        assert limiter.acquire('http://example.com/', False)
+        limiter.requests_per_minute = 2
+        assert limiter.acquire('http://example.com/', False)
+
+    def test_get_host(self):
+        assert ratelimit.get_host('http://Example.com:8080/a?b') == \
+            'example.com:8080'
+        assert ratelimit.get_host(None) == ''
+        assert ratelimit.get_host('page.html') == ''
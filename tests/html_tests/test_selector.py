@@ -0,0 +1,131 @@
+"""This module tests functions in the selector module.
+
+    Packages(s) required:
+    - html
+    - logging
+    - pytest
+
+"""
+
+# Imports
+import logging
+import pytest
+
+import sys,os
+sys.path.append(os.path.realpath('.'))
+from html import html
+from html import selector
+
+MARKUP = ("<html><body>"
+          "<div id=\"main\" class=\"content wide\">"
+          "<h1 lang=\"en-US\">Title</h1>"
+          "<ul class=\"items\">"
+          "<li class=\"item\"><a href=\"http://a.example.com/1\">1</a></li>"
+          "<li class=\"item sold\"><a href=\"/2\">2</a></li>"
+          "<!-- note -->"
+          "<li class=\"item\"><a href=\"https://b.example.com/3\">3</a></li>"
+          "<li class=\"item\"><span>4</span><a href=\"/4.pdf\">4</a></li>"
+          "</ul>"
+          "<p>first</p><p>second</p><br/><p>third</p>"
+          "</div>"
+          "<div class=\"item\"><p></p></div>"
+          "</body></html>")
+
+
+class TestSelector:
+    """Test the Selector class."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.h = html.HTML(logging.NullHandler())
+        self.h.parse(MARKUP)
+
+    def texts(self, text):
+        return [tag.data for tag in self.h.select(text)]
+
+    def test_type_id_and_class(self):
+        assert self.texts("a") == ['1', '2', '3', '4']
+        assert [tag.name for tag in self.h.select("#main")] == ['div']
+        assert len(self.h.select(".item")) == 5
+        assert len(self.h.select("li.item.sold")) == 1
+        assert len(self.h.select("DIV.wide")) == 1
+        assert len(self.h.select("*")) == 20
+
+    def test_attribute_operators(self):
+        assert self.texts("a[href^=http]") == ['1', '3']
+        assert self.texts("a[href^='https:']") == ['3']
+        assert self.texts("a[href$=\".pdf\"]") == ['4']
+        assert self.texts("a[href*=example]") == ['1', '3']
+        assert self.texts("a[href='/2']") == ['2']
+        assert self.texts("h1[lang|=en]") == ['Title']
+        assert self.texts("h1[lang]") == ['Title']
+        assert self.texts("li[class~=sold] a") == ['2']
+        assert self.texts("a[href^='']") == []
+
+    def test_combinators(self):
+        assert self.texts("div.content > ul > li > a") == ['1', '2', '3', '4']
+        assert self.texts("body p") == ['first', 'second', 'third', '']
+        assert self.texts("div > p") == ['first', 'second', 'third', '']
+        assert self.texts("ul + p") == ['first']
+        assert self.texts("h1 ~ p") == ['first', 'second', 'third']
+        assert self.texts("br + p") == ['third']
+        assert self.texts("li.sold ~ li a") == ['3', '4']
+        assert self.texts("span + a") == ['4']
+        assert self.texts("html > a") == []
+
+    def test_structural_pseudo_classes(self):
+        assert self.texts("li:first-child a") == ['1']
+        assert self.texts("li:last-child a") == ['4']
+        assert self.texts("li:nth-child(2) a") == ['2']
+        assert self.texts("li:nth-child(odd) a") == ['1', '3']
+        assert self.texts("li:nth-child(even) a") == ['2', '4']
+        assert self.texts("li:nth-child(2n+3) a") == ['3']
+        assert self.texts("li:nth-child(-n+2) a") == ['1', '2']
+        assert self.texts("li:nth-last-child(1) a") == ['4']
+        assert self.texts("p:nth-of-type(2)") == ['second']
+        assert self.texts("p:last-of-type") == ['third', '']
+        assert self.texts("p:first-of-type") == ['first', '']
+        assert self.texts("p:only-child") == ['']
+        assert self.texts("p:only-of-type") == ['']
+        assert self.texts("li a:only-child") == ['1', '2', '3']
+        assert self.texts("p:empty") == ['']
+        assert self.texts("li:not(.sold) > a") == ['1', '3', '4']
+
+    def test_selector_list(self):
+        assert self.texts("p:first-of-type, h1, a[href$=pdf]") == \
+            ['Title', '4', 'first', '']
+
+    def test_limit_and_select_one(self):
+        assert self.texts("a") == ['1', '2', '3', '4']
+        assert [tag.data for tag in self.h.select("a", 2)] == ['1', '2']
+        assert self.h.select_one("li.sold a").data == '2'
+        assert self.h.select_one("table") == None
+
+    def test_comments_are_not_elements(self):
+        assert [tag.name for tag in
+                self.h.select("ul > *")] == ['li', 'li', 'li', 'li']
+        assert self.texts("li.sold + li a") == ['3']
+
+    def test_matches(self):
+        compiled = selector.compile_selector("ul > li.item")
+        tags = compiled.select(self.h._root)
+        assert len(tags) == 4
+        assert compiled.matches(tags[0])
+        assert not compiled.matches(tags[0].children[0])
+        assert not compiled.matches(self.h._root)
+
+    def test_compiled_selectors_are_cached(self):
+        compiled = selector.compile_selector("div#main p")
+        assert selector.compile_selector("div#main p") is compiled
+        other = html.HTML(logging.NullHandler())
+        other.parse("<div id=\"main\"><p>x</p></div>")
+        assert [tag.data for tag in compiled.select(other._root)] == ['x']
+        assert len(compiled.select(self.h._root)) == 3
+
+    def test_invalid_selectors(self):
+        for text in ("", "div >", "a[href", "li:nth-child(x)", ":unknown",
+                     "div )", "a, ", ":not(a b)"):
+            with pytest.raises(selector.Error):
+                selector.Selector(text)
+        with pytest.raises(html.Error):
+            self.h.select("div >")
@@ -0,0 +1,161 @@
+"""This module tests functions in the xpath module.
+
+    Packages(s) required:
+    - html
+    - logging
+    - pytest
+
+"""
+
+# Imports
+import logging
+import pytest
+
+import sys,os
+sys.path.append(os.path.realpath('.'))
+from html import html
+from html import xpath
+
+MARKUP = ("<html><body>"
+          "<table id=\"x\">"
+          "<tr class=\"head\"><td>Name</td><td>Price</td></tr>"
+          "<tr><td>Apple</td><td>1.50</td></tr>"
+          "<tr class=\"sold\"><td>Pear</td><td>2.25</td></tr>"
+          "<tr><td>Plum</td><td>0.75</td></tr>"
+          "</table>"
+          "<table id=\"y\"><tr><td>Other</td><td>9</td></tr></table>"
+          "<div class=\"a\"><p>one</p>"
+          "<div class=\"b\"><p>two</p><a href=\"/2\" rel>link</a></div>"
+          "<!-- note --><p>three</p></div>"
+          "</body></html>")
+
+
+class TestXPath:
+    """Test the XPath class."""
+
+    def setup_method(self, method):
+        """Setup each test."""
+        self.h = html.HTML(logging.NullHandler())
+        self.h.parse(MARKUP)
+
+    def data(self, expression):
+        return [tag.data for tag in self.h.xpath(expression)]
+
+    def test_table_cells(self):
+        assert self.h.xpath("//table[@id='x']/tr/td[2]/text()") == \
+            ['Price', '1.50', '2.25', '0.75']
+        assert self.h.xpath("/html/body/table[2]/tr/td[1]/text()") == \
+            ['Other']
+        assert self.h.xpath("//td[1]/text()") == \
+            ['Name', 'Apple', 'Pear', 'Plum', 'Other']
+        assert self.h.xpath("//table[@id=\"x\"]/tr[last()]/td/text()") == \
+            ['Plum', '0.75']
+        assert self.h.xpath("//table[1]/tr[position() > 1 and "
+                            "position() < last()]/td[1]/text()") == \
+            ['Apple', 'Pear']
+        assert self.h.xpath("//tr[last() - 1]/td[1]/text()") == ['Pear']
+
+    def test_attribute_steps_and_predicates(self):
+        assert self.h.xpath("//table/@id") == ['x', 'y']
+        assert self.h.xpath("//a/@*") == ['/2', '']
+        assert self.data("//tr[@class]/td[1]") == ['Name', 'Pear']
+        assert self.data("//tr[not(@class)]/td[1]") == ['Apple', 'Plum',
+                                                        'Other']
+        assert self.data("//a[@rel]") == ['link']
+        assert self.data("//a[@rel='']") == ['link']
+        assert self.data("//*[@class='sold']/td[2]") == ['2.25']
+        assert self.data("//tr[@class='sold' or @class='head']/td[1]") == \
+            ['Name', 'Pear']
+        assert self.data("//div[@class='none']") == []
+        assert self.data("//td[@missing='1']") == []
+
+    def test_text_predicates_and_functions(self):
+        assert self.data("//td[text()='Pear']") == ['Pear']
+        assert self.data("//td[.='Pear']/../td[2]") == ['2.25']
+        assert self.data("//tr[td='Plum']/td[2]") == ['0.75']
+        assert self.data("//td[contains(., 'l')]") == ['Apple', 'Plum']
+        assert self.data("//td[starts-with(text(), 'P')]") == \
+            ['Price', 'Pear', 'Plum']
+        assert self.data("//td[ends-with(., 'e')]") == ['Name', 'Price',
+                                                        'Apple']
+        assert self.data("//td[. > 1 and . < 3]") == ['1.50', '2.25']
+        assert self.data("//td[string-length(.) = 5]") == ['Price',
+                                                          'Apple', 'Other']
+        assert self.data("//tr[count(td) = 2][2]/td[1]") == ['Apple']
+        assert self.data("//td[normalize-space(.)='Apple']") == ['Apple']
+
+    def test_descendants_and_document_order(self):
+        assert self.data("//div//p") == ['one', 'two', 'three']
+        assert self.data("//div/p") == ['one', 'two', 'three']
+        assert self.data("//div[@class='a']/p") == ['one', 'three']
+        assert [tag.name for tag in self.h.xpath("//p/..")] == ['div', 'div']
+        assert self.data("//div/*") == ['one', '', 'two', 'link', 'three']
+        assert self.data("//a | //p") == ['one', 'two', 'link', 'three']
+        assert self.h.xpath("//div[@class='b']//text()") == ['two', 'link']
+
+    def test_relative_paths(self):
+        table = self.h.xpath("//table[@id='x']")[0]
+        assert self.h.xpath("tr[2]/td/text()", table) == ['Apple', '1.50']
+        assert self.h.xpath(".//td[1]/text()", table) == \
+            ['Name', 'Apple', 'Pear', 'Plum']
+        assert self.h.xpath("/html/body/table/@id", table) == ['x', 'y']
+        assert self.h.xpath(".", table) == [table]
+        assert self.h.xpath("..", table)[0].name == 'body'
+
+    def test_comments_are_not_elements(self):
+        assert [tag.name for tag in self.h.xpath("//div[@class='a']/*")] == \
+            ['p', 'div', 'p']
+        assert self.h.xpath("//comment") == []
+        assert self.h.xpath("//root") == []
+
+    def test_indexed_and_traversed_results_match(self):
+        for expression in ("//td", "//tr[@class='sold']", "//*[@id]",
+                           "//a[@rel]", "//table[@id='x']/tr",
+                           "//tr[@class]/td[2]"):
+            compiled = xpath.compile_xpath(expression)
+            indexed = self.h.xpath(expression)
+            assert indexed == compiled.evaluate(self.h._root)
+            assert indexed
+
+    def test_index_is_used_for_leading_step(self):
+        compiled = xpath.compile_xpath("//td[. != 'Name']")
+        assert len(compiled.evaluate(self.h._root)) == 9
+        # The indexed step only looks at the positions in the tag index
+        tag_index = dict(self.h._tag_index)
+        tag_index['td'] = tag_index['td'][1:2]
+        found = compiled.evaluate(self.h._root, self.h._tag_list, tag_index,
+                                  self.h._attribute_index)
+        assert [tag.data for tag in found] == ['Price']
+        # Positional predicates need the siblings, so the tree is searched
+        compiled = xpath.compile_xpath("//td[1]")
+        assert len(compiled.evaluate(self.h._root, self.h._tag_list,
+                                     tag_index,
+                                     self.h._attribute_index)) == 5
+
+    def test_compiled_expressions_are_cached(self):
+        compiled = xpath.compile_xpath("//p/text()")
+        assert xpath.compile_xpath("//p/text()") is compiled
+        other = html.HTML(logging.NullHandler())
+        other.parse("<div><p>x</p></div>")
+        assert compiled.evaluate(other._root) == ['x']
+        assert xpath.evaluate(self.h._root, "//p/text()") == \
+            ['one', 'two', 'three']
+
+    def test_document_cache_keeps_the_tag_list(self):
+        from html import cache
+        self.h.document_cache = cache.DocumentCache()
+        self.h.parse(MARKUP)
+        other = html.HTML(logging.NullHandler())
+        other.document_cache = self.h.document_cache
+        other.parse(MARKUP)
+        assert other.xpath("//table[@id='x']/tr/td[2]/text()") == \
+            ['Price', '1.50', '2.25', '0.75']
+
+    def test_invalid_expressions(self):
+        for expression in ("", "//", "//a[", "//a]", "//text()/a",
+                           "//a/@href/b", "//a[foo()]", "//node()",
+                           "//a[contains(.)]", "//a[@]", "//a#b"):
+            with pytest.raises(xpath.Error):
+                xpath.XPath(expression)
+        with pytest.raises(html.Error):
+            self.h.xpath("//a[")